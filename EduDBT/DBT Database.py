@@ -20,12 +20,6 @@ def create_database():
         cur.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(DB_NAME)))
     cur.close()
     conn.close()
-    time.sleep(1)
-
-create_database()
-
-a = psycopg2.connect(host=DB_HOST, user=DB_USER, password=DB_PASS, port=DB_PORT, dbname=DB_NAME)
-cur = a.cursor()
 
 
 # Create tables (if not exist)
@@ -114,14 +108,15 @@ def create_tables():
     try:
         cur.execute("CREATE INDEX IF NOT EXISTS idx_accountstatus_aadhaar ON AccountStatus (aadhaar_linked)")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_accountstatus_dbt ON AccountStatus (dbt_enabled)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_accountstatus_dbt_enabled ON AccountStatus (account_id) WHERE dbt_enabled")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_bankaccounts_student ON BankAccounts (student_id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_students_state_id ON Students (state, student_id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_students_college_id ON Students (college, student_id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_students_state_college_id ON Students (state, college, student_id)")
         a.commit()
     except Exception:
         a.rollback()
 
-create_tables()
-time.sleep(1)
-
 #Functions
 
 def insert_student():
@@ -449,6 +444,11 @@ def main():
             print("Please enter a valid number.")
 
 if __name__ == "__main__":
+    # Setup used to run at import time; batch work belongs in server_new-py/cli.py.
+    create_database()
+    a = psycopg2.connect(host=DB_HOST, user=DB_USER, password=DB_PASS, port=DB_PORT, dbname=DB_NAME)
+    cur = a.cursor()
+    create_tables()
     main()
     cur.close()
     a.close()
@@ -1,6 +1,8 @@
 import asyncio
 import asyncpg
-from fastapi import FastAPI, HTTPException
+import base64
+import binascii
+from fastapi import FastAPI, HTTPException, Query
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
 import logging
@@ -31,6 +33,10 @@ class StudentIn(BaseModel):
 class StudentOut(StudentIn):
     student_id: int
 
+class StudentPage(BaseModel):
+    items: List[StudentOut]
+    next_cursor: Optional[str] = None
+
 class BankAccountIn(BaseModel):
     student_id: int
     account_number: str
@@ -55,6 +61,16 @@ class AwarenessIn(BaseModel):
     title: str
     content: Optional[str]
 
+# ----------------- PAGINATION -----------------
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(400, "Invalid cursor")
+
 # ----------------- LIFESPAN -----------------
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -121,11 +137,29 @@ async def insert_scheme(payload: SchemeIn):
         return dict(row)
 
 # 4. Show Students
-@app.get("/students", response_model=List[StudentOut])
-async def show_students():
+@app.get("/students", response_model=StudentPage)
+async def show_students(
+    after_id: Optional[int] = Query(None, ge=0),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    state: Optional[str] = None,
+    college: Optional[str] = None,
+):
+    args = [decode_cursor(cursor) if cursor else (after_id or 0)]
+    q = "SELECT student_id,name,email,phone,state,college FROM Students WHERE student_id > $1"
+    if state is not None:
+        args.append(state)
+        q += f" AND state = ${len(args)}"
+    if college is not None:
+        args.append(college)
+        q += f" AND college = ${len(args)}"
+    args.append(limit + 1)
+    q += f" ORDER BY student_id LIMIT ${len(args)}"
     async with pg_pool.acquire() as conn:
-        rows = await conn.fetch("SELECT * FROM Students ORDER BY student_id")
-        return [dict(r) for r in rows]
+        rows = await conn.fetch(q, *args)
+    items = [dict(r) for r in rows[:limit]]
+    next_cursor = encode_cursor(items[-1]["student_id"]) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
 
 # 5. Show Bank Accounts
 @app.get("/bank-accounts")
@@ -0,0 +1,133 @@
+"""Fail when a router query plans a sequential scan over a large table.
+
+EXPLAINs (without executing) each query the routers issue, plus the lookups
+Postgres runs for ON DELETE CASCADE, using ids sampled from the database, and
+walks the plans for Seq Scan nodes on tables above --min-rows. Point it at a
+benchmark-scale database:
+
+    python -m bench.seed --students 200000 --reset
+    python -m bench.explain_check
+
+Pending migrations are applied first (--no-migrate to check the schema as is).
+Exits 1 on any violation. It is a manual check, not part of a test suite: it
+needs a live, seeded database, so CI has to run it as its own step. Route SQL is
+imported from the routers, so the check follows what the routes run.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+
+import asyncpg
+
+from core.config import DSN
+from core.eligibility import EVALUATE_STUDENTS_SQL
+from core.enablement import FIRST_ENABLEMENT_SQL
+from core.migrations import migrate
+from routers.bank_accounts import (
+    BANK_ACCOUNTS_SQL, BATCH_STATUS_SQL, INSERT_BANK_ACCOUNT_SQL, STATUS_AS_OF_SQL, UPDATE_STATUS_SQL,
+)
+from core.writebehind import FLUSH_STATUS_SQL
+from routers.students import DELETE_STUDENT_SQL, UPDATE_STUDENT_SQL, pending_dbt_sql, students_page_sql
+
+
+
+class Check(NamedTuple):
+    name: str
+    sql: str
+    args: Callable[[dict], tuple]
+    # Queries that return every row by design (full listings, unfiltered counts) may scan.
+    full_scan: bool = False
+
+
+CHECKS: List[Check] = [
+    Check("GET /students", students_page_sql(False, False), lambda s: (s["student_id"], 101)),
+    Check("GET /students?state", students_page_sql(True, False),
+          lambda s: (0, s["state"], 101)),
+    Check("GET /students?college", students_page_sql(False, True),
+          lambda s: (0, s["college"], 101)),
+    Check("GET /students?state&college", students_page_sql(True, True),
+          lambda s: (0, s["state"], s["college"], 101)),
+    Check("GET /students/pending-dbt", pending_dbt_sql(False, False),
+          lambda s: (0, 101)),
+    Check("GET /students/pending-dbt?state", pending_dbt_sql(True, False), lambda s: (s["state"], 0, 101)),
+    Check("GET /students/pending-dbt?count_only", pending_dbt_sql(False, True), lambda s: (), full_scan=True),
+    Check("GET /students/pending-dbt?count_only&state", pending_dbt_sql(True, True), lambda s: (s["state"],)),
+    Check("PUT /students/{id}", UPDATE_STUDENT_SQL, lambda s: ("x", None, None, s["state"], None, s["student_id"])),
+    Check("DELETE /students/{id}", DELETE_STUDENT_SQL, lambda s: (s["student_id"],)),
+    Check("GET /bank-accounts", BANK_ACCOUNTS_SQL, lambda s: (), full_scan=True),
+    Check("POST /bank-accounts", INSERT_BANK_ACCOUNT_SQL, lambda s: (s["student_id"], "EXPLAIN-ONLY", "SBI")),
+    Check("PUT /bank-accounts/account-status", UPDATE_STATUS_SQL, lambda s: (s["account_id"], True, None)),
+    Check("PUT /bank-accounts/account-status/batch", BATCH_STATUS_SQL,
+          lambda s: (s["account_ids"], [True] * len(s["account_ids"]), [None] * len(s["account_ids"]))),
+    Check("write-behind status flush", FLUSH_STATUS_SQL,
+          lambda s: (s["account_ids"], [True] * len(s["account_ids"]), [None] * len(s["account_ids"]))),
+    # What the RI triggers run for each row deleted from the parent table.
+    Check("cascade Students -> BankAccounts", "SELECT 1 FROM BankAccounts WHERE student_id=$1", lambda s: (s["student_id"],)),
+    Check("cascade Students -> Beneficiaries", "SELECT 1 FROM Beneficiaries WHERE student_id=$1", lambda s: (s["student_id"],)),
+    Check("cascade Schemes -> Beneficiaries", "SELECT 1 FROM Beneficiaries WHERE scheme_id=$1", lambda s: (s["scheme_id"],)),
+    Check("cascade BankAccounts -> AccountStatus", "SELECT 1 FROM AccountStatus WHERE account_id=$1", lambda s: (s["account_id"],)),
+    Check("cascade BankAccounts -> AccountStatusHistory", "SELECT 1 FROM AccountStatusHistory WHERE account_id=$1",
+          lambda s: (s["account_id"],)),
+    Check("cascade BankAccounts -> DbtFirstEnablement", "SELECT 1 FROM DbtFirstEnablement WHERE account_id=$1",
+          lambda s: (s["account_id"],)),
+    Check("incremental eligibility run", EVALUATE_STUDENTS_SQL, lambda s: ([s["scheme_id"]], [s["student_id"]])),
+    Check("first enablement increment", FIRST_ENABLEMENT_SQL, lambda s: (s["max_history_id"],)),
+    Check("GET /bank-accounts/{id}/status-as-of", STATUS_AS_OF_SQL, lambda s: (s["account_id"], datetime.now())),
+]
+
+SAMPLE_SQL = """
+SELECT s.student_id, s.state, s.college, ba.account_id,
+       (SELECT COALESCE(max(scheme_id), 0) FROM Schemes) AS scheme_id,
+       ARRAY(SELECT account_id FROM BankAccounts ORDER BY account_id LIMIT 100) AS account_ids,
+       (SELECT COALESCE(max(history_id), 0) FROM AccountStatusHistory) - 1000 AS max_history_id
+FROM Students s JOIN BankAccounts ba ON ba.student_id=s.student_id
+WHERE s.college IS NOT NULL
+ORDER BY s.student_id DESC LIMIT 1
+"""
+
+
+def seq_scans(plan: dict) -> List[str]:
+    found = [plan["Relation Name"]] if plan["Node Type"] == "Seq Scan" else []
+    for child in plan.get("Plans", ()):
+        found += seq_scans(child)
+    return found
+
+
+async def main(dsn: str, min_rows: int, run_migrations: bool) -> bool:
+    conn = await asyncpg.connect(dsn)
+    try:
+        if run_migrations:
+            await migrate(conn)
+        await conn.execute("ANALYZE")
+        sizes = {r["relname"]: r["reltuples"] for r in await conn.fetch(
+            "SELECT relname, reltuples::bigint FROM pg_class WHERE relkind IN ('r','p') AND relnamespace=current_schema()::regnamespace")}
+        if sizes.get("students", 0) < min_rows:
+            print(f"warning: Students has {sizes.get('students', 0)} rows; seed a benchmark-scale database first",
+                  file=sys.stderr)
+        sample = await conn.fetchrow(SAMPLE_SQL)
+        if sample is None:
+            raise SystemExit("no students with bank accounts to sample; seed the database first")
+        ok, results = True, {}
+        for check in CHECKS:
+            plan = json.loads(await conn.fetchval(f"EXPLAIN (FORMAT JSON) {check.sql}", *check.args(sample)))[0]["Plan"]
+            large = sorted({t for t in seq_scans(plan) if sizes.get(t, 0) >= min_rows})
+            passed = check.full_scan or not large
+            ok = ok and passed
+            results[check.name] = {"pass": passed, "seq_scans": large, "cost": plan["Total Cost"],
+                                   **({"allowed": "full listing"} if check.full_scan and large else {})}
+    finally:
+        await conn.close()
+    print(json.dumps({"ok": ok, "min_rows": min_rows, "checks": results}, indent=2))
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=DSN)
+    parser.add_argument("--min-rows", type=int, default=10_000, help="tables at least this big must not be seq scanned")
+    parser.add_argument("--no-migrate", action="store_true", help="check the schema as it is")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(main(args.dsn, args.min_rows, not args.no_migrate)) else 1)
@@ -0,0 +1,79 @@
+"""Compare the default list-endpoint response path with RecordJSONResponse.
+
+Rows are real asyncpg Records shaped like GET /bank-accounts, generated
+server-side with generate_series, so no tables need to be seeded:
+
+    python -m bench.json_encoding --rows 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import List
+
+import asyncpg
+from pydantic import TypeAdapter
+
+from core.config import DSN
+from core.responses import RecordJSONResponse
+from models.bank_account import BankAccountOut
+
+ROWS_SQL = """
+SELECT g AS account_id, 'ACC' || g AS account_number, 'Bank ' || (g % 40) AS bank_name,
+       g / 3 AS student_id, 'Student ' || g AS name,
+       g % 2 = 0 AS aadhaar_linked, g % 3 = 0 AS dbt_enabled,
+       TIMESTAMP '2025-01-01' + g * INTERVAL '1 second' AS last_updated
+FROM generate_series(1, $1) AS g
+"""
+
+adapter = TypeAdapter(List[BankAccountOut])
+
+
+def default_path(rows) -> bytes:
+    # What FastAPI does for `return [dict(r) for r in rows]` with response_model=List[BankAccountOut]:
+    # validate, dump in JSON mode, then JSONResponse's json.dumps.
+    value = adapter.validate_python([dict(r) for r in rows])
+    payload = adapter.dump_python(value, mode="json")
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def fast_path(rows) -> bytes:
+    return RecordJSONResponse(rows).body
+
+
+def best_of(fn, rows, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(rows)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+async def main(sizes: List[int], repeat: int):
+    conn = await asyncpg.connect(DSN)
+    try:
+        results = []
+        for n in sizes:
+            rows = await conn.fetch(ROWS_SQL, n)
+            assert json.loads(default_path(rows[:100])) == json.loads(fast_path(rows[:100]))
+            default_s = best_of(default_path, rows, repeat)
+            fast_s = best_of(fast_path, rows, repeat)
+            results.append({
+                "rows": n,
+                "default_s": round(default_s, 4),
+                "fast_s": round(fast_s, 4),
+                "speedup": round(default_s / fast_s, 1),
+            })
+            del rows
+        print(json.dumps(results, indent=2))
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat))
@@ -0,0 +1,313 @@
+"""Open-loop load generator for the server_new-py routes.
+
+Requests are fired on a fixed schedule (``--rate`` per second across all
+endpoints, split by weight) whether or not earlier ones have finished, and
+latency is measured from each request's scheduled start, so a slow server
+cannot hide queueing delay. PUT and DELETE go to students, schemes and
+awareness rows the run created itself through the API (a batch before the
+clock starts, plus whatever its POSTs create); every row the run created is
+removed at the end. Prints per-endpoint throughput, p50/p95/p99 and a count
+of non-2xx responses by status as JSON:
+
+    uvicorn main:app --workers 4 &
+    python -m bench.load --base-url http://localhost:8000 --rate 200 --duration 60 --out run.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from itertools import count
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import asyncpg
+import httpx
+
+from core.config import DSN
+
+
+class Endpoint(NamedTuple):
+    name: str
+    weight: float
+    build: Callable[["Context"], tuple]
+    # Called with the response of a successful request, e.g. to remember a created id.
+    record: Optional[Callable[["Context", httpx.Response], None]] = None
+    # Event streams never finish: latency is to the first event, then the stream is closed.
+    stream: bool = False
+
+
+# Kinds of row the run creates to update and delete: (POST path, id field, cleanup SQL).
+OWN_ROWS = {
+    "students": ("/students/", "student_id", "DELETE FROM Students WHERE student_id = ANY($1)"),
+    "schemes": ("/schemes/", "scheme_id", "DELETE FROM Schemes WHERE scheme_id = ANY($1)"),
+    "awareness": ("/awareness/", "content_id", "DELETE FROM AwarenessContent WHERE content_id = ANY($1)"),
+}
+
+
+class Context:
+    def __init__(self, rng: random.Random, max_student: int, max_account: int, scheme_ids: List[int],
+                 content_ids: List[int], max_history: int):
+        self.rng = rng
+        self.max_student = max(max_student, 1)
+        self.max_account = max(max_account, 1)
+        # Small tables with gaps left by deletes: pick from the ids that exist.
+        self.scheme_ids = scheme_ids or [1]
+        self.content_ids = content_ids or [1]
+        self.max_history = max_history
+        self.serial = count()
+        self.run = f"{int(time.time())}{rng.randrange(1000):03d}"
+        # Rows this run created: updatable ones are only ever PUT, deletable ones DELETEd
+        # at most once, so neither kind of request can land on a missing row.
+        self.updatable: Dict[str, List[int]] = defaultdict(list)
+        self.deletable: Dict[str, List[int]] = defaultdict(list)
+        self.created: Dict[str, List[int]] = defaultdict(list)
+
+    def student_id(self) -> int:
+        return self.rng.randint(1, self.max_student)
+
+    def account_id(self) -> int:
+        return self.rng.randint(1, self.max_account)
+
+    def new_student(self) -> dict:
+        n = next(self.serial)
+        return {"name": f"Load {self.run}-{n}", "email": f"load{self.run}-{n}@example.edu",
+                "phone": None, "state": self.rng.choice(("Karnataka", "Bihar", "Kerala")), "college": None}
+
+    def new_row(self, kind: str) -> dict:
+        if kind == "students":
+            return self.new_student()
+        if kind == "schemes":
+            return {"scheme_name": f"Load {self.run}-{next(self.serial)}", "department": None}
+        return {"title": f"Load {self.run}-{next(self.serial)}", "content": "x"}
+
+    def own(self, kind: str) -> int:
+        return self.rng.choice(self.updatable[kind])
+
+    def take(self, kind: str) -> Optional[int]:
+        rows = self.deletable[kind]
+        return rows.pop(self.rng.randrange(len(rows))) if rows else None
+
+    def as_of(self) -> str:
+        # Anywhere from the seed's first history (2024-01) until now.
+        start = datetime(2024, 1, 1).timestamp()
+        return datetime.fromtimestamp(self.rng.uniform(start, time.time()), timezone.utc).isoformat()
+
+    def status(self) -> dict:
+        return {"account_id": self.account_id(),
+                "aadhaar_linked": self.rng.choice((True, False, None)),
+                "dbt_enabled": self.rng.choice((True, False, None))}
+
+
+def _bulk_csv(ctx: Context) -> bytes:
+    rows = [ctx.new_student() for _ in range(100)]
+    return ("name,email,phone,state,college\n" + "".join(f"{r['name']},{r['email']},,{r['state']},\n" for r in rows)).encode()
+
+
+def _created(kind: str) -> Callable[[Context, httpx.Response], None]:
+    def record(ctx: Context, r: httpx.Response):
+        row_id = r.json()[OWN_ROWS[kind][1]]
+        ctx.created[kind].append(row_id)
+        ctx.deletable[kind].append(row_id)
+    return record
+
+
+def _delete(kind: str) -> Callable[[Context], Optional[tuple]]:
+    # None when everything created so far has been deleted; the request is then skipped.
+    def build(ctx: Context) -> Optional[tuple]:
+        row_id = ctx.take(kind)
+        return None if row_id is None else ("DELETE", f"{OWN_ROWS[kind][0]}{row_id}", {})
+    return build
+
+
+ENDPOINTS: List[Endpoint] = [
+    Endpoint("GET /students", 20, lambda c: ("GET", "/students/", {"params": {"after_id": c.student_id(), "limit": 100}})),
+    Endpoint("GET /students?state", 10, lambda c: ("GET", "/students/", {"params": {"state": c.rng.choice(("Karnataka", "Bihar")), "limit": 100}})),
+    Endpoint("GET /students/pending-dbt", 10, lambda c: ("GET", "/students/pending-dbt", {"params": {"after_id": c.student_id()}})),
+    Endpoint("GET /students/pending-dbt?count_only", 2, lambda c: ("GET", "/students/pending-dbt", {"params": {"count_only": "true", "state": "Kerala"}})),
+    Endpoint("POST /students", 5, lambda c: ("POST", "/students/", {"json": c.new_student()}), _created("students")),
+    Endpoint("POST /students/bulk", 0.2, lambda c: ("POST", "/students/bulk", {"files": {"file": ("load.csv", _bulk_csv(c), "text/csv")}})),
+    Endpoint("PUT /students/{id}", 3, lambda c: ("PUT", f"/students/{c.own('students')}", {"json": c.new_student()})),
+    Endpoint("DELETE /students/{id}", 1, _delete("students")),
+    Endpoint("GET /bank-accounts", 0.1, lambda c: ("GET", "/bank-accounts/", {"params": {"format": "ndjson"}})),
+    Endpoint("POST /bank-accounts", 3, lambda c: ("POST", "/bank-accounts/", {"json": {"student_id": c.student_id(), "account_number": f"LOAD{c.run}{next(c.serial)}", "bank_name": "SBI"}})),
+    Endpoint("PUT /bank-accounts/account-status", 15, lambda c: ("PUT", "/bank-accounts/account-status", {"json": c.status()})),
+    Endpoint("PUT /bank-accounts/account-status/batch", 2, lambda c: ("PUT", "/bank-accounts/account-status/batch", {"json": [c.status() for _ in range(100)]})),
+    # A ts before the account's first recorded change answers 404; expect some under non_2xx.
+    Endpoint("GET /bank-accounts/{id}/status-as-of", 3, lambda c: ("GET", f"/bank-accounts/{c.account_id()}/status-as-of", {"params": {"ts": c.as_of()}})),
+    # A client resuming a little behind: replays ~100 events, then would follow live ones.
+    Endpoint("GET /bank-accounts/changes", 1, lambda c: ("GET", "/bank-accounts/changes", {"params": {"since": max(c.max_history - 100, 0)}}),
+             stream=True),
+    Endpoint("GET /analytics/dbt-coverage", 1, lambda c: ("GET", "/analytics/dbt-coverage", {})),
+    Endpoint("GET /analytics/dbt-enablement", 1, lambda c: ("GET", "/analytics/dbt-enablement", {})),
+    Endpoint("GET /status-index/accounts/count", 3, lambda c: ("GET", "/status-index/accounts/count", {"params": {"dbt_enabled": "false", "state": c.rng.choice(("Karnataka", "Bihar"))}})),
+    Endpoint("GET /status-index/accounts", 3, lambda c: ("GET", "/status-index/accounts", {"params": {"dbt_enabled": "true", "after_id": c.account_id()}})),
+    Endpoint("GET /status-index/students/pending-dbt/count", 2, lambda c: ("GET", "/status-index/students/pending-dbt/count", {"params": {"state": "Kerala"}})),
+    Endpoint("GET /status-index/students/pending-dbt", 2, lambda c: ("GET", "/status-index/students/pending-dbt", {"params": {"after_id": c.student_id()}})),
+    Endpoint("GET /eligibility/rules", 1, lambda c: ("GET", "/eligibility/rules", {})),
+    Endpoint("GET /eligibility/runs", 1, lambda c: ("GET", "/eligibility/runs", {})),
+    # Overlapping runs are refused with 409, which shows under non_2xx.
+    Endpoint("POST /eligibility/runs", 0.05, lambda c: ("POST", "/eligibility/runs", {"params": {"mode": "incremental"}})),
+    Endpoint("GET /schemes", 8, lambda c: ("GET", "/schemes/", {})),
+    Endpoint("GET /schemes/{id}", 5, lambda c: ("GET", f"/schemes/{c.rng.choice(c.scheme_ids)}", {})),
+    Endpoint("POST /schemes", 0.2, lambda c: ("POST", "/schemes/", {"json": c.new_row("schemes")}), _created("schemes")),
+    Endpoint("PUT /schemes/{id}", 0.2, lambda c: ("PUT", f"/schemes/{c.own('schemes')}", {"json": c.new_row("schemes")})),
+    Endpoint("DELETE /schemes/{id}", 0.1, _delete("schemes")),
+    Endpoint("GET /awareness", 8, lambda c: ("GET", "/awareness/", {})),
+    Endpoint("GET /awareness/{id}", 5, lambda c: ("GET", f"/awareness/{c.rng.choice(c.content_ids)}", {})),
+    Endpoint("POST /awareness", 0.2, lambda c: ("POST", "/awareness/", {"json": c.new_row("awareness")}), _created("awareness")),
+    Endpoint("PUT /awareness/{id}", 0.2, lambda c: ("PUT", f"/awareness/{c.own('awareness')}", {"json": c.new_row("awareness")})),
+    Endpoint("DELETE /awareness/{id}", 0.1, _delete("awareness")),
+    Endpoint("GET /health", 1, lambda c: ("GET", "/health", {})),
+    Endpoint("GET /health/live", 1, lambda c: ("GET", "/health/live", {})),
+    Endpoint("GET /health/ready", 1, lambda c: ("GET", "/health/ready", {})),
+]
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p / 100 * len(sorted_values)))]
+
+
+async def discover(dsn: str) -> Dict[str, Any]:
+    conn = await asyncpg.connect(dsn)
+    try:
+        row = await conn.fetchrow("""SELECT (SELECT COALESCE(max(student_id), 0) FROM Students) AS max_student,
+                                            (SELECT COALESCE(max(account_id), 0) FROM BankAccounts) AS max_account,
+                                            ARRAY(SELECT scheme_id FROM Schemes) AS scheme_ids,
+                                            ARRAY(SELECT content_id FROM AwarenessContent) AS content_ids,
+                                            (SELECT COALESCE(max(history_id), 0) FROM AccountStatusHistory) AS max_history""")
+        return dict(row)
+    finally:
+        await conn.close()
+
+
+async def create_own_rows(client: httpx.AsyncClient, ctx: Context, endpoints: List[Endpoint], total: int):
+    """Before the clock starts, create the rows PUT and DELETE will target: enough that the
+    DELETEs expected in the run do not run out, and a few to update."""
+    share = sum(e.weight for e in endpoints)
+    for kind, (path, field, _) in OWN_ROWS.items():
+        deletes = sum(e.weight for e in endpoints if e.name == f"DELETE {path}{{id}}")
+        n_delete = int(total * deletes / share * 1.2) + 5 if deletes else 0
+        n_update = 10 if any(e.name == f"PUT {path}{{id}}" for e in endpoints) else 0
+        for i in range(n_delete + n_update):
+            r = await client.post(path, json=ctx.new_row(kind))
+            r.raise_for_status()
+            row_id = r.json()[field]
+            ctx.created[kind].append(row_id)
+            (ctx.deletable if i < n_delete else ctx.updatable)[kind].append(row_id)
+
+
+async def remove_own_rows(dsn: str, ctx: Context):
+    conn = await asyncpg.connect(dsn)
+    try:
+        for kind, (_, _, sql) in OWN_ROWS.items():
+            if ctx.created[kind]:
+                await conn.execute(sql, ctx.created[kind])
+        # POST /students/bulk does not return ids; its rows carry the run in their email.
+        await conn.execute("DELETE FROM Students WHERE email LIKE $1", f"load{ctx.run}-%")
+        # POST /bank-accounts adds accounts to seeded students, numbered after the run.
+        await conn.execute("DELETE FROM BankAccounts WHERE account_number LIKE $1", f"LOAD{ctx.run}%")
+    finally:
+        await conn.close()
+
+
+async def run(base_url: str, dsn: str, rate: float, duration: float, seed: int, connections: int,
+              only: List[str], timeout: float) -> dict:
+    rng = random.Random(seed)
+    ctx = Context(rng, **await discover(dsn))
+    endpoints = [e for e in ENDPOINTS if not only or e.name in only]
+    weights = [e.weight for e in endpoints]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    non_2xx: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    skipped: Dict[str, int] = defaultdict(int)
+    tasks = set()
+    total = int(rate * duration)
+
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        await create_own_rows(client, ctx, endpoints, total)
+
+        async def fire(endpoint: Endpoint, scheduled: float):
+            request = endpoint.build(ctx)
+            if request is None:
+                skipped[endpoint.name] += 1
+                return
+            method, path, kwargs = request
+            try:
+                if endpoint.stream:
+                    async with client.stream(method, path, **kwargs) as r:
+                        if 200 <= r.status_code < 300:
+                            async for line in r.aiter_lines():
+                                if line.startswith("data:"):
+                                    break
+                else:
+                    r = await client.request(method, path, **kwargs)
+                if not 200 <= r.status_code < 300:
+                    non_2xx[endpoint.name][r.status_code] += 1
+                elif endpoint.record:
+                    endpoint.record(ctx, r)
+            except httpx.HTTPError:
+                errors[endpoint.name] += 1
+            latencies[endpoint.name].append(time.perf_counter() - scheduled)
+
+        start = time.perf_counter()
+        for i in range(total):
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.create_task(fire(rng.choices(endpoints, weights)[0], scheduled))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+    await remove_own_rows(dsn, ctx)
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    report = {}
+    for e in endpoints:
+        values = sorted(latencies.get(e.name, ()))
+        if not values:
+            continue
+        report[e.name] = {
+            "requests": len(values),
+            # Transport failures and timeouts; answered requests outside 2xx are in non_2xx.
+            "errors": errors.get(e.name, 0),
+            "non_2xx": {str(code): n for code, n in sorted(non_2xx[e.name].items())},
+            **({"skipped": skipped[e.name]} if skipped.get(e.name) else {}),
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+        }
+    return {"commit": commit, "base_url": base_url, "rate": rate, "duration_s": round(elapsed, 2),
+            "seed": seed, "endpoints": report}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--dsn", default=DSN, help="used to discover id ranges and remove the rows the run created")
+    parser.add_argument("--rate", type=float, default=100, help="total requests per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--connections", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--endpoint", action="append", default=[], help="restrict to these endpoint names")
+    parser.add_argument("--out", help="also write the JSON report here")
+    args = parser.parse_args()
+    result = asyncio.run(run(args.base_url, args.dsn, args.rate, args.duration, args.seed,
+                             args.connections, args.endpoint, args.timeout))
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
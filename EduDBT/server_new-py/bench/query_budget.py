@@ -0,0 +1,177 @@
+"""Fail when an endpoint issues more statements or round trips than its budget.
+
+Runs the app in-process against the configured database (core.config), with
+an observer on the instrumented pool that sees every statement, COPY, cursor
+and BEGIN/COMMIT a request sends. Each endpoint is exercised a few times and
+its worst request is compared with the budget below, and every response must
+have the expected status (any 2xx/3xx unless the budget names one), so a
+request that fails before reaching the database cannot pass. When
+pg_stat_statements is installed, the rows the endpoint's statements returned
+and the shared blocks they touched are reported too, and the rows checked
+against ``max_rows_returned`` where one is set. Rows returned is not rows
+scanned; a plan that scans too much is explain_check's concern.
+
+    python -m bench.query_budget            # uses existing data
+    python -m bench.query_budget --reset    # reseeds 2k students first (destructive)
+
+Exits 1 on any budget overrun or unexpected status. It is a manual check, not
+part of a test suite: it needs a live database, so CI has to run it as its own
+step.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import asyncpg
+import httpx
+
+from core import instrumentation
+from core.config import DSN
+from main import app
+
+TX_MARKERS = ("BEGIN", "COMMIT", "ROLLBACK")
+
+
+class Budget(NamedTuple):
+    name: str
+    request: Callable[[dict], tuple]
+    statements: int
+    round_trips: int
+    max_rows_returned: Optional[int] = None
+    warm: bool = False  # issue once untimed first, e.g. to measure the cached path; its ETag goes in ctx["etag"]
+    expect: Tuple[int, ...] = ()  # statuses allowed; empty allows any 2xx/3xx
+
+
+def _student(ctx: dict) -> dict:
+    ctx["n"] += 1
+    return {"name": "Budget", "email": f"budget{ctx['run']}-{ctx['n']}@example.edu",
+            "phone": None, "state": "Kerala", "college": None}
+
+
+def _revalidate(path: str, **kwargs) -> Callable[[dict], tuple]:
+    return lambda c: ("GET", path, {**kwargs, "headers": {"If-None-Match": c.get("etag", "")}})
+
+
+def _account_number(ctx: dict) -> str:
+    ctx["n"] += 1
+    return f"B{ctx['run'] % 10**12}-{ctx['n']}"
+
+
+# GETs with ETags read the table change counters first; the primary's are cached, so that
+# costs one extra statement only on the first request after a write.
+BUDGETS: List[Budget] = [
+    Budget("GET /students", lambda c: ("GET", "/students/", {"params": {"limit": 100}}), 2, 2, max_rows_returned=101),
+    Budget("GET /students?state", lambda c: ("GET", "/students/", {"params": {"state": "Kerala", "limit": 100}}), 2, 2, max_rows_returned=101),
+    Budget("GET /students (not modified)", _revalidate("/students/", params={"limit": 100}), 0, 0, warm=True,
+           expect=(304,)),
+    Budget("GET /students/pending-dbt", lambda c: ("GET", "/students/pending-dbt", {"params": {"limit": 100}}), 2, 2),
+    Budget("GET /students/pending-dbt?count_only", lambda c: ("GET", "/students/pending-dbt", {"params": {"count_only": "true"}}), 2, 2),
+    Budget("POST /students", lambda c: ("POST", "/students/", {"json": _student(c)}), 1, 1),
+    Budget("POST /students/bulk", lambda c: ("POST", "/students/bulk", {"files": {"file": (
+        "b.csv", ("name,email,phone,state,college\n" + "".join(
+            f"{s['name']},{s['email']},,{s['state']},\n" for s in (_student(c) for _ in range(50)))).encode(), "text/csv")}}), 4, 6),
+    Budget("PUT /students/{id}", lambda c: ("PUT", f"/students/{c['student_id']}", {"json": _student(c)}), 1, 1),
+    Budget("GET /bank-accounts?format=ndjson", lambda c: ("GET", "/bank-accounts/", {"params": {"format": "ndjson"}}), 2, 4),
+    Budget("POST /bank-accounts", lambda c: ("POST", "/bank-accounts/", {"json": {
+        "student_id": c["student_id"], "account_number": _account_number(c), "bank_name": "SBI"}}), 1, 1),
+    Budget("PUT /bank-accounts/account-status", lambda c: ("PUT", "/bank-accounts/account-status", {"json": {
+        "account_id": c["account_id"], "dbt_enabled": True}}), 1, 1),
+    Budget("PUT /bank-accounts/account-status/batch", lambda c: ("PUT", "/bank-accounts/account-status/batch", {"json": [
+        {"account_id": c["account_id"] + i, "aadhaar_linked": True} for i in range(50)]}), 1, 1),
+    Budget("GET /schemes", lambda c: ("GET", "/schemes/", {}), 2, 2),
+    Budget("GET /schemes (cached)", lambda c: ("GET", "/schemes/", {}), 0, 0, warm=True),
+    Budget("POST /schemes", lambda c: ("POST", "/schemes/", {"json": {"scheme_name": "Budget", "department": None}}), 2, 2),
+    Budget("GET /awareness (cached)", lambda c: ("GET", "/awareness/", {}), 0, 0, warm=True),
+    Budget("POST /awareness", lambda c: ("POST", "/awareness/", {"json": {"title": "Budget", "content": None}}), 2, 2),
+    Budget("DELETE /students/{id}", lambda c: ("DELETE", f"/students/{c['student_id']}", {}), 1, 1),
+    # First request computes the snapshot: dictionaries and three COPYs, plus BEGIN/COMMIT.
+    Budget("GET /analytics/dbt-coverage", lambda c: ("GET", "/analytics/dbt-coverage", {}), 4, 6),
+    Budget("GET /analytics/dbt-coverage (cached)", lambda c: ("GET", "/analytics/dbt-coverage", {}), 0, 0, warm=True),
+    Budget("GET /health", lambda c: ("GET", "/health", {}), 1, 1),
+]
+
+
+async def pg_stat_snapshot(conn: asyncpg.Connection) -> Optional[Dict[int, tuple]]:
+    try:
+        rows = await conn.fetch(
+            "SELECT queryid, calls, rows, shared_blks_hit + shared_blks_read AS blocks FROM pg_stat_statements "
+            "WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())")
+    except asyncpg.PostgresError:
+        return None
+    return {r["queryid"]: (r["calls"], r["rows"], r["blocks"]) for r in rows}
+
+
+def pg_stat_delta(before, after) -> Optional[dict]:
+    if before is None or after is None:
+        return None
+    rows = blocks = 0
+    for queryid, (calls, r, b) in after.items():
+        calls0, r0, b0 = before.get(queryid, (0, 0, 0))
+        if calls > calls0:
+            rows += r - r0
+            blocks += b - b0
+    return {"rows_returned": rows, "shared_blocks": blocks}
+
+
+async def main(repeat: int, reset: bool) -> bool:
+    if reset:
+        from bench.seed import seed
+        await seed(DSN, 2_000, 42, 50, 5, 2, 2, True, True)
+    stats_conn = await asyncpg.connect(DSN)
+    seen: List[tuple] = []
+    # Background tasks (partition upkeep, replica checks) run outside any route; leave them out.
+    instrumentation.observers.append(lambda route, label: route != "-" and seen.append((route, label)))
+    ctx = {"run": time.time_ns(), "n": 0}
+    results, ok = {}, True
+    try:
+        has_pgss = await pg_stat_snapshot(stats_conn) is not None
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://budget") as client:
+                r = await client.post("/students/", json=_student(ctx))
+                ctx["student_id"] = r.json()["student_id"]
+                r = await client.post("/bank-accounts/", json={"student_id": ctx["student_id"], "account_number": _account_number(ctx), "bank_name": "SBI"})
+                ctx["account_id"] = r.json()["account_id"]
+                for budget in BUDGETS:
+                    if budget.warm:
+                        method, path, kwargs = budget.request(ctx)
+                        ctx["etag"] = (await client.request(method, path, **kwargs)).headers.get("etag", "")
+                    worst_statements = worst_trips = 0
+                    before = await pg_stat_snapshot(stats_conn) if has_pgss else None
+                    statuses = set()
+                    for _ in range(1 if budget.name.startswith("DELETE") else repeat):
+                        seen.clear()
+                        method, path, kwargs = budget.request(ctx)
+                        statuses.add((await client.request(method, path, **kwargs)).status_code)
+                        worst_trips = max(worst_trips, len(seen))
+                        worst_statements = max(worst_statements, sum(1 for _, label in seen if label not in TX_MARKERS))
+                    after = await pg_stat_snapshot(stats_conn) if has_pgss else None
+                    scanned = pg_stat_delta(before, after)
+                    passed = worst_statements <= budget.statements and worst_trips <= budget.round_trips
+                    passed = passed and all(code in budget.expect if budget.expect else 200 <= code < 400
+                                            for code in statuses)
+                    if budget.max_rows_returned is not None and scanned is not None:
+                        passed = passed and scanned["rows_returned"] <= budget.max_rows_returned * repeat
+                    ok = ok and passed
+                    results[budget.name] = {
+                        "pass": passed, "status": sorted(statuses),
+                        "statements": worst_statements, "statement_budget": budget.statements,
+                        "round_trips": worst_trips, "round_trip_budget": budget.round_trips,
+                        "pg_stat_statements": scanned,
+                    }
+    finally:
+        instrumentation.observers.clear()
+        await stats_conn.close()
+    print(json.dumps({"ok": ok, "pg_stat_statements": has_pgss, "endpoints": results}, indent=2))
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--reset", action="store_true", help="reseed the database with a small dataset first")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(main(args.repeat, args.reset)) else 1)
@@ -0,0 +1,181 @@
+"""Seed a local Postgres with synthetic DBT data at a chosen scale.
+
+Data is a pure function of --seed and --students: every chunk of students is
+generated from its own RNG, so reruns (and other machines) get identical rows.
+
+    python -m bench.seed --students 1000000 --reset
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List, NamedTuple
+
+import asyncpg
+
+from core.config import DSN
+from core.enablement import update_first_enablement
+from core.migrations import migrate
+from core.partitions import ensure_partitions
+from core.schema import create_tables
+
+CHUNK = 20_000
+EPOCH = datetime(2024, 1, 1)
+STATES = [
+    "Andhra Pradesh", "Assam", "Bihar", "Chhattisgarh", "Delhi", "Gujarat", "Haryana", "Jharkhand",
+    "Karnataka", "Kerala", "Madhya Pradesh", "Maharashtra", "Odisha", "Punjab", "Rajasthan",
+    "Tamil Nadu", "Telangana", "Uttar Pradesh", "Uttarakhand", "West Bengal",
+]
+BANKS = ["SBI", "PNB", "Bank of Baroda", "Canara Bank", "Union Bank", "HDFC", "ICICI", "Axis", "India Post Payments Bank"]
+ACCOUNTS_PER_STUDENT = ([0] * 10) + ([1] * 50) + ([2] * 30) + ([3] * 10)
+CREATED_AT_EXISTS_SQL = """
+SELECT EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema=current_schema() AND table_name='bankaccounts' AND column_name='created_at')
+"""
+TABLES = ("Students", "BankAccounts", "AccountStatus", "AccountStatusHistory", "Schemes", "Beneficiaries")
+
+
+class Chunk(NamedTuple):
+    students: List[tuple]
+    accounts: List[tuple]
+    statuses: List[tuple]
+    history: List[tuple]
+    beneficiaries: List[tuple]
+
+
+def generate_chunk(seed: int, index: int, first_student: int, count: int, first_account: int,
+                   colleges: int, schemes: int, history_per_account: int) -> Chunk:
+    rng = random.Random(seed * 1_000_003 + index)
+    chunk = Chunk([], [], [], [], [])
+    account_id = first_account
+    for student_id in range(first_student, first_student + count):
+        state = rng.choice(STATES)
+        college = f"College {rng.randrange(colleges)}" if rng.random() < 0.9 else None
+        chunk.students.append((
+            student_id, f"Student {student_id}", f"student{student_id}@example.edu",
+            str(6_000_000_000 + student_id), state, college,
+        ))
+        for _ in range(rng.choice(ACCOUNTS_PER_STUDENT)):
+            bank = rng.choice(BANKS)
+            aadhaar, dbt, first_change = False, False, None
+            changed = EPOCH + timedelta(minutes=rng.randrange(60 * 24 * 365))
+            for _ in range(rng.randint(0, 2 * history_per_account)):
+                changed += timedelta(minutes=rng.randrange(1, 60 * 24 * 30))
+                first_change = first_change or changed
+                aadhaar = aadhaar or rng.random() < 0.6
+                dbt = aadhaar and (dbt or rng.random() < 0.5)
+                chunk.history.append((account_id, aadhaar, dbt, changed))
+            # created_at as migration 4 backfills it, so fresh and migrated databases get the same rows.
+            chunk.accounts.append((account_id, student_id, f"{bank[:3].upper()}{account_id:012d}", bank, first_change))
+            chunk.statuses.append((account_id, aadhaar, dbt, changed))
+            account_id += 1
+        for scheme_id in rng.sample(range(1, schemes + 1), k=min(schemes, rng.choice((0, 0, 1, 1, 2)))):
+            registered = (EPOCH + timedelta(days=rng.randrange(365))).date()
+            chunk.beneficiaries.append((student_id, scheme_id, rng.random() < 0.7, registered))
+    return chunk
+
+
+async def load_chunk(conn: asyncpg.Connection, chunk: Chunk, fk_checks: bool, created_at: bool):
+    async with conn.transaction():
+        if not fk_checks:
+            # Generated rows are FK-consistent by construction; skipping the RI triggers needs superuser.
+            await conn.execute("SET LOCAL session_replication_role = replica")
+        await conn.copy_records_to_table(
+            "students", records=chunk.students,
+            columns=("student_id", "name", "email", "phone", "state", "college"))
+        await conn.copy_records_to_table(
+            "bankaccounts", records=chunk.accounts if created_at else [a[:4] for a in chunk.accounts],
+            columns=("account_id", "student_id", "account_number", "bank_name", "created_at")[:5 if created_at else 4])
+        await conn.copy_records_to_table(
+            "accountstatus", records=chunk.statuses,
+            columns=("account_id", "aadhaar_linked", "dbt_enabled", "last_updated"))
+        await conn.copy_records_to_table(
+            "accountstatushistory", records=chunk.history,
+            columns=("account_id", "aadhaar_linked", "dbt_enabled", "changed_at"))
+        await conn.copy_records_to_table(
+            "beneficiaries", records=chunk.beneficiaries,
+            columns=("student_id", "scheme_id", "is_beneficiary", "date_registered"))
+
+
+async def seed(dsn: str, students: int, seed_value: int, colleges: int, schemes: int,
+               history_per_account: int, workers: int, reset: bool, fk_checks: bool) -> dict:
+    started = time.perf_counter()
+    conn = await asyncpg.connect(dsn)
+    await create_tables(conn)
+    if reset:
+        await conn.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+        if await conn.fetchval("SELECT to_regclass('analyticswatermarks') IS NOT NULL"):
+            await conn.execute("TRUNCATE AnalyticsWatermarks")
+    elif await conn.fetchval("SELECT EXISTS (SELECT 1 FROM Students)"):
+        raise SystemExit("Students is not empty; pass --reset to replace its contents")
+    # Before migration 4 the column does not exist yet; the migration then backfills it.
+    created_at = await conn.fetchval(CREATED_AT_EXISTS_SQL)
+    # Generated history starts at EPOCH; a partitioned history table needs months back to there.
+    await ensure_partitions(conn, since=EPOCH.date())
+    await conn.copy_records_to_table(
+        "schemes", records=[(i, f"Scheme {i}", f"Department {i % 7}") for i in range(1, schemes + 1)],
+        columns=("scheme_id", "scheme_name", "department"))
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    totals = dict.fromkeys(Chunk._fields, 0)
+
+    async def loader():
+        c = await asyncpg.connect(dsn)
+        try:
+            while (chunk := await queue.get()) is not None:
+                await load_chunk(c, chunk, fk_checks, created_at)
+                for field in Chunk._fields:
+                    totals[field] += len(getattr(chunk, field))
+        finally:
+            await c.close()
+
+    loaders = [asyncio.create_task(loader()) for _ in range(workers)]
+    next_account = 1
+    for index, first in enumerate(range(1, students + 1, CHUNK)):
+        # Generation runs in a thread so COPYs already queued keep streaming meanwhile.
+        chunk = await asyncio.to_thread(
+            generate_chunk, seed_value, index, first, min(CHUNK, students + 1 - first), next_account,
+            colleges, schemes, history_per_account)
+        next_account += len(chunk.accounts)
+        await queue.put(chunk)
+    for _ in loaders:
+        await queue.put(None)
+    await asyncio.gather(*loaders)
+    loaded = time.perf_counter()
+
+    for table, column in (("students", "student_id"), ("bankaccounts", "account_id"), ("accountstatus", "status_id"),
+                          ("accountstatushistory", "history_id"), ("schemes", "scheme_id"), ("beneficiaries", "ben_id")):
+        await conn.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), COALESCE((SELECT max({column}) FROM {table}), 0) + 1, false)")
+    # Secondary indexes are built once, after the load; no-op when an earlier run already applied them.
+    await migrate(conn)
+    await update_first_enablement(conn, rebuild=True)
+    await conn.execute("ANALYZE")
+    await conn.close()
+    rows = sum(totals.values())
+    return {
+        "seed": seed_value, "students": totals["students"], "accounts": totals["accounts"],
+        "history": totals["history"], "beneficiaries": totals["beneficiaries"], "schemes": schemes,
+        "load_s": round(loaded - started, 2), "total_s": round(time.perf_counter() - started, 2),
+        "rows_per_s": round(rows / (loaded - started)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=DSN)
+    parser.add_argument("--students", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--colleges", type=int, default=2_000)
+    parser.add_argument("--schemes", type=int, default=25)
+    parser.add_argument("--history-per-account", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=4, help="parallel COPY connections")
+    parser.add_argument("--reset", action="store_true", help="truncate existing data first")
+    parser.add_argument("--no-fk-checks", action="store_true", help="skip FK triggers while loading (superuser)")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(seed(
+        args.dsn, args.students, args.seed, args.colleges, args.schemes,
+        args.history_per_account, args.workers, args.reset, not args.no_fk_checks,
+    )), indent=2))
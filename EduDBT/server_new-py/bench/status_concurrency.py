@@ -0,0 +1,88 @@
+"""Hammer one account's status from many concurrent tasks and check history agrees with it.
+
+Runs the app in-process against the configured database and exits non-zero on
+any disagreement. It is a manual check, not part of a test suite: it needs a
+live database and writes (then deletes) a throwaway student and account. It
+refuses to run with WRITE_BEHIND=1, which folds queued updates into fewer
+history rows than requests.
+
+    python -m bench.status_concurrency --tasks 50 --updates 40
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import asyncpg
+import httpx
+
+from core.config import DSN, WRITE_BEHIND
+from main import app
+
+
+async def main(tasks: int, updates: int, seed: int) -> bool:
+    conn = await asyncpg.connect(DSN)
+    tag = f"bench-{time.time_ns()}"
+    student_id = await conn.fetchval(
+        "INSERT INTO Students (name,state) VALUES ($1,'BENCH') RETURNING student_id", tag
+    )
+    rng = random.Random(seed)
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                r = await client.post("/bank-accounts/", json={"student_id": student_id, "account_number": tag, "bank_name": "BENCH"})
+                r.raise_for_status()
+                account_id = r.json()["account_id"]
+
+                async def worker():
+                    latencies = []
+                    for _ in range(updates):
+                        body = {
+                            "account_id": account_id,
+                            "aadhaar_linked": rng.choice([True, False, None]),
+                            "dbt_enabled": rng.choice([True, False, None]),
+                        }
+                        start = time.perf_counter()
+                        (await client.put("/bank-accounts/account-status", json=body)).raise_for_status()
+                        latencies.append(time.perf_counter() - start)
+                    return latencies
+
+                start = time.perf_counter()
+                latencies = sorted(l for ls in await asyncio.gather(*(worker() for _ in range(tasks))) for l in ls)
+                elapsed = time.perf_counter() - start
+
+        current = await conn.fetchrow("SELECT aadhaar_linked, dbt_enabled FROM AccountStatus WHERE account_id=$1", account_id)
+        last = await conn.fetchrow(
+            "SELECT aadhaar_linked, dbt_enabled FROM AccountStatusHistory WHERE account_id=$1 ORDER BY history_id DESC LIMIT 1",
+            account_id,
+        )
+        history = await conn.fetchval("SELECT count(*) FROM AccountStatusHistory WHERE account_id=$1", account_id)
+        ok = history == tasks * updates and tuple(current) == tuple(last)
+        print(json.dumps({
+            "ok": ok,
+            "updates": tasks * updates,
+            "history_rows": history,
+            "current": dict(current),
+            "last_history": dict(last),
+            "updates_per_s": round(tasks * updates / elapsed, 1),
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+            "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+        }, indent=2))
+        return ok
+    finally:
+        await conn.execute("DELETE FROM Students WHERE student_id=$1", student_id)
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--updates", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if WRITE_BEHIND:
+        sys.exit("status_concurrency checks one history row per update; run it with WRITE_BEHIND=0")
+    sys.exit(0 if asyncio.run(main(args.tasks, args.updates, args.seed)) else 1)
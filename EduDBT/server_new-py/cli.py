@@ -0,0 +1,444 @@
+"""Non-interactive admin CLI for the DBT database.
+
+    python cli.py schema init
+    python cli.py import students students.csv --workers 4
+    python cli.py import accounts accounts.ndjson
+    python cli.py import status status.csv --rejects status.rejects.ndjson
+    python cli.py export pending-dbt -o pending.csv
+
+Imports are validated in the same way as POST /students/bulk, COPYed into a
+per-connection staging table and merged set-wise, one transaction per batch,
+across --workers connections. Each committed batch is recorded in a JSON
+checkpoint (default: <file>.checkpoint.json); rerunning the same command after
+an interruption skips the batches already committed. The checkpoint is
+removed once the import finishes.
+"""
+from abc import ABC, abstractmethod
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from datetime import date
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import asyncpg
+
+from core.bulk import (
+    ACCOUNT_COLUMNS, STATUS_COLUMNS, STUDENT_COLUMNS, AccountBatcher, StatusBatcher, StudentBatcher, iter_csv, iter_ndjson,
+)
+from core.config import BULK_CHUNK_SIZE, DSN, HISTORY_RETENTION_MONTHS
+from core import eligibility
+from core.enablement import update_first_enablement
+from core.export import _ndjson, fetch_chunks
+from core.migrations import MIGRATIONS, applied_versions, migrate
+from core.partitions import apply_retention, ensure_partitions
+from routers.bank_accounts import BANK_ACCOUNTS_SQL, BATCH_STATUS_SQL
+from routers.students import BULK_MERGE_SQL, PENDING_DBT_WHERE
+
+Batch = Tuple[str, List[tuple]]
+
+ACCOUNT_MERGE_SQL = """
+WITH ins AS (
+    INSERT INTO BankAccounts (student_id,account_number,bank_name)
+    SELECT st.student_id, st.account_number, st.bank_name FROM accounts_stage st
+    WHERE EXISTS (SELECT 1 FROM Students s WHERE s.student_id=st.student_id)
+    ORDER BY st.line
+    ON CONFLICT (account_number) DO NOTHING
+    RETURNING account_id, account_number
+),
+status AS (
+    INSERT INTO AccountStatus (account_id) SELECT account_id FROM ins
+)
+SELECT st.line, EXISTS (SELECT 1 FROM Students s WHERE s.student_id=st.student_id) AS student_exists
+FROM accounts_stage st
+WHERE NOT EXISTS (SELECT 1 FROM ins WHERE ins.account_number=st.account_number)
+ORDER BY st.line
+"""
+
+EXPORTS = {
+    "students": "SELECT student_id,name,email,phone,state,college FROM Students ORDER BY student_id",
+    "accounts": BANK_ACCOUNTS_SQL,
+    "pending-dbt": f"""SELECT s.student_id,s.name,s.email,s.phone,s.state,s.college
+                       FROM Students s WHERE {PENDING_DBT_WHERE} ORDER BY s.student_id""",
+    "history": "SELECT history_id,account_id,aadhaar_linked,dbt_enabled,changed_at FROM AccountStatusHistory ORDER BY history_id",
+}
+
+
+def log(msg: str):
+    print(msg, file=sys.stderr, flush=True)
+
+
+# -- schema ---------------------------------------------------------------
+
+async def create_database(dsn: str):
+    name = urlparse(dsn).path.lstrip("/")
+    conn = await asyncpg.connect(dsn, database="postgres")
+    try:
+        if not await conn.fetchval("SELECT 1 FROM pg_database WHERE datname=$1", name):
+            await conn.execute(f'CREATE DATABASE "{name.replace(chr(34), chr(34) * 2)}"')
+            log(f"created database {name}")
+    finally:
+        await conn.close()
+
+
+async def schema(dsn: str, action: str, target: Optional[int]) -> dict:
+    if action == "init":
+        await create_database(dsn)
+    conn = await asyncpg.connect(dsn)
+    try:
+        if action == "status":
+            applied = await applied_versions(conn)
+            return {"applied": applied, "pending": [m.version for m in MIGRATIONS if m.version not in applied]}
+        return {"schema": action, "applied": await migrate(conn, target)}
+    finally:
+        await conn.close()
+
+
+async def history(dsn: str, action: str, since: Optional[str], keep_months: int, drop: bool) -> dict:
+    conn = await asyncpg.connect(dsn)
+    try:
+        if action == "partitions":
+            return {"created": await ensure_partitions(conn, since=since and date.fromisoformat(since))}
+        return {"archived" if not drop else "dropped": await apply_retention(conn, keep_months, drop)}
+    finally:
+        await conn.close()
+
+
+async def run_eligibility(dsn: str, mode: str) -> dict:
+    conn = await asyncpg.connect(dsn)
+    try:
+        return await eligibility.run(conn, mode)
+    finally:
+        await conn.close()
+
+
+async def analytics(dsn: str, action: str, rebuild: bool) -> dict:
+    conn = await asyncpg.connect(dsn)
+    try:
+        return {action: await update_first_enablement(conn, rebuild)}
+    finally:
+        await conn.close()
+
+
+# -- import ---------------------------------------------------------------
+
+class Importer(ABC):
+    """How one kind of file is validated, staged and merged."""
+
+    stage: Optional[str] = None
+    # Rows sharing a key always go to the same worker, so their relative order survives parallelism.
+    shard_key: Optional[Callable[[tuple], int]] = None
+
+    @abstractmethod
+    def batcher(self, rows):
+        """A batcher turning parsed ``rows`` into validated, COPY-ready records."""
+
+    async def prepare(self, conn: asyncpg.Connection):
+        if self.stage:
+            await conn.execute(self.stage)
+
+    @abstractmethod
+    async def merge(self, conn: asyncpg.Connection, rows: List[tuple]) -> List[dict]:
+        """Write one batch; returns an error dict per rejected line."""
+
+
+class StudentImporter(Importer):
+    columns = STUDENT_COLUMNS
+    stage = ("CREATE TEMP TABLE students_stage (line INT, name TEXT, email TEXT, phone TEXT, state TEXT, college TEXT)"
+             " ON COMMIT DELETE ROWS")
+
+    def batcher(self, rows):
+        return StudentBatcher(rows)
+
+    async def merge(self, conn, rows):
+        async with conn.transaction():
+            await conn.copy_records_to_table("students_stage", records=rows, columns=("line", *STUDENT_COLUMNS))
+            conflicts = await conn.fetch(BULK_MERGE_SQL)
+        return [{"line": r["line"], "error": "email or phone already exists"} for r in conflicts]
+
+
+class AccountImporter(Importer):
+    columns = ACCOUNT_COLUMNS
+    stage = ("CREATE TEMP TABLE accounts_stage (line INT, student_id INT, account_number TEXT, bank_name TEXT)"
+             " ON COMMIT DELETE ROWS")
+
+    def batcher(self, rows):
+        return AccountBatcher(rows)
+
+    async def merge(self, conn, rows):
+        async with conn.transaction():
+            await conn.copy_records_to_table("accounts_stage", records=rows, columns=("line", *ACCOUNT_COLUMNS))
+            failed = await conn.fetch(ACCOUNT_MERGE_SQL)
+        return [{"line": r["line"], "error": "account number already exists" if r["student_exists"]
+                 else "Student ID does not exist"} for r in failed]
+
+
+class StatusImporter(Importer):
+    columns = STATUS_COLUMNS
+
+    @staticmethod
+    def shard_key(row: tuple) -> int:
+        return row[1]
+
+    def batcher(self, rows):
+        return StatusBatcher(rows)
+
+    async def merge(self, conn, rows):
+        # Same folding as PUT /bank-accounts/account-status/batch: one UPDATE and history row per account.
+        merged, lines = {}, {}
+        for line, account_id, aad, dbt in rows:
+            prev_aad, prev_dbt = merged.get(account_id, (None, None))
+            merged[account_id] = (aad if aad is not None else prev_aad, dbt if dbt is not None else prev_dbt)
+            lines.setdefault(account_id, []).append(line)
+        ids = sorted(merged)
+        missing = await conn.fetch(BATCH_STATUS_SQL, ids, [merged[i][0] for i in ids], [merged[i][1] for i in ids])
+        return [{"line": line, "error": "Account not found"} for r in missing for line in lines[r["account_id"]]]
+
+
+IMPORTERS = {"students": StudentImporter, "accounts": AccountImporter, "status": StatusImporter}
+
+
+class Batches:
+    """Cuts validated rows into numbered batches, routing by shard key when there is one."""
+
+    def __init__(self, batcher, size: int, shards: int, key: Optional[Callable[[tuple], int]]):
+        self.batcher = batcher
+        self.size = size
+        self.shards = shards if key else 1
+        self.key = key
+        self.buffers: List[List[tuple]] = [[] for _ in range(self.shards)]
+        self.seq = [0] * self.shards
+        self.ready: Deque[Tuple[int, Batch]] = deque()
+
+    def _emit(self, shard: int):
+        self.ready.append((shard, (f"{shard}:{self.seq[shard]}", self.buffers[shard])))
+        self.buffers[shard] = []
+        self.seq[shard] += 1
+
+    def next(self) -> Optional[Tuple[int, Batch]]:
+        while not self.ready:
+            rows = self.batcher.next_batch(self.size)
+            if not rows:
+                for shard, buf in enumerate(self.buffers):
+                    if buf:
+                        self._emit(shard)
+                break
+            for row in rows:
+                shard = self.key(row) % self.shards if self.key else 0
+                self.buffers[shard].append(row)
+                if len(self.buffers[shard]) >= self.size:
+                    self._emit(shard)
+        return self.ready.popleft() if self.ready else None
+
+
+class Checkpoint:
+    """Committed batch ids (and their merge-time rejections), rewritten atomically after each batch."""
+
+    def __init__(self, path: str, fingerprint: dict, restart: bool):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.done: Dict[str, dict] = {}
+        if os.path.exists(path) and not restart:
+            with open(path) as f:
+                saved = json.load(f)
+            if saved["fingerprint"] != fingerprint:
+                raise SystemExit(f"{path} belongs to a different file or settings; pass --restart to discard it")
+            self.done = saved["done"]
+
+    def mark(self, batch_id: str, result: dict):
+        self.done[batch_id] = result
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"fingerprint": self.fingerprint, "done": self.done}, f)
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def import_file(dsn: str, kind: str, path: str, fmt: Optional[str], workers: int, batch_size: int,
+                      checkpoint_path: Optional[str], restart: bool, rejects_path: Optional[str],
+                      progress_every: float) -> dict:
+    importer = IMPORTERS[kind]()
+    fmt = fmt or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+    stat = os.stat(path)
+    checkpoint = Checkpoint(checkpoint_path or path + ".checkpoint.json", {
+        "kind": kind, "file": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+        "format": fmt, "batch_size": batch_size, "shards": workers if importer.shard_key else 1,
+    }, restart)
+    if checkpoint.done:
+        log(f"resuming: {len(checkpoint.done)} batches already committed")
+
+    fp = open(path, "rb")
+    reader = iter_ndjson(fp, importer.columns) if fmt == "ndjson" else iter_csv(fp, importer.columns)
+    batcher = importer.batcher(reader)
+    batches = Batches(batcher, batch_size, workers, importer.shard_key)
+    queues = [asyncio.Queue(maxsize=2) for _ in range(batches.shards)]
+    started = time.perf_counter()
+    progress = {"rows": 0, "skipped": 0}
+
+    async def worker(queue: asyncio.Queue):
+        conn = await asyncpg.connect(dsn)
+        try:
+            await importer.prepare(conn)
+            while (batch := await queue.get()) is not None:
+                batch_id, rows = batch
+                rejected = await importer.merge(conn, rows)
+                checkpoint.mark(batch_id, {"loaded": len(rows) - len(rejected), "rejected": rejected})
+                progress["rows"] += len(rows)
+        finally:
+            await conn.close()
+
+    async def produce():
+        while item := await asyncio.to_thread(batches.next):
+            shard, (batch_id, rows) = item
+            if batch_id in checkpoint.done:
+                progress["skipped"] += len(rows)
+                continue
+            await queues[shard].put((batch_id, rows))
+        for i in range(workers):
+            await queues[i % len(queues)].put(None)
+
+    async def report():
+        while True:
+            await asyncio.sleep(progress_every)
+            elapsed = time.perf_counter() - started
+            log(f"{kind}: {progress['rows']:,} rows loaded ({progress['rows'] / elapsed:,.0f} rows/s), "
+                f"{progress['skipped']:,} skipped from checkpoint, {len(batcher.rejected):,} invalid")
+
+    reporter = asyncio.create_task(report())
+    try:
+        async with asyncio.TaskGroup() as tg:
+            for i in range(workers):
+                tg.create_task(worker(queues[i % len(queues)]))
+            tg.create_task(produce())
+    except BaseException:
+        log(f"import interrupted; committed batches are in {checkpoint.path}, rerun the same command to resume")
+        raise
+    finally:
+        reporter.cancel()
+        fp.close()
+    elapsed = time.perf_counter() - started
+
+    rejected = batcher.rejected + [r for result in checkpoint.done.values() for r in result["rejected"]]
+    rejected.sort(key=lambda r: r["line"])
+    if rejects_path:
+        with open(rejects_path, "w") as f:
+            f.writelines(json.dumps(r) + "\n" for r in rejected)
+    checkpoint.remove()
+    return {
+        "kind": kind, "file": path, "received": batcher.received,
+        "loaded": sum(result["loaded"] for result in checkpoint.done.values()),
+        "rejected": len(rejected), "rejects_file": rejects_path, "first_rejects": rejected[:20],
+        "resumed_rows": progress["skipped"], "elapsed_s": round(elapsed, 2),
+        "rows_per_s": round(progress["rows"] / elapsed) if elapsed else None,
+    }
+
+
+# -- export ---------------------------------------------------------------
+
+async def export(dsn: str, what: str, out: str, fmt: str) -> dict:
+    q = EXPORTS[what]
+    started = time.perf_counter()
+    sink = sys.stdout.buffer if out == "-" else open(out, "wb")
+    try:
+        if fmt == "csv":
+            conn = await asyncpg.connect(dsn)
+            try:
+                result = await conn.copy_from_query(q, output=sink, format="csv", header=True)
+            finally:
+                await conn.close()
+            rows = int(result.split()[-1])
+        else:
+            rows = 0
+            pool = await asyncpg.create_pool(dsn, min_size=1, max_size=1)
+            try:
+                async for chunk in _ndjson(fetch_chunks(pool, q)):
+                    rows += chunk.count("\n")
+                    sink.write(chunk.encode())
+            finally:
+                await pool.close()
+    finally:
+        if sink is not sys.stdout.buffer:
+            sink.close()
+    elapsed = time.perf_counter() - started
+    return {"export": what, "format": fmt, "output": out, "rows": rows, "elapsed_s": round(elapsed, 2),
+            "rows_per_s": round(rows / elapsed) if elapsed else None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=DSN)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("schema", help="create the database and apply migrations")
+    p.add_argument("action", choices=("init", "upgrade", "status"),
+                   help="init also creates the database; upgrade only touches an existing one")
+    p.add_argument("--to", type=int, metavar="VERSION", help="stop after this migration")
+
+    p = sub.add_parser("history", help="AccountStatusHistory partition upkeep")
+    p.add_argument("action", choices=("partitions", "retention"),
+                   help="partitions creates missing months; retention detaches old ones into history_archive")
+    p.add_argument("--since", metavar="YYYY-MM-DD", help="partitions: first month to cover (default: this month)")
+    p.add_argument("--keep-months", type=int, default=HISTORY_RETENTION_MONTHS)
+    p.add_argument("--drop", action="store_true", help="retention: drop detached partitions instead of archiving")
+
+    p = sub.add_parser("analytics", help="derived analytics tables")
+    p.add_argument("action", choices=("first-enablement",),
+                   help="fold new AccountStatusHistory rows into DbtFirstEnablement")
+    p.add_argument("--rebuild", action="store_true", help="recompute from all history instead of since the last run")
+
+    p = sub.add_parser("eligibility", help="apply scheme eligibility rules to Beneficiaries")
+    p.add_argument("mode", choices=eligibility.MODES,
+                   help="incremental only re-evaluates students changed since the last run (and changed rules)")
+
+    p = sub.add_parser("import", help="load a CSV/NDJSON file")
+    p.add_argument("kind", choices=sorted(IMPORTERS))
+    p.add_argument("file")
+    p.add_argument("--format", choices=("csv", "ndjson"), help="default: from the file extension")
+    p.add_argument("--workers", type=int, default=4, help="parallel connections")
+    p.add_argument("--batch-size", type=int, default=BULK_CHUNK_SIZE, help="rows per transaction")
+    p.add_argument("--checkpoint", help="default: <file>.checkpoint.json")
+    p.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    p.add_argument("--rejects", help="write every rejected line to this NDJSON file")
+    p.add_argument("--progress-every", type=float, default=2.0, metavar="SECONDS")
+
+    p = sub.add_parser("export", help="dump a table or report")
+    p.add_argument("what", choices=sorted(EXPORTS))
+    p.add_argument("-o", "--output", default="-")
+    p.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+
+    args = parser.parse_args(argv)
+    if args.command == "schema":
+        job = schema(args.dsn, args.action, args.to)
+    elif args.command == "history":
+        job = history(args.dsn, args.action, args.since, args.keep_months, args.drop)
+    elif args.command == "eligibility":
+        job = run_eligibility(args.dsn, args.mode)
+    elif args.command == "analytics":
+        job = analytics(args.dsn, args.action, args.rebuild)
+    elif args.command == "import":
+        job = import_file(
+            args.dsn, args.kind, args.file, args.format, args.workers, args.batch_size,
+            args.checkpoint, args.restart, args.rejects, args.progress_every,
+        )
+    else:
+        job = export(args.dsn, args.what, args.output, args.format)
+    try:
+        result = asyncio.run(job)
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except BrokenPipeError:
+        # stdout closed early, e.g. piped into head; keep Python from complaining again at exit.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    print(json.dumps(result, indent=2, default=str), file=sys.stderr if args.command == "export" and args.output == "-" else sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import asyncio
+import heapq
+import itertools
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from starlette.responses import JSONResponse
+
+from core.config import (
+    ADMISSION_BULK_ROUTES, ADMISSION_MAX_INFLIGHT, ADMISSION_RETRY_AFTER, ADMISSION_ROUTE_LIMITS,
+    ADMISSION_WRITE_RESERVE,
+)
+from core.metrics import Counter, Gauge
+
+# Lower goes first when requests queue for a pooled connection.
+URGENT, WRITE, READ, BULK = 0, 1, 2, 3
+CLASSES = {URGENT: "urgent", WRITE: "write", READ: "read", BULK: "bulk"}
+priority: ContextVar[int] = ContextVar("priority", default=READ)
+
+# Never limited: probes and scrapes must answer even when everything else is shed.
+EXEMPT = ("/health", "/health/live", "/health/ready", "/metrics")
+# Long-lived streams hold no connection while idle, so only their route limit applies.
+STREAMS = ("/bank-accounts/changes",)
+
+
+class PoolTimeout(TimeoutError):
+    pass
+
+
+class PriorityGate:
+    """Lets at most ``size`` callers hold a connection; waiters are let in by priority,
+    then arrival, instead of asyncpg's first come, first served."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.held = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    def waiting(self) -> Dict[int, int]:
+        counts = defaultdict(int)
+        for p, _, fut in self._waiters:
+            if not fut.done():
+                counts[p] += 1
+        return counts
+
+    async def enter(self, prio: int, timeout: Optional[float]):
+        if self.held < self.size and not self._waiters:
+            self.held += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (prio, next(self._seq), fut))
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                # The slot was handed over just as we gave up; pass it on.
+                self.leave()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise PoolTimeout(f"no database connection free within {timeout}s") from None
+
+    def leave(self):
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.held -= 1
+
+
+class Rule(NamedTuple):
+    method: str
+    path: str
+    prefix: bool
+
+    @classmethod
+    def parse(cls, spec: str) -> "Rule":
+        method, _, path = spec.rpartition(" ")
+        prefix = path.endswith("*")
+        return cls(method.strip().upper() or "*", _normalize(path.rstrip("*")), prefix)
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.method not in ("*", method):
+            return False
+        return path.startswith(self.path) if self.prefix else path == self.path
+
+
+def _normalize(path: str) -> str:
+    return path.rstrip("/") or "/"
+
+
+def _first(rules: Sequence[Rule], method: str, path: str) -> Optional[Rule]:
+    # The most specific rule wins: exact over prefix, then the longer path.
+    found = [r for r in rules if r.matches(method, path)]
+    return max(found, key=lambda r: (not r.prefix, len(r.path))) if found else None
+
+
+class Admission:
+    """Per-worker admission control, checked before a request reaches its route.
+
+    Writes may fill all ``max_inflight`` slots, reads and bulk reports only up to
+    ``max_inflight - write_reserve``, and routes with a limit only that many at
+    once. Anything over is answered 503 with Retry-After straight away rather than
+    queued: a request that would wait for minutes is better retried elsewhere.
+    """
+
+    def __init__(self, max_inflight: int = ADMISSION_MAX_INFLIGHT, write_reserve: int = ADMISSION_WRITE_RESERVE,
+                 limits: Sequence[str] = ADMISSION_ROUTE_LIMITS, bulk: Sequence[str] = ADMISSION_BULK_ROUTES):
+        self.max_inflight = max_inflight
+        self.write_reserve = write_reserve
+        self.limits: Dict[Rule, int] = {}
+        for spec in limits:
+            rule, _, limit = spec.rpartition("=")
+            self.limits[Rule.parse(rule)] = int(limit)
+        self.bulk = [Rule.parse(spec) for spec in bulk]
+        self.inflight: Dict[int, int] = defaultdict(int)
+        self.route_inflight: Dict[Rule, int] = defaultdict(int)
+        self.rejected: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    @property
+    def total(self) -> int:
+        return sum(self.inflight.values())
+
+    @property
+    def accepting_reads(self) -> bool:
+        return self.total < self.max_inflight - self.write_reserve
+
+    def classify(self, method: str, path: str) -> int:
+        if _first(self.bulk, method, path):
+            return BULK
+        return READ if method in ("GET", "HEAD", "OPTIONS") else WRITE
+
+    def admit(self, cls: int, rule: Optional[Rule], stream: bool) -> Optional[str]:
+        """Take the slots, or say why not."""
+        if rule is not None and self.route_inflight[rule] >= self.limits[rule]:
+            return "route"
+        if not stream:
+            if self.total >= self.max_inflight or (cls != WRITE and not self.accepting_reads):
+                return "capacity"
+            self.inflight[cls] += 1
+        if rule is not None:
+            self.route_inflight[rule] += 1
+        return None
+
+    def release(self, cls: int, rule: Optional[Rule], stream: bool):
+        if not stream:
+            self.inflight[cls] -= 1
+        if rule is not None:
+            self.route_inflight[rule] -= 1
+
+
+admission = Admission()
+
+
+class AdmissionMiddleware:
+    """Applies ``admission`` and tags the request with its priority for the pool."""
+
+    def __init__(self, app, controller: Admission = admission):
+        self.app = app
+        self.admission = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path, method = _normalize(scope["path"]), scope["method"]
+        if path in EXEMPT:
+            priority.set(URGENT)
+            return await self.app(scope, receive, send)
+        cls = self.admission.classify(method, path)
+        rule = _first(list(self.admission.limits), method, path)
+        stream = path in STREAMS
+        reason = self.admission.admit(cls, rule, stream)
+        if reason:
+            self.admission.rejected[(CLASSES[cls], reason)] += 1
+            detail = "route concurrency limit reached" if reason == "route" else "server busy"
+            response = JSONResponse({"detail": detail}, status_code=503,
+                                    headers={"Retry-After": str(ADMISSION_RETRY_AFTER)})
+            return await response(scope, receive, send)
+        priority.set(cls)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.admission.release(cls, rule, stream)
+
+
+Gauge("admission_inflight", "Requests admitted and not yet finished, by class.", ("class",),
+      collect=lambda: [((CLASSES[c],), n) for c, n in admission.inflight.items()])
+Counter("admission_rejected_total", "Requests answered 503 by admission control.", ("class", "reason"),
+        collect=lambda: list(admission.rejected.items()))
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import struct
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+
+import numpy as np
+
+from core.admission import BULK, priority
+from core.config import ANALYTICS_TTL_SECONDS
+from core.metrics import Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# Labels are dictionary-encoded in SQL: code n is the n-th label (1-based), 0 means NULL,
+# so every column below is a fixed-width int and the COPY stream maps straight onto numpy.
+DICTIONARY_SQL = """
+SELECT ARRAY(SELECT state FROM Students WHERE state IS NOT NULL GROUP BY state ORDER BY state) AS states,
+       ARRAY(SELECT college FROM Students WHERE college IS NOT NULL GROUP BY college ORDER BY college) AS colleges,
+       ARRAY(SELECT bank_name FROM BankAccounts GROUP BY bank_name ORDER BY bank_name) AS banks
+"""
+STUDENT_CODES_SQL = """
+SELECT s.student_id, COALESCE(st.code, 0)::int, COALESCE(co.code, 0)::int
+FROM Students s
+LEFT JOIN unnest($1::text[]) WITH ORDINALITY st(state, code) ON st.state=s.state
+LEFT JOIN unnest($2::text[]) WITH ORDINALITY co(college, code) ON co.college=s.college
+"""
+ACCOUNT_CODES_SQL = """
+SELECT ba.account_id, ba.student_id, COALESCE(bk.code, 0)::int
+FROM BankAccounts ba
+LEFT JOIN unnest($1::text[]) WITH ORDINALITY bk(bank_name, code) ON bk.bank_name=ba.bank_name
+"""
+# Bit 0: aadhaar_linked, bit 1: dbt_enabled.
+STATUS_FLAGS_SQL = """
+SELECT account_id, (COALESCE(aadhaar_linked::int, 0) + 2 * COALESCE(dbt_enabled::int, 0))::int2 FROM AccountStatus
+"""
+
+_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00"
+AADHAAR, DBT = 1, 2
+
+
+def row_dtype(*fields: str) -> np.dtype:
+    """Binary COPY row layout for non-null fixed-width columns (ints, timestamps as
+    microseconds since 2000-01-01): a field count, then a length word before each value."""
+    layout = [("_n", ">i2")]
+    for i, f in enumerate(fields):
+        layout += [(f"_len{i}", ">i4"), (f"f{i}", f)]
+    return np.dtype(layout)
+
+
+STUDENT_ROW = row_dtype(">i4", ">i4", ">i4")
+ACCOUNT_ROW = row_dtype(">i4", ">i4", ">i4")
+STATUS_ROW = row_dtype(">i4", ">i2")
+
+
+def parse_copy(buf: bytes, dtype: np.dtype) -> np.ndarray:
+    if not buf.startswith(_COPY_HEADER):
+        raise ValueError("not a binary COPY stream")
+    start = len(_COPY_HEADER) + 4
+    start += 4 + struct.unpack_from(">i", buf, start)[0]
+    end = len(buf) - 2  # trailer: field count -1
+    return np.frombuffer(buf, dtype, count=(end - start) // dtype.itemsize, offset=start)
+
+
+async def copy_array(conn, sql: str, args: Sequence, dtype: np.dtype) -> np.ndarray:
+    chunks: List[bytes] = []
+
+    async def sink(chunk: bytes):
+        chunks.append(chunk)
+
+    await conn.copy_from_query(sql, *args, output=sink, format="binary")
+    return parse_copy(b"".join(chunks), dtype)
+
+
+def _groups(labels: Sequence[str], codes: np.ndarray, flags: np.ndarray) -> List[dict]:
+    n = len(labels) + 1
+    total = np.bincount(codes, minlength=n)
+    aadhaar = np.bincount(codes[(flags & AADHAAR) != 0], minlength=n)
+    dbt = np.bincount(codes[(flags & DBT) != 0], minlength=n)
+    keys = [*labels, None]
+    # Code 0 (NULL) is reported last.
+    order = [*range(1, n), 0]
+    return [_rates(keys[c - 1] if c else None, int(total[c]), int(aadhaar[c]), int(dbt[c]))
+            for c in order if total[c]]
+
+
+def _rates(key, accounts: int, aadhaar: int, dbt: int) -> dict:
+    return {
+        "key": key, "accounts": accounts, "aadhaar_linked": aadhaar, "dbt_enabled": dbt,
+        "aadhaar_linked_rate": aadhaar / accounts if accounts else 0.0,
+        "dbt_enabled_rate": dbt / accounts if accounts else 0.0,
+    }
+
+
+def aggregate(names, students: np.ndarray, accounts: np.ndarray, statuses: np.ndarray) -> dict:
+    # Ids are serials, so dense arrays indexed by id do the joins.
+    sid, aid = accounts["f1"].astype(np.int64), accounts["f0"].astype(np.int64)
+    state = np.zeros(int(students["f0"].max(initial=0)) + 1, np.int32)
+    college = np.zeros_like(state)
+    state[students["f0"]] = students["f1"]
+    college[students["f0"]] = students["f2"]
+    by_account = np.zeros(int(max(aid.max(initial=0), statuses["f0"].max(initial=0))) + 1, np.int16)
+    by_account[statuses["f0"]] = statuses["f1"]
+    flags = by_account[aid]
+    return {
+        "generated_at": datetime.now(timezone.utc),
+        "total": _rates(None, len(aid), int(np.count_nonzero(flags & AADHAAR)), int(np.count_nonzero(flags & DBT))),
+        "by_state": _groups(names["states"], state[sid], flags),
+        "by_college": _groups(names["colleges"], college[sid], flags),
+        "by_bank": _groups(names["banks"], accounts["f2"].astype(np.int32), flags),
+    }
+
+
+async def load_codes(conn) -> tuple:
+    """Labels plus the student, account and status streams, all from one snapshot so they agree."""
+    async with conn.transaction(isolation="repeatable_read", readonly=True):
+        names = await conn.fetchrow(DICTIONARY_SQL)
+        students = await copy_array(conn, STUDENT_CODES_SQL, (names["states"], names["colleges"]), STUDENT_ROW)
+        accounts = await copy_array(conn, ACCOUNT_CODES_SQL, (names["banks"],), ACCOUNT_ROW)
+        statuses = await copy_array(conn, STATUS_FLAGS_SQL, (), STATUS_ROW)
+    return names, students, accounts, statuses
+
+
+async def compute_coverage(conn) -> dict:
+    # numpy releases the GIL for the heavy parts; keep them off the event loop.
+    return await asyncio.to_thread(aggregate, *await load_codes(conn))
+
+
+class Snapshot:
+    """Last computed report, refreshed in the background once older than ``ttl``.
+
+    A full recompute reads every account, so only the first request ever waits for
+    one; later requests get the current snapshot while at most one refresh runs.
+    """
+
+    def __init__(self, name: str, compute: Callable[[Any], Awaitable[dict]], ttl: float = ANALYTICS_TTL_SECONDS):
+        self.name = name
+        self.compute = compute
+        self.ttl = ttl
+        self.value: Optional[dict] = None
+        self.refreshed_at = 0.0
+        self._refresh: Optional[asyncio.Task] = None
+        snapshots.append(self)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.refreshed_at if self.value is not None else 0.0
+
+    async def _load(self, pool):
+        priority.set(BULK)
+        started = time.perf_counter()
+        async with pool.acquire() as conn:
+            self.value = await self.compute(conn)
+        self.refreshed_at = time.monotonic()
+        REFRESH_SECONDS.observe(time.perf_counter() - started, self.name)
+
+    def _start(self, pool) -> asyncio.Task:
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self._load(pool))
+            self._refresh.add_done_callback(self._log_failure)
+        return self._refresh
+
+    def _log_failure(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Refresh of {self.name} failed: {task.exception()}")
+
+    async def get(self, pool) -> dict:
+        if self.value is None:
+            await asyncio.shield(self._start(pool))
+        elif self.age > self.ttl:
+            self._start(pool)
+        return self.value
+
+
+snapshots: List[Snapshot] = []
+coverage = Snapshot("dbt_coverage", compute_coverage)
+
+REFRESH_SECONDS = Histogram("analytics_refresh_seconds", "Time to recompute an analytics snapshot.", ("snapshot",),
+                            buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+Gauge("analytics_snapshot_age_seconds", "Age of each analytics snapshot.", ("snapshot",),
+      collect=lambda: [((s.name,), s.age) for s in snapshots])
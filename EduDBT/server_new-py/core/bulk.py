@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+import re
+from typing import IO, Iterator, List, Optional, Sequence, Set, Tuple
+
+from email_validator import SPECIAL_USE_DOMAIN_NAMES
+from pydantic import ValidationError
+
+from models.bank_account import BankAccountIn, UpdateAccountStatusIn
+from models.student import StudentIn
+
+STUDENT_COLUMNS = ("name", "email", "phone", "state", "college")
+# VARCHAR widths from the Students DDL; checked here so one long value cannot abort a whole COPY batch.
+STUDENT_COLUMN_LIMITS = {"name": 100, "email": 100, "phone": 15, "state": 50, "college": 100}
+ACCOUNT_COLUMNS = ("student_id", "account_number", "bank_name")
+ACCOUNT_COLUMN_LIMITS = {"account_number": 50, "bank_name": 100}
+STATUS_COLUMNS = ("account_id", "aadhaar_linked", "dbt_enabled")
+
+ParsedRow = Tuple[int, Optional[dict], Optional[str]]
+
+# Plain ASCII addresses that email-validator is guaranteed to accept; its full IDNA
+# checks cost ~150us a row and dominate bulk ingest, so only the rest go through EmailStr.
+_PLAIN_EMAIL = re.compile(
+    r"[A-Za-z0-9_%+-]{1,64}(?:\.[A-Za-z0-9_%+-]{1,64})*@((?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,63})"
+)
+
+
+class _PlainEmailStudent(StudentIn):
+    email: Optional[str]
+
+
+def _plain_email(email: str) -> Optional[str]:
+    m = _PLAIN_EMAIL.fullmatch(email)
+    if not m or len(email) > 254 or len(email.partition("@")[0]) > 64 or "--" in m.group(1):
+        return None
+    domain = m.group(1).lower()
+    if any(domain == d or domain.endswith("." + d) for d in SPECIAL_USE_DOMAIN_NAMES):
+        return None
+    return email[: m.start(1)] + domain
+
+
+def _clean(raw: dict, columns: Sequence[str] = STUDENT_COLUMNS) -> dict:
+    return {k: (raw.get(k) or None) for k in columns}
+
+
+def iter_csv(fp: IO[bytes], columns: Sequence[str] = STUDENT_COLUMNS) -> Iterator[ParsedRow]:
+    text = io.TextIOWrapper(fp, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(text)
+    for raw in reader:
+        yield reader.line_num, _clean(raw, columns), None
+
+
+def iter_ndjson(fp: IO[bytes], columns: Sequence[str] = STUDENT_COLUMNS) -> Iterator[ParsedRow]:
+    for line_no, line in enumerate(fp, start=1):
+        if not line.strip():
+            continue
+        try:
+            raw = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(raw, dict):
+            yield line_no, None, "expected a JSON object"
+            continue
+        yield line_no, _clean({k: (str(v) if v is not None else None) for k, v in raw.items()}, columns), None
+
+
+def _errors(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+
+
+def _check_limits(columns: Sequence[str], values: tuple, limits: dict) -> Optional[str]:
+    for col, value in zip(columns, values):
+        if value is not None and col in limits and len(value) > limits[col]:
+            return f"{col}: longer than {limits[col]} characters"
+    return None
+
+
+def _validate(row: dict) -> Tuple[Optional[tuple], Optional[str]]:
+    model = StudentIn
+    if row["email"] is not None and (normalized := _plain_email(row["email"])) is not None:
+        row["email"], model = normalized, _PlainEmailStudent
+    try:
+        student = model(**row)
+    except ValidationError as e:
+        return None, _errors(e)
+    values = tuple(getattr(student, c) for c in STUDENT_COLUMNS)
+    return values, _check_limits(STUDENT_COLUMNS, values, STUDENT_COLUMN_LIMITS)
+
+
+class StudentBatcher:
+    """Validates parsed rows into COPY-ready records, dropping in-file email/phone duplicates."""
+
+    duplicate_error = "duplicate email or phone within upload"
+
+    def __init__(self, rows: Iterator[ParsedRow]):
+        self.rows = rows
+        self.received = 0
+        self.rejected: List[dict] = []
+        self._seen: Set[tuple] = set()
+
+    def validate(self, row: dict) -> Tuple[Optional[tuple], Optional[str]]:
+        return _validate(row)
+
+    def keys(self, values: tuple) -> List[tuple]:
+        _, email, phone, _, _ = values
+        return [k for k in (("email", email), ("phone", phone)) if k[1]]
+
+    def next_batch(self, size: int) -> List[tuple]:
+        batch = []
+        for line, row, error in self.rows:
+            self.received += 1
+            values = None
+            if error is None:
+                values, error = self.validate(row)
+            if error is None:
+                keys = self.keys(values)
+                if any(k in self._seen for k in keys):
+                    error = self.duplicate_error
+            if error is not None:
+                self.rejected.append({"line": line, "error": error})
+                continue
+            self._seen.update(keys)
+            batch.append((line, *values))
+            if len(batch) >= size:
+                break
+        return batch
+
+
+class AccountBatcher(StudentBatcher):
+    """Bank-account rows for COPY; account numbers must be unique within the file."""
+
+    duplicate_error = "duplicate account_number within upload"
+
+    def validate(self, row: dict) -> Tuple[Optional[tuple], Optional[str]]:
+        try:
+            account = BankAccountIn(**row)
+        except ValidationError as e:
+            return None, _errors(e)
+        values = tuple(getattr(account, c) for c in ACCOUNT_COLUMNS)
+        return values, _check_limits(ACCOUNT_COLUMNS, values, ACCOUNT_COLUMN_LIMITS)
+
+    def keys(self, values: tuple) -> List[tuple]:
+        return [("account_number", values[1])]
+
+
+class StatusBatcher(StudentBatcher):
+    """Account status changes; repeats are legitimate and applied in file order."""
+
+    def validate(self, row: dict) -> Tuple[Optional[tuple], Optional[str]]:
+        try:
+            change = UpdateAccountStatusIn(**row)
+        except ValidationError as e:
+            return None, _errors(e)
+        return tuple(getattr(change, c) for c in STATUS_COLUMNS), None
+
+    def keys(self, values: tuple) -> List[tuple]:
+        return []
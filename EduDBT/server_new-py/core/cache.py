@@ -0,0 +1,96 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+import asyncpg
+
+from core.config import CACHE_CHANNEL, CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS
+from core.listener import listener
+from core.metrics import Counter
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, name: str, maxsize: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL_SECONDS):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        # A load that started before an invalidation must not repopulate stale data.
+        if generation is not None and generation != self.generation:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.generation += 1
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl,
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+        }
+
+
+_MISSING = object()
+caches: Dict[str, TTLCache] = {}
+
+
+def get_cache(name: str, **kwargs) -> TTLCache:
+    if name not in caches:
+        caches[name] = TTLCache(name, **kwargs)
+    return caches[name]
+
+
+async def cached(cache: TTLCache, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        generation = cache.generation
+        value = await load()
+        cache.set(key, value, generation)
+    return value
+
+
+async def invalidate(conn: asyncpg.Connection, name: str):
+    """Drop ``name`` locally and tell every other worker to do the same."""
+    caches[name].clear()
+    await conn.execute("SELECT pg_notify($1, $2)", CACHE_CHANNEL, name)
+
+
+def _on_invalidate(payload: Optional[str]):
+    if payload is None:
+        for cache in caches.values():
+            cache.clear()
+    elif payload in caches:
+        caches[payload].clear()
+
+
+listener.on(CACHE_CHANNEL, _on_invalidate)
+
+Counter("cache_hits_total", "Cache hits.", ("cache",), collect=lambda: (((n,), c.hits) for n, c in caches.items()))
+Counter("cache_misses_total", "Cache misses.", ("cache",), collect=lambda: (((n,), c.misses) for n, c in caches.items()))
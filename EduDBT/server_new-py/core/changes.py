@@ -0,0 +1,135 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Optional, Set
+
+from core.config import (
+    CHANGES_BUFFER, CHANGES_CHANNEL, CHANGES_HEARTBEAT_SECONDS, CHANGES_REPLAY_CHUNK, CHANGES_REPLAY_OVERLAP,
+)
+from core.listener import listener
+from core.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+# One compact event per history row. The status writes pass it to pg_notify and the replay
+# query selects it, so live and replayed events are byte-for-byte identical.
+STATUS_EVENT_JSON = """json_build_object('id', history_id, 'account_id', account_id, 'aadhaar_linked', aadhaar_linked,
+                  'dbt_enabled', dbt_enabled, 'changed_at', changed_at)::text"""
+NOTIFY_STATUS_EVENT = f"pg_notify('{CHANGES_CHANNEL}', {STATUS_EVENT_JSON})"
+
+REPLAY_SQL = f"""
+SELECT history_id, {STATUS_EVENT_JSON} AS event FROM AccountStatusHistory
+WHERE history_id > $1 ORDER BY history_id LIMIT $2
+"""
+
+
+class ChangeFeed:
+    """Fans status-change NOTIFY payloads out to SSE subscribers.
+
+    Each subscriber has a bounded queue. One that falls behind is cut off rather
+    than buffered without limit, and so is everyone when the LISTEN connection
+    drops, since notifications sent meanwhile are lost. Either way the stream ends
+    and the client's reconnect with Last-Event-ID replays the gap from history.
+    """
+
+    def __init__(self, maxsize: int = CHANGES_BUFFER):
+        self.maxsize = maxsize
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(self.maxsize)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def _cut_off(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+        self.dropped += 1
+        # None ends the stream; publish always leaves a free slot for it.
+        queue.put_nowait(None)
+
+    def publish(self, payload: Optional[str]):
+        if payload is None:
+            for queue in list(self.subscribers):
+                self._cut_off(queue)
+            return
+        try:
+            event = (json.loads(payload)["id"], payload)
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Ignoring malformed status change payload: {payload[:200]}")
+            return
+        self.published += 1
+        for queue in list(self.subscribers):
+            if queue.qsize() >= self.maxsize - 1:
+                self._cut_off(queue)
+            else:
+                queue.put_nowait(event)
+
+
+feed = ChangeFeed()
+listener.on(CHANGES_CHANNEL, feed.publish)
+
+
+def _event(history_id: int, data: str) -> str:
+    return f"id: {history_id}\nevent: status\ndata: {data}\n\n"
+
+
+async def stream_changes(db_pool, last_event_id: Optional[int]) -> AsyncIterator[str]:
+    """SSE body: replays history after ``last_event_id`` (if given), then follows live changes.
+
+    history_ids are drawn before commit, so a row with a lower id can commit after the
+    client saw a higher one. The replay therefore starts CHANGES_REPLAY_OVERLAP ids
+    earlier, and clients must de-duplicate events by id. Delivery is at-least-once for
+    rows committed within that many ids of their neighbours; a write that commits later
+    than that can still be missed on reconnect.
+    """
+    # Subscribe first so nothing committed while the replay runs is missed; events seen in
+    # both the replay and the live queue are sent once.
+    queue = feed.subscribe()
+    try:
+        yield "retry: 2000\n\n"
+        replayed: Set[int] = set()
+        if last_event_id is not None:
+            cursor, previous = max(last_event_id - CHANGES_REPLAY_OVERLAP, 0), set()
+            while True:
+                async with db_pool.acquire() as conn:
+                    rows = await conn.fetch(REPLAY_SQL, cursor, CHANGES_REPLAY_CHUNK)
+                if not rows:
+                    break
+                # Only the tail of a long replay can overlap the (bounded) live queue.
+                chunk = {r["history_id"] for r in rows}
+                replayed, previous = previous | chunk, chunk
+                cursor = rows[-1]["history_id"]
+                yield "".join(_event(r["history_id"], r["event"]) for r in rows)
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), CHANGES_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if item is None:
+                return
+            history_id, payload = item
+            if history_id in replayed:
+                continue
+            yield _event(history_id, payload)
+    finally:
+        feed.unsubscribe(queue)
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+Gauge("status_change_subscribers", "Open /bank-accounts/changes streams.", collect=lambda: [((), len(feed.subscribers))])
+Counter("status_change_events_total", "Status change events received from NOTIFY.",
+        collect=lambda: [((), feed.published)])
+Counter("status_change_cutoffs_total", "Streams ended because the client fell behind or LISTEN reconnected.",
+        collect=lambda: [((), feed.dropped)])
@@ -0,0 +1,104 @@
+import hashlib
+from datetime import timezone
+from email.utils import format_datetime
+from typing import Dict, Optional
+
+import asyncpg
+from fastapi import Depends, HTTPException, Request, status
+
+from core import db
+from core.cache import cached, get_cache
+from core.listener import listener
+
+# Raised by the migration 7 triggers, with the table name, after every writing statement.
+VERSIONS_CHANNEL = "dbt_table_versions"
+VERSIONS_SQL = db.hot("""
+SELECT table_name, sum(version)::int8 AS version, max(changed_at) AS changed_at FROM TableVersions GROUP BY table_name
+""")
+
+versions = get_cache("table_versions")
+listener.on(VERSIONS_CHANNEL, lambda payload: versions.clear())
+
+
+async def _fetch_versions(pool) -> Optional[Dict[str, tuple]]:
+    async with pool.acquire() as conn:
+        try:
+            rows = await conn.fetch(VERSIONS_SQL)
+        except asyncpg.exceptions.UndefinedTableError:
+            # Before migration 7 there is nothing to validate against.
+            return None
+    return {r["table_name"]: (r["version"], r["changed_at"]) for r in rows}
+
+
+async def table_versions(pool) -> Optional[Dict[str, tuple]]:
+    """(version, changed_at) per table, as seen by ``pool``.
+
+    The primary's are cached until a trigger NOTIFY says a table changed. Replicas
+    are asked every time: their counters replay in step with their data, which the
+    primary's would run ahead of.
+    """
+    if pool is db.pg_pool:
+        return await cached(versions, "all", lambda: _fetch_versions(pool))
+    return await _fetch_versions(pool)
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # If-None-Match uses the weak comparison: a W/ prefix does not matter.
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or any(t.removeprefix("W/") == etag for t in tags)
+
+
+def conditional(*tables: str, pool=db.get_read_connection):
+    """Route dependency for GETs whose body depends only on ``tables`` and the request.
+
+    The ETag hashes the request with the tables' change counters, so it is read
+    before the route's own query; a change landing in between only makes the next
+    request download again. A matching If-None-Match gets 304 before the route runs.
+    Last-Modified is informational: changed_at is stamped before commit, so it is
+    not trusted for If-Modified-Since.
+    """
+    async def check(request: Request, db_pool: asyncpg.Pool = Depends(pool)):
+        current = await table_versions(db_pool)
+        if current is None:
+            return
+        known = [current.get(t.lower(), (0, None)) for t in tables]
+        digest = hashlib.blake2b(digest_size=12)
+        digest.update(repr((request.url.path, request.url.query, request.headers.get("accept", ""),
+                            [version for version, _ in known])).encode())
+        headers = {"ETag": f'"{digest.hexdigest()}"', "Cache-Control": "no-cache"}
+        changed = [changed_at for _, changed_at in known if changed_at is not None]
+        if changed:
+            headers["Last-Modified"] = format_datetime(max(changed).replace(tzinfo=timezone.utc), usegmt=True)
+        if _matches(request.headers.get("if-none-match"), headers["ETag"]):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        request.state.validators = headers
+
+    return Depends(check)
+
+
+class ConditionalMiddleware:
+    """Adds the validators computed by ``conditional`` to successful responses, and
+    forgets the cached counters after a successful write from this worker, so its
+    own clients see the change before the NOTIFY arrives."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        write = scope["method"] not in ("GET", "HEAD", "OPTIONS")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                if write and message["status"] < 400:
+                    versions.clear()
+                headers = scope.get("state", {}).get("validators")
+                if headers and 200 <= message["status"] < 300:
+                    extra = [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+                    message = {**message, "headers": [*message.get("headers", []), *extra]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
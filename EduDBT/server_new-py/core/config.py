@@ -5,3 +5,66 @@ DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_USER = os.getenv("DB_USER", "postgres")
 DB_PASS = os.getenv("DB_PASS", "root")
 DB_PORT = int(os.getenv("DB_PORT", 5432))
+DSN = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+PAGE_SIZE_DEFAULT = int(os.getenv("PAGE_SIZE_DEFAULT", 100))
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX", 1000))
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 5000))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", 10000))
+STATUS_BATCH_MAX = int(os.getenv("STATUS_BATCH_MAX", 10000))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", 60))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 1024))
+CACHE_CHANNEL = os.getenv("CACHE_CHANNEL", "dbt_cache_invalidate")
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "0") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE", 0.1))
+SLOW_QUERY_BUFFER = int(os.getenv("SLOW_QUERY_BUFFER", 100))
+DB_REPLICA_DSNS = [d.strip() for d in os.getenv("DB_REPLICA_DSNS", "").split(",") if d.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 5))
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", 2))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+HISTORY_MONTHS_AHEAD = int(os.getenv("HISTORY_MONTHS_AHEAD", 3))
+HISTORY_RETENTION_MONTHS = int(os.getenv("HISTORY_RETENTION_MONTHS", 0))  # 0 keeps every partition
+PARTITION_CHECK_INTERVAL = float(os.getenv("PARTITION_CHECK_INTERVAL", 3600))
+CHANGES_CHANNEL = os.getenv("CHANGES_CHANNEL", "dbt_status_changes")
+CHANGES_BUFFER = int(os.getenv("CHANGES_BUFFER", 256))
+CHANGES_REPLAY_CHUNK = int(os.getenv("CHANGES_REPLAY_CHUNK", 1000))
+CHANGES_REPLAY_OVERLAP = int(os.getenv("CHANGES_REPLAY_OVERLAP", 1000))  # history ids before Last-Event-ID replayed again
+CHANGES_HEARTBEAT_SECONDS = float(os.getenv("CHANGES_HEARTBEAT_SECONDS", 15))
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "0") == "1"  # queue PUT /bank-accounts/account-status and answer 202
+WRITE_BEHIND_WINDOW_MS = float(os.getenv("WRITE_BEHIND_WINDOW_MS", 250))
+WRITE_BEHIND_BATCH = int(os.getenv("WRITE_BEHIND_BATCH", 1000))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", 50000))
+WRITE_BEHIND_SUBMIT_TIMEOUT = float(os.getenv("WRITE_BEHIND_SUBMIT_TIMEOUT", 2))
+WRITE_BEHIND_DRAIN_SECONDS = float(os.getenv("WRITE_BEHIND_DRAIN_SECONDS", 30))
+ANALYTICS_TTL_SECONDS = float(os.getenv("ANALYTICS_TTL_SECONDS", 30))
+ENABLEMENT_REFRESH_INTERVAL = float(os.getenv("ENABLEMENT_REFRESH_INTERVAL", 60))
+ENABLEMENT_WATERMARK_LAG_SECONDS = float(os.getenv("ENABLEMENT_WATERMARK_LAG_SECONDS", 300))
+ELIGIBILITY_INTERVAL = float(os.getenv("ELIGIBILITY_INTERVAL", 0))  # seconds between automatic incremental runs; 0 = only on request
+ELIGIBILITY_COMPACT_INTERVAL = float(os.getenv("ELIGIBILITY_COMPACT_INTERVAL", 300))  # with no automatic runs, seconds between folding recorded changes to one per student
+STATUS_INDEX = os.getenv("STATUS_INDEX", "1") == "1"  # per-worker in-memory account status index
+STATUS_INDEX_REBUILD_DELAY = float(os.getenv("STATUS_INDEX_REBUILD_DELAY", 2))
+DB_ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", 5))  # seconds to wait for a pooled connection; 0 waits forever
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", 100))  # concurrent requests per worker
+ADMISSION_WRITE_RESERVE = int(os.getenv("ADMISSION_WRITE_RESERVE", 20))  # of those, held back for writes
+# "[METHOD ]/path=limit"; a trailing * matches the prefix.
+ADMISSION_ROUTE_LIMITS = [r.strip() for r in os.getenv(
+    "ADMISSION_ROUTE_LIMITS",
+    "GET /bank-accounts=4,GET /analytics/*=2,POST /students/bulk=2,POST /status-index/verify=1,GET /bank-accounts/changes=200",
+).split(",") if r.strip()]
+# Full listings and reports: they queue for connections behind everything else.
+ADMISSION_BULK_ROUTES = [r.strip() for r in os.getenv(
+    "ADMISSION_BULK_ROUTES", "GET /bank-accounts,GET /analytics/*,POST /students/bulk,POST /status-index/verify",
+).split(",") if r.strip()]
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 1))
+READY_MAX_WAITING = int(os.getenv("READY_MAX_WAITING", 10))  # requests queued for a connection before /health/ready fails
+DB_WORKERS = int(os.getenv("DB_WORKERS", os.getenv("WEB_CONCURRENCY", 1)))  # worker processes sharing the budget
+DB_CONNECTION_BUDGET = int(os.getenv("DB_CONNECTION_BUDGET", 20))  # connections all workers together may hold per server
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 0))  # 0 derives both from the budget
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 0))
+DB_POOL_MAX_QUERIES = int(os.getenv("DB_POOL_MAX_QUERIES", 50000))
+DB_POOL_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", 300))
+DB_CONNECT_RETRIES = int(os.getenv("DB_CONNECT_RETRIES", 5))
+DB_PRIME_STATEMENTS = os.getenv("DB_PRIME_STATEMENTS", "1") == "1"  # prepare hot statements on each new connection
+OPS_ENDPOINTS = os.getenv("OPS_ENDPOINTS", "0") == "1"  # serve /metrics, /cache/stats and /debug/slow-queries
+OPS_TOKEN = os.getenv("OPS_TOKEN", "")  # if set, those need "Authorization: Bearer <OPS_TOKEN>"
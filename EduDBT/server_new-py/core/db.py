@@ -1,39 +1,252 @@
 import asyncio
 import asyncpg
 from contextlib import asynccontextmanager
+import itertools
 import logging
-from typing import Optional
-from fastapi import HTTPException
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+from fastapi import HTTPException, Request
 
-from core.config import DB_NAME, DB_HOST, DB_USER, DB_PASS, DB_PORT
+from core.config import (
+    DSN, DB_CONNECT_RETRIES, DB_CONNECTION_BUDGET, DB_POOL_MAX_INACTIVE_LIFETIME, DB_POOL_MAX_QUERIES,
+    DB_POOL_MAX_SIZE, DB_POOL_MIN_SIZE, DB_PRIME_STATEMENTS, DB_REPLICA_DSNS, DB_WORKERS, READ_YOUR_WRITES_SECONDS, REPLICA_CHECK_INTERVAL, REPLICA_MAX_LAG_SECONDS,
+    READY_MAX_WAITING, STATUS_INDEX, WRITE_BEHIND,
+)
+from core.admission import admission
+from core.instrumentation import InstrumentedPool, current_route
+from core.listener import listener
+from core import eligibility
+from core.enablement import maintain as maintain_enablement
+from core.partitions import maintain as maintain_partitions
+from core.statusindex import status_index
+from core.writebehind import write_behind
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-pg_pool: Optional[asyncpg.pool.Pool] = None
+pg_pool: Optional[InstrumentedPool] = None
+
+PIN_COOKIE = "dbt_primary_until"
+# Lag is zero once everything received has been replayed; otherwise time since the last replayed commit.
+REPLICA_LAG_SQL = """
+SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+"""
+
+class Replica:
+    def __init__(self, pool: InstrumentedPool):
+        self.pool = pool
+        self.healthy = False
+        self.lag: Optional[float] = None
+
+    async def check(self):
+        try:
+            async with self.pool.acquire(timeout=REPLICA_CHECK_INTERVAL) as conn:
+                self.lag = float(await conn.fetchval(REPLICA_LAG_SQL, timeout=REPLICA_CHECK_INTERVAL))
+            healthy = self.lag <= REPLICA_MAX_LAG_SECONDS
+        except Exception as e:
+            logger.warning(f"Replica {self.pool.name} check failed: {e}")
+            self.lag, healthy = None, False
+        if healthy != self.healthy:
+            logger.info(f"Replica {self.pool.name} {'healthy' if healthy else 'unhealthy'} (lag={self.lag})")
+        self.healthy = healthy
+
+replicas: List[Replica] = []
+_replica_rr = itertools.count()
+
+async def _watch_replicas():
+    while True:
+        await asyncio.sleep(REPLICA_CHECK_INTERVAL)
+        await asyncio.gather(*(r.check() for r in replicas))
+
+async def _open_replicas():
+    for n, dsn in enumerate(DB_REPLICA_DSNS):
+        try:
+            pool = await create_pool(dsn, f"replica-{n}", writes=False)
+        except Exception as e:
+            logger.error(f"Replica {n} connection failed, reads stay on primary: {e}")
+            continue
+        replicas.append(Replica(pool))
+    await asyncio.gather(*(r.check() for r in replicas))
+
+# Statements prepared on every new pooled connection, so the first requests a worker
+# serves after a deploy find the backend's catalog caches and the client's type codecs
+# for them already loaded. Routers register their hot statements with hot() at import;
+# write statements are not primed on replicas.
+HOT_STATEMENTS: Dict[str, bool] = {}
+PARAM = re.compile(r"\$(\d+)")
+LISTENER_CONNECTIONS = 1
+CONNECTION_LIMIT_SQL = """
+SELECT current_setting('max_connections')::int - current_setting('superuser_reserved_connections')::int
+"""
+
+def hot(sql: str, write: bool = False) -> str:
+    HOT_STATEMENTS[sql] = write
+    return sql
+
+def pool_sizes(reserved: int = 0) -> Tuple[int, int]:
+    """(min, max) pool size for one worker: its share of DB_CONNECTION_BUDGET, less the
+    ``reserved`` connections it opens outside the pool, unless set explicitly."""
+    share = DB_CONNECTION_BUDGET // max(DB_WORKERS, 1) - reserved
+    if share < 1 and not DB_POOL_MAX_SIZE:
+        logger.warning(f"DB_CONNECTION_BUDGET={DB_CONNECTION_BUDGET} is too small for {DB_WORKERS} workers; using 1 connection each")
+    max_size = DB_POOL_MAX_SIZE or max(share, 1)
+    min_size = min(DB_POOL_MIN_SIZE or max(max_size // 2, 1), max_size)
+    return min_size, max_size
+
+async def _prime(conn: asyncpg.Connection, writes: bool) -> int:
+    primed = 0
+    for sql, write in HOT_STATEMENTS.items():
+        if write and not writes:
+            continue
+        # A cursor is prepared into the same statement cache fetch() and execute() use,
+        # and opening one only binds it: nothing runs, writes included.
+        nulls = [None] * max(map(int, PARAM.findall(sql)), default=0)
+        try:
+            async with conn.transaction():
+                await conn.cursor(sql, *nulls)
+            primed += 1
+        except asyncpg.PostgresError as e:
+            # Typically a table from a migration that has not run yet.
+            logger.debug(f"Could not prime statement: {e}")
+    return primed
+
+async def create_pool(dsn: str, name: str, reserved: int = 0, writes: bool = True) -> InstrumentedPool:
+    """Opens ``name``'s pool with its min_size connections already connected and primed."""
+    min_size, max_size = pool_sizes(reserved)
+    opened = [0, 0]
+
+    async def init(conn):
+        opened[0] += 1
+        if DB_PRIME_STATEMENTS:
+            opened[1] = await _prime(conn, writes)
+
+    started = time.perf_counter()
+    pool = await asyncpg.create_pool(
+        dsn, min_size=min_size, max_size=max_size, max_queries=DB_POOL_MAX_QUERIES,
+        max_inactive_connection_lifetime=DB_POOL_MAX_INACTIVE_LIFETIME, init=init,
+    )
+    logger.info(f"Pool {name}: {opened[0]} of {max_size} connections open, {opened[1]} statements primed "
+                f"on each, in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return InstrumentedPool(pool, name=name)
+
+async def _check_budget(pool: InstrumentedPool):
+    async with pool.acquire() as conn:
+        limit = await conn.fetchval(CONNECTION_LIMIT_SQL)
+    if DB_CONNECTION_BUDGET > limit:
+        logger.warning(f"DB_CONNECTION_BUDGET={DB_CONNECTION_BUDGET} exceeds the {limit} connections Postgres allows")
 
 @asynccontextmanager
 async def lifespan(app):
     global pg_pool
-    dsn = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    for i in range(3):
+    started = time.perf_counter()
+    for i in range(DB_CONNECT_RETRIES):
         try:
-            pg_pool = await asyncpg.create_pool(dsn, min_size=1, max_size=10)
+            pg_pool = await create_pool(DSN, "primary", reserved=LISTENER_CONNECTIONS)
             logger.info("Connected to Postgres")
             break
         except Exception as e:
             logger.error(f"DB connection failed: {e}")
-            await asyncio.sleep(2 ** i)
+            if i + 1 < DB_CONNECT_RETRIES:
+                await asyncio.sleep(min(2 ** i, 30))
     if not pg_pool:
         raise RuntimeError("Failed to connect to DB")
+    await _check_budget(pg_pool)
+    await listener.start(DSN)
+    await _open_replicas()
+    watcher = asyncio.create_task(_watch_replicas()) if replicas else None
+    partitions = asyncio.create_task(maintain_partitions(pg_pool))
+    enablement = asyncio.create_task(maintain_enablement(pg_pool))
+    eligibility_runs = asyncio.create_task(eligibility.maintain(pg_pool))
+    if WRITE_BEHIND:
+        write_behind.start(pg_pool)
+    if STATUS_INDEX:
+        # Loads in the background after LISTEN is up, so no change is missed; until then
+        # /status-index answers 503.
+        status_index.start(pg_pool)
+    logger.info(f"Startup took {(time.perf_counter() - started) * 1000:.0f} ms")
 
     yield
 
+    # Drain queued status updates while the pool is still open.
+    await write_behind.stop()
+    partitions.cancel()
+    enablement.cancel()
+    eligibility_runs.cancel()
+    await eligibility.stop()
+    await status_index.stop()
+    if watcher:
+        watcher.cancel()
+    for r in replicas:
+        await r.pool.close()
+    replicas.clear()
+    await listener.stop()
     if pg_pool:
         await pg_pool.close()
         logger.info("DB pool closed")
 
-async def get_db_connection():
+async def readiness() -> Tuple[bool, dict]:
+    """Whether this worker should get traffic. Judged from pool and admission state; the
+    database is only pinged when a connection is free, so this never queues itself."""
+    if not pg_pool:
+        return False, {"status": "unavailable"}
+    waiting = sum(pg_pool.gate.waiting().values())
+    detail = {
+        "pool": {"in_use": pg_pool.gate.held, "max": pg_pool.gate.size, "waiting": waiting},
+        "inflight": admission.total,
+    }
+    if waiting >= READY_MAX_WAITING or not admission.accepting_reads:
+        return False, {"status": "saturated", **detail}
+    if pg_pool.saturated:
+        return True, {"status": "busy", **detail}
+    try:
+        async with pg_pool.acquire(timeout=1) as conn:
+            await conn.fetchval("SELECT 1", timeout=1)
+    except Exception as e:
+        return False, {"status": "db unavailable", "error": str(e), **detail}
+    return True, {"status": "ok", **detail}
+
+def _track_route(request: Request):
+    route = request.scope.get("route")
+    current_route.set(route.path if route else request.url.path)
+
+async def get_db_connection(request: Request):
+    _track_route(request)
     if pg_pool:
         return pg_pool
     raise HTTPException(503, "Database connection not available")
+
+def _pinned_to_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+async def get_read_connection(request: Request):
+    """Pool for read-only routes: a healthy, caught-up replica, else the primary."""
+    if replicas and not _pinned_to_primary(request):
+        healthy = [r for r in replicas if r.healthy]
+        if healthy:
+            _track_route(request)
+            return healthy[next(_replica_rr) % len(healthy)].pool
+    return await get_db_connection(request)
+
+class ReadYourWritesMiddleware:
+    """After a successful write, pins the client to the primary for READ_YOUR_WRITES_SECONDS via a cookie."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS") or not replicas or READ_YOUR_WRITES_SECONDS <= 0:
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + READ_YOUR_WRITES_SECONDS
+                cookie = f"{PIN_COOKIE}={int(until) + 1}; Max-Age={int(READ_YOUR_WRITES_SECONDS) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
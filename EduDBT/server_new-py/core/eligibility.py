@@ -0,0 +1,206 @@
+import asyncio
+import logging
+from typing import List, Optional, Set
+
+import asyncpg
+
+from core.admission import BULK, priority
+from core.config import ELIGIBILITY_COMPACT_INTERVAL, ELIGIBILITY_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+ELIGIBILITY_LOCK = 0x44425404
+MODES = ("incremental", "full")
+
+
+class RunInProgress(Exception):
+    pass
+
+
+# NULL state/college never match a list; each account requirement is met by any one account.
+ELIGIBLE = """(r.states IS NULL OR f.state = ANY(r.states))
+    AND (r.colleges IS NULL OR f.college = ANY(r.colleges))
+    AND (f.aadhaar_linked OR NOT r.require_aadhaar_linked)
+    AND (f.dbt_enabled OR NOT r.require_dbt_enabled)"""
+
+
+def evaluate_sql(scoped: bool) -> str:
+    """One statement that judges every (student, rule) pair for the rules in $1 and, with
+    ``scoped``, only the students in $2: grants (upserts) Beneficiaries rows for eligible
+    pairs and revokes granted rows that no longer qualify."""
+    students = "AND s.student_id = ANY($2)" if scoped else ""
+    accounts = "AND ba.student_id = ANY($2)" if scoped else ""
+    return f"""
+WITH facts AS (
+    SELECT s.student_id, s.state, s.college,
+           COALESCE(a.aadhaar_linked, false) AS aadhaar_linked, COALESCE(a.dbt_enabled, false) AS dbt_enabled
+    FROM Students s
+    LEFT JOIN (
+        SELECT ba.student_id, bool_or(asu.aadhaar_linked) AS aadhaar_linked, bool_or(asu.dbt_enabled) AS dbt_enabled
+        FROM BankAccounts ba JOIN AccountStatus asu ON asu.account_id=ba.account_id
+        WHERE true {accounts}
+        GROUP BY ba.student_id
+    ) a ON a.student_id=s.student_id
+    WHERE true {students}
+),
+rules AS (
+    SELECT * FROM SchemeEligibilityRules WHERE active AND scheme_id = ANY($1)
+),
+granted AS (
+    INSERT INTO Beneficiaries (student_id,scheme_id,is_beneficiary,date_registered)
+    SELECT f.student_id, r.scheme_id, true, CURRENT_DATE
+    FROM facts f JOIN rules r ON {ELIGIBLE}
+    ON CONFLICT (student_id,scheme_id) DO UPDATE
+    SET is_beneficiary=true, date_registered=COALESCE(Beneficiaries.date_registered, EXCLUDED.date_registered)
+    WHERE Beneficiaries.is_beneficiary IS NOT TRUE
+    RETURNING 1
+),
+revoked AS (
+    UPDATE Beneficiaries b SET is_beneficiary=false
+    FROM facts f, rules r
+    WHERE b.student_id=f.student_id AND b.scheme_id=r.scheme_id AND b.is_beneficiary
+      AND NOT COALESCE({ELIGIBLE}, false)
+    RETURNING 1
+)
+SELECT (SELECT count(*) FROM facts) AS students, (SELECT count(*) FROM granted) AS granted,
+       (SELECT count(*) FROM revoked) AS revoked
+"""
+
+
+EVALUATE_ALL_SQL = evaluate_sql(scoped=False)
+EVALUATE_STUDENTS_SQL = evaluate_sql(scoped=True)
+
+RULES_SQL = "SELECT scheme_id, evaluated_at IS NULL OR updated_at > evaluated_at AS changed FROM SchemeEligibilityRules WHERE active"
+CLAIM_CHANGES_SQL = "WITH c AS (DELETE FROM EligibilityChanges RETURNING student_id) SELECT ARRAY(SELECT DISTINCT student_id FROM c)"
+# Runs only need each student once, so without runs the table stays at one row per student.
+COMPACT_CHANGES_SQL = """
+WITH c AS (DELETE FROM EligibilityChanges RETURNING student_id)
+INSERT INTO EligibilityChanges (student_id) SELECT DISTINCT student_id FROM c
+"""
+MARK_EVALUATED_SQL = "UPDATE SchemeEligibilityRules SET evaluated_at=now() WHERE scheme_id = ANY($1)"
+START_RUN_SQL = "INSERT INTO EligibilityRuns (mode) VALUES ($1) RETURNING run_id"
+FINISH_RUN_SQL = """
+UPDATE EligibilityRuns SET status=$2, finished_at=CURRENT_TIMESTAMP, students=$3, granted=$4, revoked=$5, error=$6
+WHERE run_id=$1
+"""
+# Whoever holds the lock is the only possible runner, so older 'running' rows died with their process.
+INTERRUPTED_SQL = """
+UPDATE EligibilityRuns SET status='failed', finished_at=CURRENT_TIMESTAMP, error='interrupted'
+WHERE status='running'
+"""
+
+
+async def evaluate(conn: asyncpg.Connection, mode: str) -> dict:
+    """Apply the active rules. Incremental runs re-evaluate all students for rules changed
+    since they were last evaluated, and only the students recorded in EligibilityChanges
+    for the others; full runs re-evaluate everything. Inactive rules are left alone."""
+    async with conn.transaction():
+        rules = await conn.fetch(RULES_SQL)
+        # Claimed in this transaction: if the run fails the changes come back.
+        claimed: List[int] = await conn.fetchval(CLAIM_CHANGES_SQL)
+        changed = [r["scheme_id"] for r in rules if r["changed"] or mode == "full"]
+        unchanged = [r["scheme_id"] for r in rules if r["scheme_id"] not in changed]
+        results = []
+        if changed:
+            results.append(await conn.fetchrow(EVALUATE_ALL_SQL, changed))
+        if unchanged and claimed:
+            results.append(await conn.fetchrow(EVALUATE_STUDENTS_SQL, unchanged, claimed))
+        await conn.execute(MARK_EVALUATED_SQL, [r["scheme_id"] for r in rules])
+    return {
+        "mode": mode, "rules": len(rules), "rules_fully_evaluated": len(changed), "changed_students": len(claimed),
+        "students": max((r["students"] for r in results), default=0),
+        "granted": sum(r["granted"] for r in results), "revoked": sum(r["revoked"] for r in results),
+    }
+
+
+async def run(conn: asyncpg.Connection, mode: str, started: Optional[asyncio.Future] = None) -> dict:
+    """Record and execute one run; at most one runs at a time across all workers."""
+    if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", ELIGIBILITY_LOCK):
+        raise RunInProgress("an eligibility run is already in progress")
+    try:
+        await conn.execute(INTERRUPTED_SQL)
+        run_id = await conn.fetchval(START_RUN_SQL, mode)
+        if started is not None and not started.done():
+            started.set_result(run_id)
+        try:
+            result = await evaluate(conn, mode)
+        except Exception as e:
+            await conn.execute(FINISH_RUN_SQL, run_id, "failed", None, None, None, str(e))
+            raise
+        await conn.execute(FINISH_RUN_SQL, run_id, "succeeded", result["students"], result["granted"],
+                           result["revoked"], None)
+    except asyncio.CancelledError:
+        # The connection is mid-statement; releasing it to the pool resets the session,
+        # which drops the advisory lock too.
+        raise
+    except Exception:
+        await conn.execute("SELECT pg_advisory_unlock($1)", ELIGIBILITY_LOCK)
+        raise
+    await conn.execute("SELECT pg_advisory_unlock($1)", ELIGIBILITY_LOCK)
+    return {"run_id": run_id, **result}
+
+
+_tasks: Set[asyncio.Task] = set()
+
+
+async def start(pool, mode: str) -> int:
+    """Start a run in the background and return its run_id once it is recorded."""
+    started = asyncio.get_running_loop().create_future()
+
+    async def background():
+        priority.set(BULK)
+        try:
+            async with pool.acquire() as conn:
+                await run(conn, mode, started)
+        except Exception as e:
+            if not started.done():
+                started.set_exception(e)
+            else:
+                logger.error(f"Eligibility run failed: {e}")
+        finally:
+            # Cancelled before the run was recorded: don't leave the caller waiting.
+            if not started.done():
+                started.cancel()
+
+    task = asyncio.create_task(background())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return await started
+
+
+async def stop():
+    """Cancel runs still going at shutdown; the next run marks them interrupted."""
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+
+
+async def compact(conn: asyncpg.Connection) -> bool:
+    """Fold EligibilityChanges to one row per student, unless a run is claiming them."""
+    if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", ELIGIBILITY_LOCK):
+        return False
+    try:
+        await conn.execute(COMPACT_CHANGES_SQL)
+        return True
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", ELIGIBILITY_LOCK)
+
+
+async def maintain(pool):
+    """Periodic incremental runs, every ELIGIBILITY_INTERVAL seconds; with those off,
+    compaction of the recorded changes every ELIGIBILITY_COMPACT_INTERVAL seconds."""
+    if ELIGIBILITY_INTERVAL <= 0 and ELIGIBILITY_COMPACT_INTERVAL <= 0:
+        return
+    priority.set(BULK)
+    while True:
+        await asyncio.sleep(ELIGIBILITY_INTERVAL if ELIGIBILITY_INTERVAL > 0 else ELIGIBILITY_COMPACT_INTERVAL)
+        try:
+            if ELIGIBILITY_INTERVAL > 0:
+                await start(pool, "incremental")
+            else:
+                async with pool.acquire() as conn:
+                    await compact(conn)
+        except RunInProgress:
+            pass
+        except Exception as e:
+            logger.warning(f"Eligibility upkeep failed: {e}")
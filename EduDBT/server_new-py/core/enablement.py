@@ -0,0 +1,211 @@
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional, Sequence
+
+import asyncpg
+import numpy as np
+
+from core.admission import BULK, priority
+from core.analytics import Snapshot, copy_array, row_dtype
+from core.config import ENABLEMENT_REFRESH_INTERVAL, ENABLEMENT_WATERMARK_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+ENABLEMENT_LOCK = 0x44425403
+WATERMARK = "dbt_first_enablement"
+
+TABLE_EXISTS_SQL = "SELECT to_regclass('dbtfirstenablement') IS NOT NULL"
+WATERMARK_SQL = "SELECT COALESCE((SELECT last_history_id FROM AnalyticsWatermarks WHERE name=$1), 0)"
+SET_WATERMARK_SQL = """
+INSERT INTO AnalyticsWatermarks (name,last_history_id) VALUES ($1,$2)
+ON CONFLICT (name) DO UPDATE SET last_history_id=EXCLUDED.last_history_id, updated_at=CURRENT_TIMESTAMP
+"""
+# History ids are drawn before commit, so a slow writer can still commit ids below the newest one
+# visible now. The watermark therefore only moves past rows older than the lag; newer ones are
+# streamed again next run, which is harmless since the upsert keeps the earliest enablement.
+SAFE_WATERMARK_SQL = """
+SELECT COALESCE(max(history_id), $1) FROM AccountStatusHistory
+WHERE history_id > $1 AND changed_at < LOCALTIMESTAMP - make_interval(secs => $2)
+"""
+# The earliest enablement per account among history rows after $1, folded in entirely on the
+# server: DISTINCT ON keeps the first row of each account in (account_id, changed_at) order,
+# which idx_accountstatushistory_account_changed can supply, so even a rebuild over the whole
+# history never holds it in this process. The window count is taken before DISTINCT ON.
+FIRST_ENABLEMENT_SQL = """
+WITH firsts AS (
+    SELECT DISTINCT ON (h.account_id) h.account_id, h.changed_at, h.history_id, count(*) OVER () AS history_rows
+    FROM AccountStatusHistory h
+    WHERE h.dbt_enabled AND h.history_id > $1
+    ORDER BY h.account_id, h.changed_at, h.history_id
+),
+upserted AS (
+    INSERT INTO DbtFirstEnablement (account_id,enabled_at,history_id)
+    SELECT f.account_id, f.changed_at, f.history_id FROM firsts f
+    WHERE EXISTS (SELECT 1 FROM BankAccounts ba WHERE ba.account_id=f.account_id)
+    ON CONFLICT (account_id) DO UPDATE SET enabled_at=EXCLUDED.enabled_at, history_id=EXCLUDED.history_id
+    WHERE EXCLUDED.enabled_at < DbtFirstEnablement.enabled_at
+    RETURNING 1
+)
+SELECT COALESCE(max(history_rows), 0) AS history_rows, count(*) AS accounts, (SELECT count(*) FROM upserted) AS changed
+FROM firsts
+"""
+
+
+async def update_first_enablement(conn: asyncpg.Connection, rebuild: bool = False) -> dict:
+    """Fold history rows added since the last run into DbtFirstEnablement (all of them with
+    ``rebuild``, after emptying it). Returns what was processed."""
+    async with conn.transaction(isolation="repeatable_read"):
+        if rebuild:
+            await conn.execute("TRUNCATE DbtFirstEnablement")
+        last = 0 if rebuild else await conn.fetchval(WATERMARK_SQL, WATERMARK)
+        safe = await conn.fetchval(SAFE_WATERMARK_SQL, last, ENABLEMENT_WATERMARK_LAG_SECONDS)
+        folded = await conn.fetchrow(FIRST_ENABLEMENT_SQL, last)
+        await conn.execute(SET_WATERMARK_SQL, WATERMARK, safe)
+    return {**dict(folded), "from_history_id": last, "watermark": safe}
+
+
+async def maintain(pool):
+    """Keeps DbtFirstEnablement current. Every worker runs this; an advisory lock lets
+    one of them do the work each round."""
+    priority.set(BULK)
+    while True:
+        try:
+            async with pool.acquire() as conn:
+                # Until migration 4 has run there is nothing to maintain.
+                if await conn.fetchval(TABLE_EXISTS_SQL) and await conn.fetchval(
+                        "SELECT pg_try_advisory_lock($1)", ENABLEMENT_LOCK):
+                    try:
+                        await update_first_enablement(conn)
+                    finally:
+                        await conn.execute("SELECT pg_advisory_unlock($1)", ENABLEMENT_LOCK)
+        except Exception as e:
+            logger.warning(f"First DBT enablement update failed: {e}")
+        await asyncio.sleep(ENABLEMENT_REFRESH_INTERVAL)
+
+
+# -- report ----------------------------------------------------------------
+
+NAMES_SQL = """
+SELECT ARRAY(SELECT state FROM Students WHERE state IS NOT NULL GROUP BY state ORDER BY state) AS states,
+       ARRAY(SELECT bank_name FROM BankAccounts GROUP BY bank_name ORDER BY bank_name) AS banks,
+       (SELECT last_history_id FROM AnalyticsWatermarks WHERE name=$1) AS watermark
+"""
+STUDENT_STATES_SQL = """
+SELECT s.student_id, COALESCE(st.code, 0)::int FROM Students s
+LEFT JOIN unnest($1::text[]) WITH ORDINALITY st(state, code) ON st.state=s.state
+"""
+# created_at is -1 where unknown; times are whole seconds since 1970.
+ACCOUNTS_SQL = """
+SELECT ba.account_id, ba.student_id, COALESCE(bk.code, 0)::int, COALESCE(extract(epoch FROM ba.created_at)::int8, -1)
+FROM BankAccounts ba
+LEFT JOIN unnest($1::text[]) WITH ORDINALITY bk(bank_name, code) ON bk.bank_name=ba.bank_name
+"""
+ENABLED_AT_SQL = "SELECT account_id, extract(epoch FROM enabled_at)::int8 FROM DbtFirstEnablement"
+STUDENT_STATE_ROW = row_dtype(">i4", ">i4")
+ACCOUNT_CREATED_ROW = row_dtype(">i4", ">i4", ">i4", ">i8")
+ENABLED_AT_ROW = row_dtype(">i4", ">i8")
+
+DAY = 86400
+# Bucket upper bounds in days, inclusive; the last bucket is open-ended.
+HISTOGRAM_DAYS = (1, 3, 7, 14, 30, 60, 90, 180, 365)
+PERCENTILES = (50, 75, 90, 95, 99)
+COHORT_WINDOWS_DAYS = (7, 30, 90)
+# 1970-01-05 was a Monday; cohorts are ISO weeks.
+FIRST_MONDAY = date(1970, 1, 5)
+FIRST_MONDAY_SECONDS = 4 * DAY
+
+
+def group_percentiles(codes: np.ndarray, values: np.ndarray, n: int, qs: Sequence[float]) -> np.ndarray:
+    """Linearly interpolated percentiles of ``values`` per group code, shape (n, len(qs)); NaN for empty groups."""
+    v = values[np.lexsort((values, codes))]
+    counts = np.bincount(codes, minlength=n)
+    starts = np.cumsum(counts) - counts
+    out = np.full((n, len(qs)), np.nan)
+    some = counts > 0
+    for j, q in enumerate(qs):
+        pos = starts[some] + q / 100 * (counts[some] - 1)
+        lo = np.floor(pos).astype(np.intp)
+        hi = np.minimum(lo + 1, starts[some] + counts[some] - 1)
+        out[some, j] = v[lo] + (v[hi] - v[lo]) * (pos - lo)
+    return out
+
+
+def _latency_groups(labels: Sequence[Optional[str]], codes: np.ndarray, known: np.ndarray, enabled: np.ndarray,
+                    days: np.ndarray) -> List[dict]:
+    """Per-group counts, percentiles and histogram. ``codes`` index ``labels``; ``known`` marks
+    accounts with a creation time, ``enabled`` the known ones already enabled."""
+    n = len(labels)
+    accounts = np.bincount(codes[known], minlength=n)
+    c, d = codes[enabled], days[enabled]
+    done = np.bincount(c, minlength=n)
+    pct = group_percentiles(c, d, n, PERCENTILES)
+    nb = len(HISTOGRAM_DAYS) + 1
+    hist = np.bincount(c * nb + np.searchsorted(HISTOGRAM_DAYS, d), minlength=n * nb).reshape(n, nb)
+    bounds = [*HISTOGRAM_DAYS, None]
+    return [{
+        "key": labels[g],
+        "accounts": int(accounts[g]),
+        "enabled": int(done[g]),
+        "enabled_rate": float(done[g] / accounts[g]),
+        "days_to_enable": {f"p{q}": float(pct[g, j]) for j, q in enumerate(PERCENTILES)} if done[g] else None,
+        "histogram": [{"max_days": b, "count": int(hist[g, k])} for k, b in enumerate(bounds)],
+    } for g in range(n) if accounts[g]]
+
+
+def _cohorts(created: np.ndarray, enabled: np.ndarray, days: np.ndarray) -> List[dict]:
+    if not len(created):
+        return []
+    week = (created - FIRST_MONDAY_SECONDS) // (7 * DAY)
+    first = int(week.min())
+    codes = (week - first).astype(np.intp)
+    n = int(codes.max()) + 1
+    accounts = np.bincount(codes, minlength=n)
+    done = np.bincount(codes[enabled], minlength=n)
+    within = {w: np.bincount(codes[enabled & (days <= w)], minlength=n) for w in COHORT_WINDOWS_DAYS}
+    median = group_percentiles(codes[enabled], days[enabled], n, (50,))[:, 0]
+    return [{
+        "week": FIRST_MONDAY + timedelta(weeks=first + i),
+        "accounts": int(accounts[i]),
+        "enabled": int(done[i]),
+        **{f"enabled_within_{w}d": int(within[w][i]) for w in COHORT_WINDOWS_DAYS},
+        "median_days_to_enable": None if np.isnan(median[i]) else float(median[i]),
+    } for i in range(n) if accounts[i]]
+
+
+def aggregate(names, students: np.ndarray, accounts: np.ndarray, enablements: np.ndarray) -> dict:
+    sid = accounts["f1"].astype(np.intp)
+    state_of = np.zeros(int(students["f0"].max(initial=0)) + 1, np.intp)
+    state_of[students["f0"]] = students["f1"]
+    enabled_at = np.full(int(max(accounts["f0"].max(initial=0), enablements["f0"].max(initial=0))) + 1, -1, np.int64)
+    enabled_at[enablements["f0"]] = enablements["f1"]
+    created = accounts["f3"].astype(np.int64)
+    at = enabled_at[accounts["f0"]]
+    known = created >= 0
+    enabled = known & (at >= 0)
+    # Backfilled creation times can trail the first enablement; count those as immediate.
+    days = np.where(enabled, np.maximum(at - created, 0), 0) / DAY
+    groups = lambda labels, codes: _latency_groups([*labels, None], np.where(codes == 0, len(labels), codes - 1),
+                                                   known, enabled, days)
+    k = np.flatnonzero(known)
+    return {
+        "generated_at": datetime.now(timezone.utc),
+        "watermark": names["watermark"],
+        "unknown_created": int(len(known) - len(k)),
+        "total": _latency_groups([None], np.zeros(len(sid), np.intp), known, enabled, days)[0] if len(k) else None,
+        "by_bank": groups(names["banks"], accounts["f2"].astype(np.intp)),
+        "by_state": groups(names["states"], state_of[sid]),
+        "cohorts": _cohorts(created[k], enabled[k], days[k]),
+    }
+
+
+async def compute_enablement(conn) -> dict:
+    async with conn.transaction(isolation="repeatable_read", readonly=True):
+        names = await conn.fetchrow(NAMES_SQL, WATERMARK)
+        students = await copy_array(conn, STUDENT_STATES_SQL, (names["states"],), STUDENT_STATE_ROW)
+        accounts = await copy_array(conn, ACCOUNTS_SQL, (names["banks"],), ACCOUNT_CREATED_ROW)
+        enablements = await copy_array(conn, ENABLED_AT_SQL, (), ENABLED_AT_ROW)
+    return await asyncio.to_thread(aggregate, names, students, accounts, enablements)
+
+
+enablement = Snapshot("dbt_enablement", compute_enablement)
@@ -0,0 +1,66 @@
+import csv
+import io
+from typing import AsyncIterator, List, Optional, Sequence
+
+import asyncpg
+import orjson
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from core.config import EXPORT_CHUNK_SIZE
+from core.responses import orjson_default
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson")
+
+
+def export_format(request: Request, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    accept = request.headers.get("accept", "")
+    if any(t in accept for t in NDJSON_TYPES):
+        return "ndjson"
+    if "text/csv" in accept:
+        return "csv"
+    return "json"
+
+
+async def fetch_chunks(db_pool: asyncpg.Pool, q: str, *args, chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator[List[asyncpg.Record]]:
+    """Yield the result of ``q`` in fixed-size chunks from a server-side cursor."""
+    async with db_pool.acquire() as conn:
+        async with conn.transaction(readonly=True):
+            cur = await conn.cursor(q, *args)
+            while True:
+                rows = await cur.fetch(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+
+async def _ndjson(chunks):
+    async for rows in chunks:
+        # Encoded like RecordJSONResponse, so exports and API responses agree on dates.
+        yield b"".join(orjson.dumps(r, default=orjson_default, option=orjson.OPT_APPEND_NEWLINE) for r in rows)
+
+
+async def _csv(chunks, columns: Sequence[str]):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    async for rows in chunks:
+        writer.writerows(rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate(0)
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def stream_export(db_pool: asyncpg.Pool, fmt: str, q: str, *args, columns: Sequence[str], filename: str) -> StreamingResponse:
+    chunks = fetch_chunks(db_pool, q, *args)
+    if fmt == "csv":
+        return StreamingResponse(
+            _csv(chunks, columns),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'},
+        )
+    return StreamingResponse(_ndjson(chunks), media_type="application/x-ndjson")
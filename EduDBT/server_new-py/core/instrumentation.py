@@ -0,0 +1,202 @@
+import asyncio
+from contextvars import ContextVar
+from functools import lru_cache
+from time import perf_counter
+from typing import Callable, List, Optional
+
+import asyncpg
+
+from core.admission import CLASSES, PoolTimeout, PriorityGate, priority
+from core.config import DB_ACQUIRE_TIMEOUT
+from core.metrics import DB_ACQUIRE_SECONDS, DB_QUERY_SECONDS, DB_ROWS_RETURNED, Gauge
+from core.profiling import SLOW_QUERY_THRESHOLD, record_slow_query
+
+current_route: ContextVar[str] = ContextVar("current_route", default="-")
+# Called as observer(route, statement_label) once per server round trip; only
+# used by tooling such as bench/query_budget.py, so it is empty in production.
+observers: List[Callable[[str, str], None]] = []
+
+
+def _observe(label: str):
+    route = current_route.get()
+    for observer in observers:
+        observer(route, label)
+
+
+@lru_cache(maxsize=1024)
+def statement_label(query: str) -> str:
+    label = " ".join(query.split())
+    return label if len(label) <= 120 else label[:117] + "..."
+
+
+class InstrumentedConnection:
+    """Proxy over an asyncpg connection that times every statement it runs."""
+
+    __slots__ = ("_conn",)
+
+    def __init__(self, conn: asyncpg.Connection):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def _record(self, query: str, args, start: float, rows: int):
+        elapsed = perf_counter() - start
+        route = current_route.get()
+        label = statement_label(query)
+        DB_QUERY_SECONDS.observe(elapsed, route, label)
+        if rows:
+            DB_ROWS_RETURNED.inc(route, label, amount=rows)
+        if elapsed >= SLOW_QUERY_THRESHOLD:
+            record_slow_query(query, label, args, elapsed, route)
+        if observers:
+            _observe(label)
+
+    def transaction(self, **kwargs):
+        tr = self._conn.transaction(**kwargs)
+        return _ObservedTransaction(tr) if observers else tr
+
+    def cursor(self, query, *args, **kwargs):
+        if observers:
+            _observe(statement_label(query))
+        return self._conn.cursor(query, *args, **kwargs)
+
+    async def copy_records_to_table(self, table_name, **kwargs):
+        start = perf_counter()
+        result = await self._conn.copy_records_to_table(table_name, **kwargs)
+        self._record(f"COPY {table_name}", (), start, 0)
+        return result
+
+    async def copy_from_query(self, query, *args, **kwargs):
+        start = perf_counter()
+        result = await self._conn.copy_from_query(query, *args, **kwargs)
+        self._record(f"COPY ({query})", args, start, 0)
+        return result
+
+    async def execute(self, query, *args, **kwargs):
+        start = perf_counter()
+        result = await self._conn.execute(query, *args, **kwargs)
+        self._record(query, args, start, 0)
+        return result
+
+    async def executemany(self, query, args, **kwargs):
+        start = perf_counter()
+        result = await self._conn.executemany(query, args, **kwargs)
+        self._record(query, args[0] if args else (), start, 0)
+        return result
+
+    async def fetch(self, query, *args, **kwargs):
+        start = perf_counter()
+        result = await self._conn.fetch(query, *args, **kwargs)
+        self._record(query, args, start, len(result))
+        return result
+
+    async def fetchrow(self, query, *args, **kwargs):
+        start = perf_counter()
+        result = await self._conn.fetchrow(query, *args, **kwargs)
+        self._record(query, args, start, result is not None)
+        return result
+
+    async def fetchval(self, query, *args, **kwargs):
+        start = perf_counter()
+        result = await self._conn.fetchval(query, *args, **kwargs)
+        self._record(query, args, start, 1)
+        return result
+
+
+class _ObservedTransaction:
+    __slots__ = ("_tr",)
+
+    def __init__(self, tr):
+        self._tr = tr
+
+    async def __aenter__(self):
+        _observe("BEGIN")
+        return await self._tr.__aenter__()
+
+    async def __aexit__(self, exc_type, *exc):
+        _observe("ROLLBACK" if exc_type else "COMMIT")
+        return await self._tr.__aexit__(exc_type, *exc)
+
+
+class _Acquire:
+    __slots__ = ("pool", "gate", "name", "timeout", "conn")
+
+    def __init__(self, pool: asyncpg.Pool, gate: PriorityGate, name: str, timeout: Optional[float]):
+        self.pool = pool
+        self.gate = gate
+        self.name = name
+        self.timeout = timeout
+        self.conn = None
+
+    async def __aenter__(self) -> InstrumentedConnection:
+        start = perf_counter()
+        await self.gate.enter(priority.get(), self.timeout)
+        try:
+            remaining = None if self.timeout is None else max(self.timeout - (perf_counter() - start), 0.001)
+            self.conn = await self.pool.acquire(timeout=remaining)
+        except asyncio.TimeoutError:
+            self.gate.leave()
+            raise PoolTimeout(f"no database connection free within {self.timeout}s") from None
+        except BaseException:
+            self.gate.leave()
+            raise
+        DB_ACQUIRE_SECONDS.observe(perf_counter() - start, self.name, current_route.get())
+        return InstrumentedConnection(self.conn)
+
+    async def __aexit__(self, *exc):
+        try:
+            await self.pool.release(self.conn)
+        finally:
+            self.gate.leave()
+
+
+class InstrumentedPool:
+    """Wraps an asyncpg pool so acquire() waits and the connections it hands out are measured.
+
+    Waiters are served by the priority of the request they belong to (writes before
+    reads before bulk reports) and give up with PoolTimeout after DB_ACQUIRE_TIMEOUT.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, name: str = "primary"):
+        self._pool = pool
+        self.name = name
+        self.gate = PriorityGate(pool.get_max_size())
+        pools.append(self)
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    def acquire(self, *, timeout: Optional[float] = None) -> _Acquire:
+        if timeout is None and DB_ACQUIRE_TIMEOUT > 0:
+            timeout = DB_ACQUIRE_TIMEOUT
+        return _Acquire(self._pool, self.gate, self.name, timeout)
+
+    @property
+    def saturated(self) -> bool:
+        return self.gate.held >= self.gate.size
+
+    async def close(self):
+        pools.remove(self)
+        await self._pool.close()
+
+
+pools = []
+
+
+def _pool_sizes():
+    for p in pools:
+        size, idle = p.get_size(), p.get_idle_size()
+        yield (p.name, "in_use"), size - idle
+        yield (p.name, "idle"), idle
+        yield (p.name, "max"), p.get_max_size()
+
+
+def _pool_waiters():
+    for p in pools:
+        for prio, n in sorted(p.gate.waiting().items()):
+            yield (p.name, CLASSES[prio]), n
+
+
+Gauge("db_pool_connections", "Pool connections by state.", ("pool", "state"), collect=_pool_sizes)
+Gauge("db_pool_waiting", "Requests waiting for a pooled connection, by class.", ("pool", "class"), collect=_pool_waiters)
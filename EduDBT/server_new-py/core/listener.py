@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Optional[str]], None]
+
+
+class Listener:
+    """One dedicated LISTEN connection per worker, fanning NOTIFY payloads out by channel.
+
+    Handlers are called with ``None`` after a reconnect, since notifications sent
+    while the connection was down are lost.
+    """
+
+    def __init__(self):
+        self.handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self.conn: Optional[asyncpg.Connection] = None
+        self._dsn: Optional[str] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def on(self, channel: str, handler: Handler):
+        self.handlers[channel].append(handler)
+
+    def _dispatch(self, conn, pid, channel, payload):
+        for handler in self.handlers.get(channel, ()):
+            try:
+                handler(payload)
+            except Exception:
+                logger.exception(f"NOTIFY handler for {channel} failed")
+
+    def _lost(self, conn):
+        if not self._closing:
+            logger.warning("LISTEN connection lost, reconnecting")
+            self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _connect(self):
+        self.conn = await asyncpg.connect(self._dsn)
+        self.conn.add_termination_listener(self._lost)
+        for channel in self.handlers:
+            await self.conn.add_listener(channel, self._dispatch)
+
+    async def _reconnect(self):
+        delay = 1
+        while not self._closing:
+            try:
+                await self._connect()
+            except Exception as e:
+                logger.error(f"LISTEN reconnect failed: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+                continue
+            for channel, handlers in self.handlers.items():
+                for handler in handlers:
+                    handler(None)
+            return
+
+    async def start(self, dsn: str):
+        if not self.handlers:
+            return
+        self._dsn = dsn
+        self._closing = False
+        await self._connect()
+
+    async def stop(self):
+        self._closing = True
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+        if self.conn and not self.conn.is_closed():
+            await self.conn.close()
+
+
+listener = Listener()
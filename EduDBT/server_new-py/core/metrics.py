@@ -0,0 +1,129 @@
+import bisect
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        registry.append(self)
+
+    def samples(self) -> Iterable[str]:
+        return ()
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(_Metric):
+    """Counter incremented in-process, or read from ``collect`` at scrape time."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=(), collect: Callable[[], Iterable[Tuple[Tuple, float]]] = None):
+        super().__init__(name, help, labels)
+        self.values: Dict[Tuple, float] = {}
+        self.collect = collect
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in (self.collect() if self.collect else self.values.items()):
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+
+class Gauge(_Metric):
+    """Gauge whose label sets and values are read from ``collect`` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), collect: Callable[[], Iterable[Tuple[Tuple, float]]] = None):
+        super().__init__(name, help, labels)
+        self.collect = collect or (lambda: ())
+
+    def samples(self):
+        for labels, value in self.collect():
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self.series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        s = self.series.get(labels)
+        if s is None:
+            s = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        s[0][bisect.bisect_left(self.buckets, value)] += 1
+        s[1] += value
+
+    def samples(self):
+        for labels, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, n in zip((*self.buckets, "+Inf"), counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}"
+
+
+registry: List[_Metric] = []
+
+
+def render() -> str:
+    return "\n".join(line for metric in registry for line in metric.render()) + "\n"
+
+
+HTTP_REQUEST_SECONDS = Histogram("http_request_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+DB_ACQUIRE_SECONDS = Histogram("db_pool_acquire_seconds", "Time spent waiting in pool.acquire().", ("pool", "route"))
+DB_QUERY_SECONDS = Histogram("db_query_seconds", "Statement latency by route and statement.", ("route", "statement"))
+DB_ROWS_RETURNED = Counter("db_rows_returned_total", "Rows returned by statements.", ("route", "statement"))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streaming responses are timed to their last byte."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                perf_counter() - start, scope["method"], route.path if route else "unmatched", status[0]
+            )
@@ -0,0 +1,421 @@
+import logging
+from time import perf_counter
+from typing import Awaitable, Callable, List, NamedTuple, Optional, Sequence, Union
+
+import asyncpg
+
+from core.config import CACHE_CHANNEL
+from core.partitions import default_partition, ensure_partitions, is_partitioned
+from core.schema import INDEXES, TABLES
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary, fixed key so concurrent runners (two deploys, CLI + seeder) apply migrations one at a time.
+MIGRATION_LOCK = 0x44425401
+
+MIGRATIONS_DDL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+RECORD_SQL = "INSERT INTO schema_migrations (version,name) VALUES ($1,$2) ON CONFLICT (version) DO NOTHING"
+
+INVALID_INDEX_SQL = """
+SELECT EXISTS (SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid=i.indexrelid
+               WHERE c.relname=$1 AND c.relnamespace=current_schema()::regnamespace AND NOT i.indisvalid)
+"""
+
+
+class Concurrently(NamedTuple):
+    """An online index build. Runs outside any transaction; an invalid index left by an
+    interrupted earlier attempt is dropped first, since IF NOT EXISTS would keep it."""
+    name: str
+    ddl: str
+
+
+# SQL runs as is; a coroutine function gets the connection, inside the migration's transaction.
+Step = Union[str, Concurrently, Callable[[asyncpg.Connection], Awaitable[None]]]
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    steps: Sequence[Step]
+
+
+def index(name: str, table: str, columns: str, unique: bool = False) -> Concurrently:
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    return Concurrently(name, f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+PARTITIONED_HISTORY_DDL = """
+CREATE TABLE AccountStatusHistory (
+    history_id INT NOT NULL DEFAULT nextval('accountstatushistory_history_id_seq'),
+    account_id INT NOT NULL,
+    aadhaar_linked BOOLEAN,
+    dbt_enabled BOOLEAN,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (history_id, changed_at),
+    CONSTRAINT fk_hist_account FOREIGN KEY (account_id) REFERENCES BankAccounts(account_id) ON DELETE CASCADE
+) PARTITION BY RANGE (changed_at)
+"""
+
+
+async def partition_history(conn: asyncpg.Connection):
+    """Rebuild AccountStatusHistory as monthly range partitions on changed_at, keeping
+    history_id values and their sequence.
+
+    Expect downtime for status writes: every row is copied in the migration's single
+    transaction, which holds ACCESS EXCLUSIVE on the history table throughout, so every
+    account-status write (each inserts history) waits until it commits. The copy runs at
+    roughly 20s per million history rows on the bench setup; schedule it accordingly.
+    """
+    if await is_partitioned(conn, "accountstatushistory"):
+        return
+    await conn.execute("ALTER TABLE AccountStatusHistory RENAME TO accountstatushistory_unpartitioned")
+    await conn.execute("ALTER INDEX accountstatushistory_pkey RENAME TO accountstatushistory_unpartitioned_pkey")
+    await conn.execute("DROP INDEX IF EXISTS idx_accountstatushistory_account_changed")
+    await conn.execute("ALTER SEQUENCE accountstatushistory_history_id_seq OWNED BY NONE")
+    await conn.execute(PARTITIONED_HISTORY_DDL)
+    await conn.execute("CREATE INDEX idx_accountstatushistory_account_changed ON AccountStatusHistory (account_id, changed_at)")
+    oldest, newest = await conn.fetchrow("SELECT min(changed_at), max(changed_at) FROM accountstatushistory_unpartitioned")
+    await ensure_partitions(conn, since=oldest and oldest.date(), until=newest and newest.date())
+    # Catches history written for a month with no partition yet (upkeep stopped or fell
+    # behind HISTORY_MONTHS_AHEAD), so status writes keep working; ensure_partitions moves
+    # such rows into their month's partition once it creates it.
+    await conn.execute(f"CREATE TABLE {default_partition()} PARTITION OF AccountStatusHistory DEFAULT")
+    # changed_at was nullable; the app never wrote NULL, but any such row is filed under the oldest month.
+    await conn.execute("""
+        INSERT INTO AccountStatusHistory (history_id,account_id,aadhaar_linked,dbt_enabled,changed_at)
+        SELECT history_id, account_id, aadhaar_linked, dbt_enabled, COALESCE(changed_at, $1)
+        FROM accountstatushistory_unpartitioned
+    """, oldest)
+    await conn.execute("ALTER SEQUENCE accountstatushistory_history_id_seq OWNED BY AccountStatusHistory.history_id")
+    await conn.execute("DROP TABLE accountstatushistory_unpartitioned")
+
+
+FIRST_ENABLEMENT_DDL = """
+CREATE TABLE IF NOT EXISTS DbtFirstEnablement (
+    account_id INT PRIMARY KEY,
+    enabled_at TIMESTAMP NOT NULL,
+    history_id INT NOT NULL,
+    CONSTRAINT fk_first_enablement_account FOREIGN KEY (account_id) REFERENCES BankAccounts(account_id) ON DELETE CASCADE
+)
+"""
+
+WATERMARKS_DDL = """
+CREATE TABLE IF NOT EXISTS AnalyticsWatermarks (
+    name TEXT PRIMARY KEY,
+    last_history_id BIGINT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+ELIGIBILITY_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS SchemeEligibilityRules (
+        scheme_id INT PRIMARY KEY,
+        states TEXT[],
+        colleges TEXT[],
+        require_aadhaar_linked BOOLEAN NOT NULL DEFAULT FALSE,
+        require_dbt_enabled BOOLEAN NOT NULL DEFAULT FALSE,
+        active BOOLEAN NOT NULL DEFAULT TRUE,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        evaluated_at TIMESTAMP,
+        CONSTRAINT fk_rule_scheme FOREIGN KEY (scheme_id) REFERENCES Schemes(scheme_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS EligibilityRuns (
+        run_id SERIAL PRIMARY KEY,
+        mode TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'running',
+        started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP,
+        students INT,
+        granted INT,
+        revoked INT,
+        error TEXT
+    )
+    """,
+    # Append-only, unindexed: writers never wait on each other or on a run, which claims
+    # rows by deleting the committed ones it can see.
+    """
+    CREATE TABLE IF NOT EXISTS EligibilityChanges (
+        student_id INT NOT NULL,
+        changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+# Statement-level, so a batch update or a COPY costs one extra INSERT rather than one per row.
+# Changes only matter to active rules that are not due a full evaluation anyway, so with
+# none active, writes skip the INSERT; a rule activated later is evaluated in full.
+ELIGIBILITY_TRIGGERS = [
+    """
+    CREATE OR REPLACE FUNCTION eligibility_students_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM SchemeEligibilityRules WHERE active) THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO EligibilityChanges (student_id) SELECT student_id FROM new_rows;
+        ELSE
+            INSERT INTO EligibilityChanges (student_id)
+            SELECT n.student_id FROM new_rows n JOIN old_rows o USING (student_id)
+            WHERE (n.state, n.college) IS DISTINCT FROM (o.state, o.college);
+        END IF;
+        RETURN NULL;
+    END $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION eligibility_accounts_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM SchemeEligibilityRules WHERE active) THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO EligibilityChanges (student_id) SELECT DISTINCT student_id FROM new_rows;
+        ELSIF TG_OP = 'DELETE' THEN
+            INSERT INTO EligibilityChanges (student_id) SELECT DISTINCT student_id FROM old_rows;
+        ELSE
+            INSERT INTO EligibilityChanges (student_id)
+            SELECT student_id FROM new_rows UNION SELECT student_id FROM old_rows;
+        END IF;
+        RETURN NULL;
+    END $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION eligibility_status_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM SchemeEligibilityRules WHERE active) THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO EligibilityChanges (student_id)
+            SELECT DISTINCT ba.student_id FROM new_rows n JOIN BankAccounts ba USING (account_id)
+            WHERE n.aadhaar_linked OR n.dbt_enabled;
+        ELSE
+            INSERT INTO EligibilityChanges (student_id)
+            SELECT DISTINCT ba.student_id FROM new_rows n JOIN old_rows o USING (status_id)
+            JOIN BankAccounts ba ON ba.account_id=n.account_id
+            WHERE (n.aadhaar_linked, n.dbt_enabled) IS DISTINCT FROM (o.aadhaar_linked, o.dbt_enabled);
+        END IF;
+        RETURN NULL;
+    END $$
+    """,
+    *(f"""
+    CREATE OR REPLACE TRIGGER eligibility_{table.lower()}_{op.lower()} AFTER {op} ON {table}
+    REFERENCING {refs} FOR EACH STATEMENT EXECUTE FUNCTION {function}()
+    """ for table, function in (("Students", "eligibility_students_changed"),
+                                ("BankAccounts", "eligibility_accounts_changed"),
+                                ("AccountStatus", "eligibility_status_changed"))
+      for op, refs in (("INSERT", "NEW TABLE AS new_rows"), ("UPDATE", "NEW TABLE AS new_rows OLD TABLE AS old_rows"),
+                       ("DELETE", "OLD TABLE AS old_rows"))
+      # A deleted student takes its Beneficiaries rows with it; a deleted status row changes nothing.
+      if not (op == "DELETE" and table != "BankAccounts")),
+]
+
+# Tells the in-process status indexes (core/statusindex.py) which students' state, and
+# which accounts' student or bank, changed, which status change events do not cover, so
+# they patch those rows rather than rebuilding. Ids go out in chunks of 500 to stay well
+# under the 8000-byte payload limit; statements that change neither send nothing.
+STATUS_INDEX_TRIGGERS = [
+    """
+    CREATE OR REPLACE FUNCTION status_index_notify(tbl TEXT, ids INT[]) RETURNS void LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM pg_notify('dbt_status_index', json_build_object('table', tbl, 'ids', array_agg(id))::text)
+        FROM unnest(ids) WITH ORDINALITY u(id, n) GROUP BY (n - 1) / 500;
+    END $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION status_index_students_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM status_index_notify('students', ARRAY(SELECT student_id FROM new_rows));
+        ELSIF TG_OP = 'DELETE' THEN
+            PERFORM status_index_notify('students', ARRAY(SELECT student_id FROM old_rows));
+        ELSE
+            PERFORM status_index_notify('students', ARRAY(
+                SELECT n.student_id FROM new_rows n JOIN old_rows o USING (student_id)
+                WHERE n.state IS DISTINCT FROM o.state));
+        END IF;
+        RETURN NULL;
+    END $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION status_index_accounts_changed() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM status_index_notify('accounts', ARRAY(SELECT account_id FROM new_rows));
+        ELSIF TG_OP = 'DELETE' THEN
+            PERFORM status_index_notify('accounts', ARRAY(SELECT account_id FROM old_rows));
+        ELSE
+            PERFORM status_index_notify('accounts', ARRAY(
+                SELECT n.account_id FROM new_rows n JOIN old_rows o USING (account_id)
+                WHERE (n.student_id, n.bank_name) IS DISTINCT FROM (o.student_id, o.bank_name)));
+        END IF;
+        RETURN NULL;
+    END $$
+    """,
+    *(f"""
+    CREATE OR REPLACE TRIGGER status_index_{table.lower()}_{op.lower()} AFTER {op} ON {table}
+    REFERENCING {refs} FOR EACH STATEMENT EXECUTE FUNCTION {function}()
+    """ for table, function in (("Students", "status_index_students_changed"),
+                                ("BankAccounts", "status_index_accounts_changed"))
+      for op, refs in (("INSERT", "NEW TABLE AS new_rows"), ("UPDATE", "NEW TABLE AS new_rows OLD TABLE AS old_rows"),
+                       ("DELETE", "OLD TABLE AS old_rows"))),
+]
+
+# Change counters behind the ETags of list and detail responses (core/conditional.py).
+# Every writing statement bumps one of a table's shard rows, picked by backend, so
+# concurrent writers seldom queue on the same row lock; readers add the shards up.
+TABLE_VERSIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS TableVersions (
+        table_name TEXT NOT NULL,
+        shard INT NOT NULL,
+        version BIGINT NOT NULL,
+        changed_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (table_name, shard)
+    )
+    """,
+    """
+    CREATE OR REPLACE FUNCTION table_version_bump() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO TableVersions (table_name,shard,version,changed_at)
+        VALUES (TG_TABLE_NAME, pg_backend_pid() % 8, 1, clock_timestamp())
+        ON CONFLICT (table_name,shard) DO UPDATE
+        SET version=TableVersions.version + 1, changed_at=EXCLUDED.changed_at;
+        PERFORM pg_notify('dbt_table_versions', TG_TABLE_NAME);
+        RETURN NULL;
+    END $$
+    """,
+    *(f"""
+    CREATE OR REPLACE TRIGGER table_version_{table.lower()} AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+    FOR EACH STATEMENT EXECUTE FUNCTION table_version_bump()
+    """ for table in ("Students", "BankAccounts", "AccountStatus", "Schemes", "AwarenessContent")),
+]
+
+
+# Clears the Schemes and AwarenessContent caches (core/cache.py) in every worker after any
+# writing statement, including ones from server-py or psql that never call invalidate().
+# The channel is fixed when the migration runs; changing CACHE_CHANNEL means rerunning it.
+CACHE_TRIGGERS = [
+    f"""
+    CREATE OR REPLACE FUNCTION cache_invalidate() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM pg_notify('{CACHE_CHANNEL}', TG_ARGV[0]);
+        RETURN NULL;
+    END $$
+    """,
+    *(f"""
+    CREATE OR REPLACE TRIGGER cache_{table.lower()} AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+    FOR EACH STATEMENT EXECUTE FUNCTION cache_invalidate('{cache}')
+    """ for table, cache in (("Schemes", "schemes"), ("AwarenessContent", "awareness"))),
+]
+
+# Every step must be idempotent: a migration that fails part-way is simply rerun.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline", [*TABLES, *INDEXES]),
+    Migration(2, "index pack", [
+        # update_account_status and every AccountStatus join look rows up by account_id; make it
+        # unique, keeping the most recently updated row where old data has duplicates.
+        """
+        DELETE FROM AccountStatus a USING AccountStatus b
+        WHERE a.account_id=b.account_id
+          AND (COALESCE(a.last_updated, '-infinity'), a.status_id) < (COALESCE(b.last_updated, '-infinity'), b.status_id)
+        """,
+        index("uq_accountstatus_account", "AccountStatus", "account_id", unique=True),
+        index("idx_accountstatushistory_account_changed", "AccountStatusHistory", "account_id, changed_at"),
+        # Also serve the ON DELETE CASCADE lookups from Students and Schemes.
+        index("idx_beneficiaries_student", "Beneficiaries", "student_id"),
+        index("idx_beneficiaries_scheme", "Beneficiaries", "scheme_id"),
+        # Students(state) is already covered by idx_students_state_id (state, student_id).
+    ]),
+    Migration(3, "partition AccountStatusHistory by month", [partition_history]),
+    Migration(4, "account creation time and first DBT enablement", [
+        "ALTER TABLE BankAccounts ADD COLUMN IF NOT EXISTS created_at TIMESTAMP",
+        # Creation was never recorded; an account's earliest status change is the closest known
+        # bound. Accounts without history stay NULL. Rewrites every BankAccounts row.
+        """
+        UPDATE BankAccounts ba SET created_at=h.first_change
+        FROM (SELECT account_id, min(changed_at) AS first_change FROM AccountStatusHistory GROUP BY account_id) h
+        WHERE h.account_id=ba.account_id AND ba.created_at IS NULL
+        """,
+        # Only after the backfill: a default given with ADD COLUMN would stamp existing rows with now.
+        "ALTER TABLE BankAccounts ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP",
+        FIRST_ENABLEMENT_DDL,
+        WATERMARKS_DDL,
+    ]),
+    Migration(5, "scheme eligibility rules", [
+        *ELIGIBILITY_DDL,
+        # The engine upserts on (student_id, scheme_id); keep the granted, else the oldest, row.
+        """
+        DELETE FROM Beneficiaries a USING Beneficiaries b
+        WHERE a.student_id=b.student_id AND a.scheme_id=b.scheme_id
+          AND (COALESCE(a.is_beneficiary, false), -a.ben_id) < (COALESCE(b.is_beneficiary, false), -b.ben_id)
+        """,
+        index("uq_beneficiaries_student_scheme", "Beneficiaries", "student_id, scheme_id", unique=True),
+        *ELIGIBILITY_TRIGGERS,
+    ]),
+    Migration(6, "status index change notifications", STATUS_INDEX_TRIGGERS),
+    Migration(7, "table change counters", TABLE_VERSIONS),
+    Migration(8, "cache invalidation notifications", CACHE_TRIGGERS),
+]
+
+
+async def _create_index_concurrently(conn: asyncpg.Connection, step: Concurrently):
+    if await conn.fetchval(INVALID_INDEX_SQL, step.name.lower()):
+        logger.warning(f"Dropping invalid index {step.name} left by an interrupted build")
+        await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {step.name}")
+    await conn.execute(step.ddl)
+
+
+async def _run(conn: asyncpg.Connection, step: Step):
+    if callable(step):
+        await step(conn)
+    else:
+        await conn.execute(step)
+
+
+async def _apply(conn: asyncpg.Connection, migration: Migration):
+    if not any(isinstance(s, Concurrently) for s in migration.steps):
+        async with conn.transaction():
+            for step in migration.steps:
+                await _run(conn, step)
+            await conn.execute(RECORD_SQL, migration.version, migration.name)
+        return
+    for step in migration.steps:
+        if isinstance(step, Concurrently):
+            await _create_index_concurrently(conn, step)
+        else:
+            async with conn.transaction():
+                await _run(conn, step)
+    await conn.execute(RECORD_SQL, migration.version, migration.name)
+
+
+async def applied_versions(conn: asyncpg.Connection) -> List[int]:
+    await conn.execute(MIGRATIONS_DDL)
+    return [r["version"] for r in await conn.fetch("SELECT version FROM schema_migrations ORDER BY version")]
+
+
+async def migrate(conn: asyncpg.Connection, target: Optional[int] = None) -> List[int]:
+    """Apply pending migrations up to ``target`` (default: all); returns the versions applied."""
+    await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK)
+    try:
+        applied = set(await applied_versions(conn))
+        done = []
+        for migration in MIGRATIONS:
+            if migration.version in applied or (target is not None and migration.version > target):
+                continue
+            started = perf_counter()
+            await _apply(conn, migration)
+            logger.info(f"Applied migration {migration.version} ({migration.name}) in {perf_counter() - started:.1f}s")
+            done.append(migration.version)
+        return done
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK)
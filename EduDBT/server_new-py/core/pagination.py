@@ -0,0 +1,31 @@
+import base64
+import binascii
+from typing import List, Optional
+
+import asyncpg
+from fastapi import HTTPException, status
+
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return int(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def resolve_after_id(after_id: Optional[int], cursor: Optional[str]) -> int:
+    if cursor:
+        return decode_cursor(cursor)
+    return after_id or 0
+
+
+def page_of(rows: List[asyncpg.Record], limit: int, key: str):
+    """Split a ``LIMIT limit + 1`` fetch into the page and the cursor of the next one."""
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1][key]) if len(rows) > limit else None
+    return items, next_cursor
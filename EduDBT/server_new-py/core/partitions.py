@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import re
+from datetime import date, datetime
+from typing import List, Optional
+
+import asyncpg
+
+from core.config import HISTORY_MONTHS_AHEAD, HISTORY_RETENTION_MONTHS, PARTITION_CHECK_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+HISTORY = "accountstatushistory"
+ARCHIVE_SCHEMA = "history_archive"
+# Any backend writing history holds a lock on the parent, so never queue behind it for long.
+LOCK_TIMEOUT = "5s"
+MAINTENANCE_LOCK = 0x44425402
+_PARTITION_NAME = re.compile(rf"{HISTORY}_p(\d{{4}})(\d{{2}})")
+
+PARTITIONS_SQL = """
+SELECT c.relname, i.inhdetachpending
+FROM pg_inherits i JOIN pg_class c ON c.oid=i.inhrelid
+WHERE i.inhparent=to_regclass($1)
+"""
+IS_PARTITIONED_SQL = "SELECT relkind='p' FROM pg_class WHERE oid=to_regclass($1)"
+
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def add_months(d: date, n: int) -> date:
+    y, m = divmod(d.year * 12 + d.month - 1 + n, 12)
+    return date(y, m + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{HISTORY}_p{month:%Y%m}"
+
+
+def default_partition(parent: str = HISTORY) -> str:
+    return f"{parent}_default"
+
+
+async def is_partitioned(conn: asyncpg.Connection, table: str = HISTORY) -> bool:
+    return bool(await conn.fetchval(IS_PARTITIONED_SQL, table))
+
+
+async def ensure_partitions(conn: asyncpg.Connection, since: Optional[date] = None, until: Optional[date] = None,
+                            parent: str = HISTORY) -> List[str]:
+    """Create the monthly partitions covering ``since`` (default: this month) through
+    HISTORY_MONTHS_AHEAD months from now, or ``until`` if later, plus any month with rows
+    in the DEFAULT partition, which are moved into it. Returns the ones created."""
+    if not await is_partitioned(conn, parent):
+        return []
+    existing = {r["relname"] for r in await conn.fetch(PARTITIONS_SQL, parent)}
+    default = default_partition(parent)
+    # Rows land in DEFAULT only when upkeep fell behind; each such month gets its partition now.
+    stray = set()
+    if default in existing:
+        stray = {r[0] for r in await conn.fetch(
+            f"SELECT DISTINCT date_trunc('month', changed_at)::date FROM {default}")}
+    today = month_start(datetime.now().date())
+    month = month_start(since or today)
+    last = max(add_months(today, HISTORY_MONTHS_AHEAD), month_start(until or today))
+    months = set()
+    while month <= last:
+        months.add(month)
+        month = add_months(month, 1)
+    created = []
+    for month in sorted(months | stray):
+        name = partition_name(month)
+        if name in existing:
+            continue
+        # Built detached and then attached: ATTACH only needs SHARE UPDATE EXCLUSIVE on the
+        # parent, so concurrent history inserts are not blocked the way CREATE ... PARTITION OF would.
+        async with conn.transaction():
+            await conn.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+            await conn.execute(f"CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS)")
+            if default in existing:
+                # ATTACH checks that DEFAULT holds nothing in the new range. Locking it first
+                # (ATTACH would anyway) stops writers adding such rows once they are moved.
+                await conn.execute(f"LOCK TABLE {default} IN ACCESS EXCLUSIVE MODE")
+                moved = await conn.execute(f"""
+                    WITH moved AS (DELETE FROM {default}
+                                   WHERE changed_at >= '{month}' AND changed_at < '{add_months(month, 1)}'
+                                   RETURNING *)
+                    INSERT INTO {name} SELECT * FROM moved""")
+                if moved != "INSERT 0 0":
+                    logger.warning(f"Moved {moved.split()[-1]} history rows from {default} into {name}")
+            await conn.execute(
+                f"ALTER TABLE {parent} ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')")
+        created.append(name)
+    if created:
+        logger.info(f"Created {len(created)} history partitions: {created[0]} .. {created[-1]}")
+    return created
+
+
+async def apply_retention(conn: asyncpg.Connection, keep_months: int, drop: bool = False) -> List[str]:
+    """Detach partitions wholly older than ``keep_months`` months and move them to the
+    history_archive schema (or drop them). Detaching is CONCURRENTLY, so this must not
+    run inside a transaction."""
+    if keep_months <= 0 or not await is_partitioned(conn):
+        return []
+    cutoff = add_months(month_start(datetime.now().date()), -keep_months)
+    done = []
+    for r in await conn.fetch(PARTITIONS_SQL, HISTORY):
+        m = _PARTITION_NAME.fullmatch(r["relname"])
+        if not m or date(int(m[1]), int(m[2]), 1) >= cutoff:
+            continue
+        name = r["relname"]
+        # A pending detach means an earlier CONCURRENTLY was interrupted; it can only be finalized.
+        mode = "FINALIZE" if r["inhdetachpending"] else "CONCURRENTLY"
+        await conn.execute(f"ALTER TABLE {HISTORY} DETACH PARTITION {name} {mode}")
+        if drop:
+            await conn.execute(f"DROP TABLE {name}")
+        else:
+            await conn.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+            await conn.execute(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}")
+        done.append(name)
+    if done:
+        logger.info(f"{'Dropped' if drop else 'Archived'} history partitions {', '.join(done)}")
+    return done
+
+
+async def maintain(pool):
+    """Keeps partitions created ahead of time and, if configured, applies retention.
+    Every worker runs this; an advisory lock lets one of them do the work each round."""
+    while True:
+        try:
+            async with pool.acquire() as conn:
+                if await conn.fetchval("SELECT pg_try_advisory_lock($1)", MAINTENANCE_LOCK):
+                    try:
+                        await ensure_partitions(conn)
+                        await apply_retention(conn, HISTORY_RETENTION_MONTHS)
+                    finally:
+                        await conn.execute("SELECT pg_advisory_unlock($1)", MAINTENANCE_LOCK)
+        except Exception as e:
+            logger.warning(f"History partition maintenance failed: {e}")
+        await asyncio.sleep(PARTITION_CHECK_INTERVAL)
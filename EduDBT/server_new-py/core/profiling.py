@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import random
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional, Sequence
+
+import asyncpg
+
+from core.config import DSN, SLOW_QUERY_BUFFER, SLOW_QUERY_EXPLAIN_SAMPLE, SLOW_QUERY_LOG, SLOW_QUERY_MS
+
+logger = logging.getLogger(__name__)
+
+# Seconds; infinity keeps the hot-path check a single float comparison when profiling is off.
+SLOW_QUERY_THRESHOLD = SLOW_QUERY_MS / 1000 if SLOW_QUERY_LOG else float("inf")
+EXPLAINABLE = ("select", "with", "insert", "update", "delete")
+
+slow_queries: deque = deque(maxlen=SLOW_QUERY_BUFFER)
+_explain_lock = asyncio.Lock()
+_tasks = set()
+
+
+def param_shape(value) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, (str, bytes, list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def record_slow_query(query: str, label: str, args: Sequence, elapsed: float, route: str):
+    entry = {
+        "at": datetime.now(timezone.utc).isoformat(),
+        "route": route,
+        "duration_ms": round(elapsed * 1000, 2),
+        "statement": label,
+        "params": [param_shape(a) for a in args],
+        "plan": None,
+    }
+    slow_queries.append(entry)
+    logger.warning(f"Slow query {entry['duration_ms']}ms route={route} params={entry['params']}: {label}")
+    if query.lstrip().lower().startswith(EXPLAINABLE) and random.random() < SLOW_QUERY_EXPLAIN_SAMPLE:
+        task = asyncio.get_running_loop().create_task(_explain(entry, query, args))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+
+
+async def _explain(entry: dict, query: str, args: Sequence):
+    # One EXPLAIN at a time, on its own connection so it never competes for pool slots.
+    if _explain_lock.locked():
+        return
+    async with _explain_lock:
+        conn: Optional[asyncpg.Connection] = None
+        try:
+            conn = await asyncpg.connect(DSN)
+            tr = conn.transaction()
+            await tr.start()
+            try:
+                await conn.execute("SET LOCAL statement_timeout = '30s'")
+                rows = await conn.fetch("EXPLAIN (ANALYZE, BUFFERS) " + query, *args)
+            finally:
+                # ANALYZE really runs the statement; never let a sampled write commit.
+                await tr.rollback()
+            entry["plan"] = "\n".join(r[0] for r in rows)
+        except Exception as e:
+            entry["plan"] = f"EXPLAIN failed: {e}"
+        finally:
+            if conn is not None:
+                await conn.close()
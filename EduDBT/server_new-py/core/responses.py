@@ -0,0 +1,24 @@
+from typing import Any
+
+import asyncpg
+import orjson
+from fastapi.responses import Response
+
+
+def orjson_default(o):
+    if isinstance(o, asyncpg.Record):
+        return dict(o)
+    raise TypeError
+
+
+class RecordJSONResponse(Response):
+    """JSON response that encodes asyncpg Records (and datetimes) directly with orjson.
+
+    Handlers returning it bypass FastAPI's response_model validation and
+    re-serialisation; the decorator's response_model still documents the shape.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=orjson_default)
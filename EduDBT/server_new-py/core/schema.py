@@ -0,0 +1,91 @@
+import asyncpg
+
+# Mirrors create_tables() in "DBT Database.py". This is migration 1 in core/migrations.py;
+# schema changes after it go there as new migrations rather than edits here.
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS Students (
+        student_id SERIAL PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        email VARCHAR(100) UNIQUE,
+        phone VARCHAR(15) UNIQUE,
+        state VARCHAR(50) NOT NULL,
+        college VARCHAR(100)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS BankAccounts (
+        account_id SERIAL PRIMARY KEY,
+        student_id INT NOT NULL,
+        account_number VARCHAR(50) UNIQUE NOT NULL,
+        bank_name VARCHAR(100) NOT NULL,
+        CONSTRAINT fk_student FOREIGN KEY (student_id) REFERENCES Students(student_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS AccountStatus (
+        status_id SERIAL PRIMARY KEY,
+        account_id INT NOT NULL,
+        aadhaar_linked BOOLEAN DEFAULT FALSE,
+        dbt_enabled BOOLEAN DEFAULT FALSE,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT fk_account FOREIGN KEY (account_id) REFERENCES BankAccounts(account_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Schemes (
+        scheme_id SERIAL PRIMARY KEY,
+        scheme_name VARCHAR(100) NOT NULL,
+        department VARCHAR(100)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS Beneficiaries (
+        ben_id SERIAL PRIMARY KEY,
+        student_id INT NOT NULL,
+        scheme_id INT NOT NULL,
+        is_beneficiary BOOLEAN DEFAULT FALSE,
+        date_registered DATE,
+        CONSTRAINT fk_ben_student FOREIGN KEY (student_id) REFERENCES Students(student_id) ON DELETE CASCADE,
+        CONSTRAINT fk_ben_scheme FOREIGN KEY (scheme_id) REFERENCES Schemes(scheme_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS AccountStatusHistory (
+        history_id SERIAL PRIMARY KEY,
+        account_id INT NOT NULL,
+        aadhaar_linked BOOLEAN,
+        dbt_enabled BOOLEAN,
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT fk_hist_account FOREIGN KEY (account_id) REFERENCES BankAccounts(account_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS AwarenessContent (
+        content_id SERIAL PRIMARY KEY,
+        title TEXT NOT NULL,
+        content TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_accountstatus_aadhaar ON AccountStatus (aadhaar_linked)",
+    "CREATE INDEX IF NOT EXISTS idx_accountstatus_dbt ON AccountStatus (dbt_enabled)",
+    "CREATE INDEX IF NOT EXISTS idx_accountstatus_dbt_enabled ON AccountStatus (account_id) WHERE dbt_enabled",
+    "CREATE INDEX IF NOT EXISTS idx_bankaccounts_student ON BankAccounts (student_id)",
+    "CREATE INDEX IF NOT EXISTS idx_students_state_id ON Students (state, student_id)",
+    "CREATE INDEX IF NOT EXISTS idx_students_college_id ON Students (college, student_id)",
+    "CREATE INDEX IF NOT EXISTS idx_students_state_college_id ON Students (state, college, student_id)",
+]
+
+
+async def create_tables(conn: asyncpg.Connection):
+    for ddl in TABLES:
+        await conn.execute(ddl)
+
+
+async def create_indexes(conn: asyncpg.Connection):
+    for ddl in INDEXES:
+        await conn.execute(ddl)
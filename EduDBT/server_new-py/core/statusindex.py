@@ -0,0 +1,615 @@
+import asyncio
+import json
+import logging
+from bisect import bisect_left
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+from core.admission import BULK, priority
+from core.analytics import AADHAAR, DBT, load_codes
+from core.config import CHANGES_CHANNEL, STATUS_INDEX_REBUILD_DELAY
+from core.listener import listener
+from core.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+# Raised by the migration 6 triggers with the ids of students whose state, and of
+# accounts whose student or bank, changed (added and removed rows included).
+STRUCTURE_CHANNEL = "dbt_status_index"
+SAMPLE_SIZE = 20
+SCAN_CHUNK = 1 << 15
+
+# Current rows for the ids in a structure notification; ids not returned were deleted.
+STUDENT_ROWS_SQL = "SELECT student_id, state FROM Students WHERE student_id = ANY($1::int[])"
+ACCOUNT_ROWS_SQL = """
+SELECT ba.account_id, ba.student_id, ba.bank_name,
+       (COALESCE(s.aadhaar_linked::int, 0) + 2 * COALESCE(s.dbt_enabled::int, 0))::int2 AS flags
+FROM BankAccounts ba LEFT JOIN AccountStatus s ON s.account_id=ba.account_id
+WHERE ba.account_id = ANY($1::int[])
+"""
+
+# Fill values for slots beyond the highest id seen: absent students, absent accounts.
+STUDENT_FIELDS = {"student_state": -1, "student_accounts": 0, "student_enabled": 0}
+ACCOUNT_FIELDS = {"account_student": 0, "account_state": 0, "account_bank": 0, "account_flags": 0,
+                  "account_version": 0}
+
+
+class NotReady(Exception):
+    pass
+
+
+class IndexArrays(NamedTuple):
+    """Dense arrays indexed by student_id / account_id (both serials). Codes follow
+    core.analytics: n is the n-th label, 0 is NULL. Absent students have state -1,
+    absent accounts student 0."""
+    states: List[str]
+    banks: List[str]
+    student_state: np.ndarray
+    student_accounts: np.ndarray
+    student_enabled: np.ndarray
+    account_student: np.ndarray
+    account_state: np.ndarray
+    account_bank: np.ndarray
+    account_flags: np.ndarray
+    # history_id of the last change event applied; 0 for values from the bulk load.
+    account_version: np.ndarray
+    # Accounts per [state, bank, flags] and pending students per state, kept in step
+    # with every applied event so counts never scan.
+    counts: np.ndarray
+    pending: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        return sum(v.nbytes for v in self if isinstance(v, np.ndarray))
+
+
+def build(names, students: np.ndarray, accounts: np.ndarray, statuses: np.ndarray) -> IndexArrays:
+    states, banks = list(names["states"]), list(names["banks"])
+    student_state = np.full(int(students["f0"].max(initial=0)) + 1, -1, np.int16)
+    student_state[students["f0"]] = students["f1"]
+    aid, owner = accounts["f0"], accounts["f1"]
+    size = int(max(aid.max(initial=0), statuses["f0"].max(initial=0))) + 1
+    flags = np.zeros(size, np.int8)
+    flags[statuses["f0"]] = statuses["f1"]
+    account_flags = np.zeros(size, np.int8)
+    account_flags[aid] = flags[aid]
+    account_student = np.zeros(size, np.int32)
+    account_student[aid] = owner
+    account_state = np.zeros(size, np.int16)
+    account_state[aid] = student_state[owner]
+    account_bank = np.zeros(size, np.int16)
+    account_bank[aid] = accounts["f2"]
+    student_accounts = np.bincount(owner, minlength=len(student_state)).astype(np.int32)
+    student_enabled = np.bincount(owner[(account_flags[aid] & DBT) != 0], minlength=len(student_state)).astype(np.int32)
+    shape = (len(states) + 1, len(banks) + 1, 4)
+    cells = np.ravel_multi_index((account_state[aid], account_bank[aid], account_flags[aid]), shape)
+    counts = np.bincount(cells, minlength=int(np.prod(shape))).reshape(shape)
+    pending = np.bincount(student_state[_pending_mask(student_state, student_accounts, student_enabled)],
+                          minlength=len(states) + 1)
+    return IndexArrays(states, banks, student_state, student_accounts, student_enabled, account_student,
+                       account_state, account_bank, account_flags, np.zeros(size, np.int64), counts, pending)
+
+
+def _pending_mask(student_state: np.ndarray, accounts: np.ndarray, enabled: np.ndarray) -> np.ndarray:
+    # Same definition as PENDING_DBT_WHERE: no account, or an account that is not DBT-enabled.
+    return (student_state >= 0) & ((accounts == 0) | (enabled < accounts))
+
+
+def _code(labels: Sequence[str], label: Optional[str]) -> Union[slice, int, None]:
+    """Index into the code axis: every code for no filter, None for a label never seen."""
+    if label is None:
+        return slice(None)
+    i = bisect_left(labels, label)
+    return i + 1 if i < len(labels) and labels[i] == label else None
+
+
+def _flag_values(aadhaar_linked: Optional[bool], dbt_enabled: Optional[bool]) -> List[int]:
+    return [f for f in range(4)
+            if (aadhaar_linked is None or bool(f & AADHAAR) == aadhaar_linked)
+            and (dbt_enabled is None or bool(f & DBT) == dbt_enabled)]
+
+
+def _scan(start: int, size: int, limit: int, matches: Callable[[slice], np.ndarray]) -> Tuple[List[int], bool]:
+    """First ``limit`` ids from ``start`` on whose ``matches`` mask is set, and whether more follow.
+    Scans in chunks, so a page near the front does not touch the whole array."""
+    found: List[np.ndarray] = []
+    n = 0
+    while start < size and n <= limit:
+        chunk = slice(start, min(start + SCAN_CHUNK, size))
+        ids = np.flatnonzero(matches(chunk))[:limit + 1 - n] + start
+        found.append(ids)
+        n += len(ids)
+        start = chunk.stop
+    ids = np.concatenate(found) if found else np.zeros(0, np.intp)
+    return ids[:limit].tolist(), len(ids) > limit
+
+
+def _relabel(fresh: IndexArrays, states: List[str], banks: List[str]) -> IndexArrays:
+    """``fresh`` recoded onto a superset of its labels."""
+    state_map = np.array([0] + [bisect_left(states, label) + 1 for label in fresh.states])
+    bank_map = np.array([0] + [bisect_left(banks, label) + 1 for label in fresh.banks])
+    counts = np.zeros((len(states) + 1, len(banks) + 1, 4), fresh.counts.dtype)
+    counts[np.ix_(state_map, bank_map)] = fresh.counts
+    pending = np.zeros(len(states) + 1, fresh.pending.dtype)
+    pending[state_map] = fresh.pending
+    student_state = np.where(fresh.student_state >= 0, state_map[np.maximum(fresh.student_state, 0)], -1)
+    return fresh._replace(states=states, banks=banks, student_state=student_state.astype(np.int16),
+                          account_state=state_map[fresh.account_state].astype(np.int16),
+                          account_bank=bank_map[fresh.account_bank].astype(np.int16), counts=counts, pending=pending)
+
+
+def compare(current: IndexArrays, fresh: IndexArrays) -> dict:
+    """Differences between the live index and one freshly built from the database."""
+    if current.states != fresh.states or current.banks != fresh.banks:
+        # Patching never drops a label whose last row went away; that alone is no mismatch.
+        if not (set(fresh.states) <= set(current.states) and set(fresh.banks) <= set(current.banks)):
+            return {"ok": False, "labels_match": False}
+        fresh = _relabel(fresh, current.states, current.banks)
+
+    def padded(a: np.ndarray, b: np.ndarray):
+        n = max(len(a), len(b))
+        return np.pad(a, (0, n - len(a))), np.pad(b, (0, n - len(b)))
+
+    have, want = padded(current.account_student, fresh.account_student)
+    missing = np.flatnonzero((have == 0) & (want != 0))
+    extra = np.flatnonzero((have != 0) & (want == 0))
+    moved = np.flatnonzero((have != 0) & (want != 0) & (have != want))
+    both = (have != 0) & (want != 0)
+    have_flags, want_flags = padded(current.account_flags, fresh.account_flags)
+    status = np.flatnonzero(both & (have_flags != want_flags))
+    have_state, want_state = padded(current.student_state + 1, fresh.student_state + 1)
+    students = np.flatnonzero(have_state != want_state)
+    result = {
+        "labels_match": True,
+        "accounts": int(np.count_nonzero(want)),
+        "students": int(np.count_nonzero(want_state)),
+        "missing_accounts": int(len(missing)),
+        "extra_accounts": int(len(extra)),
+        "moved_accounts": int(len(moved)),
+        "status_mismatches": int(len(status)),
+        "student_mismatches": int(len(students)),
+        "counts_match": bool(np.array_equal(current.counts, fresh.counts)),
+        "pending_match": bool(np.array_equal(current.pending, fresh.pending)),
+        "sample_accounts": np.unique(np.r_[missing, extra, moved, status])[:SAMPLE_SIZE].tolist(),
+    }
+    result["ok"] = not (missing.size or extra.size or moved.size or status.size or students.size) \
+        and result["counts_match"] and result["pending_match"]
+    return result
+
+
+# -- structural patches ----------------------------------------------------
+# Each takes the arrays and returns them, replaced where they had to grow or gain a
+# label, and sets the row to the given current value, so applying one twice is harmless.
+
+def _grow(a: IndexArrays, fields: dict, size: int) -> IndexArrays:
+    n = len(getattr(a, next(iter(fields))))
+    if size <= n:
+        return a
+    size = max(size, n + n // 4)
+    return a._replace(**{f: np.concatenate([getattr(a, f), np.full(size - n, fill, getattr(a, f).dtype)])
+                         for f, fill in fields.items()})
+
+
+def _label_code(a: IndexArrays, field: str, label: Optional[str]) -> Tuple[IndexArrays, int]:
+    """Code for ``label``; a new one is inserted in order, shifting the codes above it."""
+    if label is None:
+        return a, 0
+    labels = getattr(a, field)
+    i = bisect_left(labels, label)
+    code = i + 1
+    if i < len(labels) and labels[i] == label:
+        return a, code
+    labels = labels[:i] + [label] + labels[i:]
+    if field == "states":
+        a.student_state[a.student_state >= code] += 1
+        a.account_state[a.account_state >= code] += 1
+        return a._replace(states=labels, counts=np.insert(a.counts, code, 0, axis=0),
+                          pending=np.insert(a.pending, code, 0)), code
+    a.account_bank[a.account_bank >= code] += 1
+    return a._replace(banks=labels, counts=np.insert(a.counts, code, 0, axis=1)), code
+
+
+def _is_pending(a: IndexArrays, student: int) -> bool:
+    return a.student_state[student] >= 0 and (
+        a.student_accounts[student] == 0 or a.student_enabled[student] < a.student_accounts[student])
+
+
+def _unpend(a: IndexArrays, student: int):
+    if _is_pending(a, student):
+        a.pending[a.student_state[student]] -= 1
+
+
+def _repend(a: IndexArrays, student: int):
+    if _is_pending(a, student):
+        a.pending[a.student_state[student]] += 1
+
+
+def owned_accounts(a: IndexArrays, student_ids: Set[int]) -> Dict[int, np.ndarray]:
+    """Account ids of each of ``student_ids`` that has any, in one pass over the accounts
+    however many students there are."""
+    ids = [s for s in student_ids if s < len(a.student_accounts) and a.student_accounts[s]]
+    if not ids:
+        return {}
+    owned = np.flatnonzero(np.isin(a.account_student, ids))
+    owners = a.account_student[owned]
+    order = np.argsort(owners, kind="stable")
+    owned, owners = owned[order], owners[order]
+    keys, starts = np.unique(owners, return_index=True)
+    return dict(zip(keys.tolist(), np.split(owned, starts[1:])))
+
+
+def set_student(a: IndexArrays, student_id: int, state: Optional[str], owned: np.ndarray) -> IndexArrays:
+    """``owned`` are the student's account ids, from owned_accounts()."""
+    a, code = _label_code(a, "states", state)
+    a = _grow(a, STUDENT_FIELDS, student_id + 1)
+    if a.student_state[student_id] == code:
+        return a
+    _unpend(a, student_id)
+    a.student_state[student_id] = code
+    if owned.size:
+        np.add.at(a.counts, (a.account_state[owned], a.account_bank[owned], a.account_flags[owned]), -1)
+        a.account_state[owned] = code
+        np.add.at(a.counts, (a.account_state[owned], a.account_bank[owned], a.account_flags[owned]), 1)
+    _repend(a, student_id)
+    return a
+
+
+def remove_student(a: IndexArrays, student_id: int, owned: np.ndarray) -> IndexArrays:
+    if student_id >= len(a.student_state) or a.student_state[student_id] < 0:
+        return a
+    # Its accounts went with it (ON DELETE CASCADE); their own notifications may come later.
+    for account_id in owned.tolist():
+        remove_account(a, account_id)
+    _unpend(a, student_id)
+    a.student_state[student_id] = -1
+    return a
+
+
+def remove_account(a: IndexArrays, account_id: int) -> IndexArrays:
+    if account_id >= len(a.account_student) or not a.account_student[account_id]:
+        return a
+    student = a.account_student[account_id]
+    flags = a.account_flags[account_id]
+    _unpend(a, student)
+    a.counts[a.account_state[account_id], a.account_bank[account_id], flags] -= 1
+    a.student_accounts[student] -= 1
+    if flags & DBT:
+        a.student_enabled[student] -= 1
+    for f in ACCOUNT_FIELDS:
+        getattr(a, f)[account_id] = 0
+    _repend(a, student)
+    return a
+
+
+def set_account(a: IndexArrays, account_id: int, student_id: int, bank: Optional[str],
+                flags: int) -> Optional[IndexArrays]:
+    """Place an account; ``flags`` only count for one the index did not have. None when
+    its student is not in the index yet."""
+    if student_id >= len(a.student_state) or a.student_state[student_id] < 0:
+        return None
+    a, code = _label_code(a, "banks", bank)
+    a = _grow(a, ACCOUNT_FIELDS, account_id + 1)
+    version = 0
+    if a.account_student[account_id]:
+        if a.account_student[account_id] == student_id and a.account_bank[account_id] == code:
+            return a
+        flags, version = int(a.account_flags[account_id]), int(a.account_version[account_id])
+        remove_account(a, account_id)
+    state = a.student_state[student_id]
+    _unpend(a, student_id)
+    a.account_student[account_id] = student_id
+    a.account_state[account_id] = state
+    a.account_bank[account_id] = code
+    a.account_flags[account_id] = flags
+    a.account_version[account_id] = version
+    a.counts[state, code, flags] += 1
+    a.student_accounts[student_id] += 1
+    if flags & DBT:
+        a.student_enabled[student_id] += 1
+    _repend(a, student_id)
+    return a
+
+
+class StatusIndex:
+    """Per-worker, in-memory copy of every account's status flags with its student,
+    state and bank, for counts and id lists that would otherwise join three tables.
+
+    Loaded in one bulk read at startup and patched with each status change event
+    (the change feed's NOTIFY, or the writing handler itself). Events carry the
+    history_id, and per account only a newer one is applied, so late or repeated
+    deliveries cannot roll a status back. Structural changes (new, deleted or
+    re-assigned accounts, students changing state) arrive as ids; a background task
+    reads those rows back and patches them in, growing the arrays as ids pass their
+    end. Only LISTEN reconnects and a failed verify with repair rebuild in full; the
+    previous arrays keep serving until that is done, and events arriving meanwhile
+    are replayed onto its result.
+    """
+
+    def __init__(self):
+        self.arrays: Optional[IndexArrays] = None
+        self.built_at: Optional[datetime] = None
+        self.build_seconds = 0.0
+        self.applied = self.stale = self.unknown = self.patched = self.rebuilds = self.failures = 0
+        self._pool = None
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+        self._replay: Optional[list] = None
+        self._changed: Dict[str, Set[int]] = {"students": set(), "accounts": set()}
+        self._patcher: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.arrays is not None
+
+    def _current(self) -> IndexArrays:
+        if self.arrays is None:
+            raise NotReady("status index is still loading")
+        return self.arrays
+
+    # -- upkeep ------------------------------------------------------------
+
+    def start(self, pool):
+        self._pool = pool
+        self.schedule_rebuild(0)
+
+    async def stop(self):
+        self._pool = None
+        for task in (self._task, self._patcher):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._task = self._patcher = None
+
+    def schedule_rebuild(self, delay: float = STATUS_INDEX_REBUILD_DELAY):
+        self._dirty = True
+        if self._pool is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._rebuild_when_dirty(delay))
+
+    async def _rebuild_when_dirty(self, delay: float):
+        priority.set(BULK)
+        while self._dirty and self._pool is not None:
+            # Lets a burst of triggers (a flapping LISTEN connection) end in one rebuild.
+            await asyncio.sleep(delay)
+            self._dirty = False
+            try:
+                await self.rebuild(self._pool)
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"Status index rebuild failed: {e}")
+                self._dirty = True
+                delay = min(max(delay, 1) * 2, 60)
+
+    async def rebuild(self, pool):
+        started = perf_counter()
+        self._replay = []
+        try:
+            async with pool.acquire() as conn:
+                codes = await load_codes(conn)
+            arrays = await asyncio.to_thread(build, *codes)
+            # Whatever committed after the snapshot arrived meanwhile; those events are
+            # newer than anything in it, and replaying older ones is harmless.
+            for kind, event in self._replay:
+                if kind == "status":
+                    self._apply(arrays, *event)
+                else:
+                    arrays = self._patch(arrays, *event)[0]
+        finally:
+            self._replay = None
+        self.arrays = arrays
+        self.built_at = datetime.now(timezone.utc)
+        self.build_seconds = perf_counter() - started
+        self.rebuilds += 1
+        logger.info(f"Status index built: {int(np.count_nonzero(arrays.account_student))} accounts "
+                    f"in {self.build_seconds:.2f}s, {arrays.nbytes / 2**20:.1f} MiB")
+
+    def apply(self, account_id: int, aadhaar_linked: Optional[bool], dbt_enabled: Optional[bool], history_id: int):
+        """Record one committed status change."""
+        event = (account_id, aadhaar_linked, dbt_enabled, history_id)
+        if self._replay is not None:
+            self._replay.append(("status", event))
+        if self.arrays is not None:
+            self._apply(self.arrays, *event)
+
+    def _apply(self, a: IndexArrays, account_id: int, aadhaar_linked: Optional[bool], dbt_enabled: Optional[bool],
+               history_id: int):
+        if not 0 < account_id < len(a.account_student) or not a.account_student[account_id]:
+            # Created after the last build; the structure notification brings a rebuild.
+            self.unknown += 1
+            return
+        if history_id <= a.account_version[account_id]:
+            self.stale += 1
+            return
+        self.applied += 1
+        a.account_version[account_id] = history_id
+        old = int(a.account_flags[account_id])
+        new = (AADHAAR if aadhaar_linked else 0) | (DBT if dbt_enabled else 0)
+        if old == new:
+            return
+        state, bank = a.account_state[account_id], a.account_bank[account_id]
+        a.counts[state, bank, old] -= 1
+        a.counts[state, bank, new] += 1
+        a.account_flags[account_id] = new
+        if (old ^ new) & DBT:
+            student = a.account_student[account_id]
+            was = a.student_enabled[student] < a.student_accounts[student]
+            a.student_enabled[student] += 1 if new & DBT else -1
+            a.pending[state] += int(a.student_enabled[student] < a.student_accounts[student]) - int(was)
+
+    def on_status(self, payload: Optional[str]):
+        if payload is None:
+            # LISTEN reconnected: events sent meanwhile are gone.
+            self.schedule_rebuild(0)
+            return
+        try:
+            e = json.loads(payload)
+            self.apply(e["account_id"], e["aadhaar_linked"], e["dbt_enabled"], e["id"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Status index ignoring malformed payload: {payload[:200]}")
+
+    def on_structure(self, payload: Optional[str]):
+        if payload is None:
+            self.schedule_rebuild(0)
+            return
+        if self._pool is None:
+            # Not started (or stopping): the startup build reads everything anyway.
+            return
+        try:
+            e = json.loads(payload)
+            self._changed[e["table"]].update(int(i) for i in e["ids"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Status index rebuilding after malformed payload: {payload[:200]}")
+            self.schedule_rebuild(0)
+            return
+        if self._patcher is None or self._patcher.done():
+            self._patcher = asyncio.create_task(self._patch_changed())
+
+    async def _patch_changed(self):
+        priority.set(BULK)
+        while self._pool is not None and any(self._changed.values()):
+            students, accounts = self._changed["students"], self._changed["accounts"]
+            self._changed = {"students": set(), "accounts": set()}
+            try:
+                async with self._pool.acquire() as conn:
+                    # Students first, so an account's student is there when it is placed.
+                    student_rows = await conn.fetch(STUDENT_ROWS_SQL, list(students)) if students else []
+                    account_rows = await conn.fetch(ACCOUNT_ROWS_SQL, list(accounts)) if accounts else []
+            except Exception as e:
+                logger.warning(f"Status index could not read changed rows: {e}")
+                self._changed["students"] |= students
+                self._changed["accounts"] |= accounts
+                await asyncio.sleep(STATUS_INDEX_REBUILD_DELAY)
+                continue
+            event = (students, [tuple(r) for r in student_rows], accounts, [tuple(r) for r in account_rows])
+            if self._replay is not None:
+                self._replay.append(("patch", event))
+            if self.arrays is not None:
+                self.arrays, waiting = self._patch(self.arrays, *event)
+                self.patched += len(students) + len(accounts) - len(waiting)
+                # Their student was added after the read above; read both again.
+                for account_id, student_id in waiting:
+                    self._changed["accounts"].add(account_id)
+                    self._changed["students"].add(student_id)
+
+    def _patch(self, a: IndexArrays, student_ids: Set[int], students: List[tuple], account_ids: Set[int],
+               accounts: List[tuple]) -> Tuple[IndexArrays, List[Tuple[int, int]]]:
+        found = dict(students)
+        # Students only change state or go here, so who owns which account holds throughout.
+        owned = owned_accounts(a, student_ids)
+        none = np.empty(0, np.int64)
+        for student_id in student_ids:
+            accounts_of = owned.get(student_id, none)
+            if student_id in found:
+                a = set_student(a, student_id, found[student_id], accounts_of)
+            else:
+                a = remove_student(a, student_id, accounts_of)
+        found = {r[0]: r[1:] for r in accounts}
+        waiting = []
+        for account_id in account_ids:
+            if account_id not in found:
+                a = remove_account(a, account_id)
+                continue
+            placed = set_account(a, account_id, *found[account_id])
+            if placed is None:
+                waiting.append((account_id, found[account_id][0]))
+            else:
+                a = placed
+        return a, waiting
+
+    # -- queries -----------------------------------------------------------
+
+    def count_accounts(self, aadhaar_linked: Optional[bool] = None, dbt_enabled: Optional[bool] = None,
+                       state: Optional[str] = None, bank: Optional[str] = None) -> int:
+        a = self._current()
+        s, b = _code(a.states, state), _code(a.banks, bank)
+        if s is None or b is None:
+            return 0
+        return int(a.counts[s, b][..., _flag_values(aadhaar_linked, dbt_enabled)].sum())
+
+    def account_ids(self, after_id: int, limit: int, aadhaar_linked: Optional[bool] = None,
+                    dbt_enabled: Optional[bool] = None, state: Optional[str] = None,
+                    bank: Optional[str] = None) -> Tuple[List[int], bool]:
+        """Matching account ids above ``after_id`` in order, and whether more follow."""
+        a = self._current()
+        s, b = _code(a.states, state), _code(a.banks, bank)
+        if s is None or b is None:
+            return [], False
+        wanted = np.zeros(4, bool)
+        wanted[_flag_values(aadhaar_linked, dbt_enabled)] = True
+
+        def matches(c: slice) -> np.ndarray:
+            mask = (a.account_student[c] != 0) & wanted[a.account_flags[c]]
+            if state is not None:
+                mask &= a.account_state[c] == s
+            if bank is not None:
+                mask &= a.account_bank[c] == b
+            return mask
+
+        return _scan(after_id + 1, len(a.account_student), limit, matches)
+
+    def count_pending(self, state: Optional[str] = None) -> int:
+        a = self._current()
+        s = _code(a.states, state)
+        return 0 if s is None else int(a.pending[s].sum())
+
+    def pending_ids(self, after_id: int, limit: int, state: Optional[str] = None) -> Tuple[List[int], bool]:
+        """Student ids pending DBT (see PENDING_DBT_WHERE) above ``after_id``, and whether more follow."""
+        a = self._current()
+        s = _code(a.states, state)
+        if s is None:
+            return [], False
+
+        def matches(c: slice) -> np.ndarray:
+            mask = _pending_mask(a.student_state[c], a.student_accounts[c], a.student_enabled[c])
+            if state is not None:
+                mask &= a.student_state[c] == s
+            return mask
+
+        return _scan(after_id + 1, len(a.student_state), limit, matches)
+
+    def verify(self, pool) -> Awaitable[dict]:
+        """Compare with a fresh load from the database. Changes committed while this runs
+        can show up as mismatches that the next event or rebuild resolves. Raises
+        NotReady right away, before anything is awaited."""
+        return self._verify(self._current(), pool)
+
+    async def _verify(self, current: IndexArrays, pool) -> dict:
+        async with pool.acquire() as conn:
+            codes = await load_codes(conn)
+        snapshot = current._replace(**{f: getattr(current, f).copy() for f in current._fields
+                                       if isinstance(getattr(current, f), np.ndarray)})
+        fresh = await asyncio.to_thread(build, *codes)
+        return {"checked_at": datetime.now(timezone.utc), **await asyncio.to_thread(compare, snapshot, fresh)}
+
+    def stats(self) -> dict:
+        a = self.arrays
+        return {
+            "ready": a is not None,
+            "built_at": self.built_at,
+            "build_seconds": self.build_seconds,
+            "accounts": int(np.count_nonzero(a.account_student)) if a else 0,
+            "students": int(np.count_nonzero(a.student_state >= 0)) if a else 0,
+            "bytes": a.nbytes if a else 0,
+            "rebuilding": self._task is not None and not self._task.done(),
+            "rebuilds": self.rebuilds,
+            "events": {"applied": self.applied, "stale": self.stale, "unknown": self.unknown,
+                       "patched": self.patched},
+        }
+
+
+status_index = StatusIndex()
+listener.on(CHANGES_CHANNEL, status_index.on_status)
+listener.on(STRUCTURE_CHANNEL, status_index.on_structure)
+
+Counter("status_index_events_total", "Status change events seen by the status index, by outcome.", ("outcome",),
+        collect=lambda: [(("applied",), status_index.applied), (("stale",), status_index.stale),
+                         (("unknown",), status_index.unknown)])
+Counter("status_index_patched_rows_total", "Student and account rows patched into the status index.",
+        collect=lambda: [((), status_index.patched)])
+Counter("status_index_rebuilds_total", "Status index rebuilds by outcome.", ("outcome",),
+        collect=lambda: [(("ok",), status_index.rebuilds), (("failed",), status_index.failures)])
+Gauge("status_index_age_seconds", "Time since the status index was last rebuilt.",
+      collect=lambda: [((), (datetime.now(timezone.utc) - status_index.built_at).total_seconds())]
+      if status_index.built_at else [])
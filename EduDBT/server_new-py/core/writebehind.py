@@ -0,0 +1,197 @@
+import asyncio
+import logging
+from time import perf_counter
+from typing import Dict, Optional, Tuple
+
+from core.admission import WRITE, priority
+from core.changes import NOTIFY_STATUS_EVENT
+from core.config import (
+    WRITE_BEHIND_BATCH, WRITE_BEHIND_DRAIN_SECONDS, WRITE_BEHIND_MAX_PENDING, WRITE_BEHIND_SUBMIT_TIMEOUT,
+    WRITE_BEHIND_WINDOW_MS,
+)
+from core.metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+Update = Tuple[Optional[bool], Optional[bool]]
+
+# Like BATCH_STATUS_SQL, but rows whose stored values would not change are left alone, so
+# AccountStatusHistory (and the change feed) only sees real transitions. cur locks the rows
+# in account_id order and yields the latest committed values to compare against.
+FLUSH_STATUS_SQL = f"""
+WITH input AS (
+    SELECT * FROM unnest($1::int[], $2::bool[], $3::bool[]) AS i(account_id, aadhaar_linked, dbt_enabled)
+),
+cur AS (
+    SELECT account_id, aadhaar_linked, dbt_enabled FROM AccountStatus
+    WHERE account_id = ANY($1) ORDER BY account_id FOR UPDATE
+),
+upd AS (
+    UPDATE AccountStatus asu
+    SET aadhaar_linked=COALESCE(i.aadhaar_linked, cur.aadhaar_linked),
+        dbt_enabled=COALESCE(i.dbt_enabled, cur.dbt_enabled),
+        last_updated=CURRENT_TIMESTAMP
+    FROM input i JOIN cur USING (account_id)
+    WHERE asu.account_id=i.account_id
+      AND (COALESCE(i.aadhaar_linked, cur.aadhaar_linked), COALESCE(i.dbt_enabled, cur.dbt_enabled))
+          IS DISTINCT FROM (cur.aadhaar_linked, cur.dbt_enabled)
+    RETURNING asu.account_id, asu.aadhaar_linked, asu.dbt_enabled
+),
+hist AS (
+    INSERT INTO AccountStatusHistory (account_id,aadhaar_linked,dbt_enabled)
+    SELECT account_id, aadhaar_linked, dbt_enabled FROM upd
+    RETURNING {NOTIFY_STATUS_EVENT}
+)
+SELECT (SELECT count(*) FROM upd) AS changed,
+       ARRAY(SELECT account_id FROM input EXCEPT SELECT account_id FROM cur ORDER BY 1) AS missing
+"""
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _merge(older: Update, newer: Update) -> Update:
+    return (newer[0] if newer[0] is not None else older[0], newer[1] if newer[1] is not None else older[1])
+
+
+class WriteBehind:
+    """In-process write-behind queue for account status updates.
+
+    Updates are merged per account (later non-null fields win) and flushed by one
+    background task WRITE_BEHIND_WINDOW_MS after the first one arrives, or sooner
+    once a batch's worth is pending, in statements of WRITE_BEHIND_BATCH accounts.
+    Submitters wait for room when WRITE_BEHIND_MAX_PENDING accounts are queued or
+    in flight, and get QueueFull after WRITE_BEHIND_SUBMIT_TIMEOUT. A failed flush
+    puts its updates back under any newer ones and is retried.
+    """
+
+    def __init__(self, window: float = WRITE_BEHIND_WINDOW_MS / 1000, batch: int = WRITE_BEHIND_BATCH,
+                 max_pending: int = WRITE_BEHIND_MAX_PENDING):
+        self.window = window
+        self.batch = batch
+        self.max_pending = max_pending
+        self.pending: Dict[int, Update] = {}
+        self.inflight = 0
+        self.accepted = self.coalesced = self.rejected = 0
+        self.changed = self.unchanged = self.missing = self.failures = 0
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._closing
+
+    @property
+    def depth(self) -> int:
+        return len(self.pending) + self.inflight
+
+    def start(self, pool):
+        self._closing = False
+        self._wake = asyncio.Event()
+        self._full = asyncio.Event()
+        self._room = asyncio.Condition()
+        self._task = asyncio.create_task(self._run(pool))
+
+    async def stop(self):
+        """Flush everything queued, giving up after WRITE_BEHIND_DRAIN_SECONDS."""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wake.set()
+        self._full.set()
+        try:
+            await asyncio.wait_for(self._task, WRITE_BEHIND_DRAIN_SECONDS)
+        except asyncio.TimeoutError:
+            logger.error(f"Write-behind drain timed out; {self.depth} account status updates were not written")
+        self._task = None
+
+    async def submit(self, account_id: int, aadhaar_linked: Optional[bool], dbt_enabled: Optional[bool]):
+        if not self.running:
+            raise QueueFull("write-behind queue is not accepting updates")
+        if account_id not in self.pending and self.depth >= self.max_pending:
+            self._full.set()
+            try:
+                async with self._room:
+                    await asyncio.wait_for(
+                        self._room.wait_for(lambda: account_id in self.pending or self.depth < self.max_pending),
+                        WRITE_BEHIND_SUBMIT_TIMEOUT,
+                    )
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise QueueFull(f"{self.depth} account status updates pending")
+        update = (aadhaar_linked, dbt_enabled)
+        if account_id in self.pending:
+            self.coalesced += 1
+            update = _merge(self.pending[account_id], update)
+        self.pending[account_id] = update
+        self.accepted += 1
+        self._wake.set()
+        if len(self.pending) >= self.batch:
+            self._full.set()
+
+    async def _run(self, pool):
+        # Queued writes already answered 202; they still go ahead of reads for connections.
+        priority.set(WRITE)
+        while True:
+            await self._wake.wait()
+            if not self._closing:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.window)
+                except asyncio.TimeoutError:
+                    pass
+            self._wake.clear()
+            self._full.clear()
+            await self._flush(pool)
+            if self._closing and not self.pending:
+                return
+
+    async def _flush(self, pool):
+        batch, self.pending = self.pending, {}
+        ids = sorted(batch)
+        self.inflight = len(ids)
+        try:
+            for start in range(0, len(ids), self.batch):
+                chunk = ids[start:start + self.batch]
+                started = perf_counter()
+                try:
+                    async with pool.acquire() as conn:
+                        row = await conn.fetchrow(
+                            FLUSH_STATUS_SQL, chunk, [batch[i][0] for i in chunk], [batch[i][1] for i in chunk]
+                        )
+                except Exception as e:
+                    self.failures += 1
+                    logger.warning(f"Write-behind flush of {len(ids) - start} account status updates failed: {e}")
+                    for i in ids[start:]:
+                        self.pending[i] = _merge(batch[i], self.pending[i]) if i in self.pending else batch[i]
+                    self.inflight = 0
+                    self._wake.set()
+                    await asyncio.sleep(1)
+                    return
+                FLUSH_SECONDS.observe(perf_counter() - started)
+                self.changed += row["changed"]
+                self.missing += len(row["missing"])
+                self.unchanged += len(chunk) - row["changed"] - len(row["missing"])
+                if row["missing"]:
+                    logger.warning(f"Write-behind dropped updates for unknown accounts {row['missing'][:20]}")
+                self.inflight -= len(chunk)
+                async with self._room:
+                    self._room.notify_all()
+        finally:
+            self.inflight = 0
+            async with self._room:
+                self._room.notify_all()
+
+
+write_behind = WriteBehind()
+
+FLUSH_SECONDS = Histogram("write_behind_flush_seconds", "Latency of one write-behind status flush statement.")
+Gauge("write_behind_pending", "Account status updates queued or being flushed.",
+      collect=lambda: [((), write_behind.depth)])
+Counter("write_behind_updates_total", "Account status updates by outcome.", ("outcome",), collect=lambda: [
+    (("accepted",), write_behind.accepted), (("coalesced",), write_behind.coalesced),
+    (("rejected",), write_behind.rejected), (("changed",), write_behind.changed),
+    (("unchanged",), write_behind.unchanged), (("missing",), write_behind.missing),
+])
+Counter("write_behind_flush_failures_total", "Write-behind flushes that failed and were requeued.",
+        collect=lambda: [((), write_behind.failures)])
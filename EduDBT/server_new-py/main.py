@@ -1,18 +1,65 @@
-from fastapi import FastAPI, HTTPException, Depends, status
-import asyncpg
-from core.db import lifespan, get_db_connection
-from routers import students, bank_accounts
+import hmac
+
+from fastapi import Depends, FastAPI, HTTPException, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+from core.admission import AdmissionMiddleware, PoolTimeout
+from core.cache import caches
+from core.conditional import ConditionalMiddleware
+from core.metrics import MetricsMiddleware, render
+from core.profiling import slow_queries
+from core.config import ADMISSION_RETRY_AFTER, OPS_ENDPOINTS, OPS_TOKEN
+from core.db import ReadYourWritesMiddleware, lifespan, readiness
+from routers import students, bank_accounts, schemes, awareness, analytics, eligibility, status_index
 
 app = FastAPI(title="DBT Backend API", version="1.0.0", lifespan=lifespan)
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(ConditionalMiddleware)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(students.router)
 app.include_router(bank_accounts.router)
+app.include_router(schemes.router)
+app.include_router(awareness.router)
+app.include_router(analytics.router)
+app.include_router(eligibility.router)
+app.include_router(status_index.router)
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout(request: Request, exc: PoolTimeout):
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": str(ADMISSION_RETRY_AFTER)})
+
+@app.get("/health/live")
+async def health_live():
+    """Liveness: the process is up and its event loop turning. Never touches the database."""
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness: 503 while the pool is saturated or the database unreachable."""
+    ready, detail = await readiness()
+    return JSONResponse(detail, status_code=200 if ready else 503)
+
+# Kept for existing probes; same answer as /health/ready.
+app.get("/health")(health_ready)
+
+def ops_access(request: Request):
+    """Gate for endpoints that show SQL text, plans and internals: off unless OPS_ENDPOINTS,
+    and with OPS_TOKEN set, only for callers presenting it."""
+    if not OPS_ENDPOINTS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if OPS_TOKEN and not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {OPS_TOKEN}"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or missing ops token",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+@app.get("/cache/stats", dependencies=[Depends(ops_access)])
+async def cache_stats():
+    return {name: cache.stats() for name, cache in caches.items()}
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(ops_access)])
+async def metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
 
-@app.get("/health")
-async def health(db_pool: asyncpg.Pool = Depends(get_db_connection)):
-    try:
-        async with db_pool.acquire() as conn:
-            await conn.fetchval("SELECT 1")
-        return {"status": "ok"}
-    except:
-        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="DB not available")
+@app.get("/debug/slow-queries", dependencies=[Depends(ops_access)])
+async def show_slow_queries():
+    return list(reversed(slow_queries))
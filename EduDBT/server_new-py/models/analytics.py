@@ -0,0 +1,48 @@
+from pydantic import BaseModel
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+class CoverageGroup(BaseModel):
+    key: Optional[str]
+    accounts: int
+    aadhaar_linked: int
+    dbt_enabled: int
+    aadhaar_linked_rate: float
+    dbt_enabled_rate: float
+
+class DbtCoverage(BaseModel):
+    generated_at: datetime
+    total: CoverageGroup
+    by_state: List[CoverageGroup]
+    by_college: List[CoverageGroup]
+    by_bank: List[CoverageGroup]
+
+class HistogramBucket(BaseModel):
+    max_days: Optional[int]
+    count: int
+
+class EnablementGroup(BaseModel):
+    key: Optional[str]
+    accounts: int
+    enabled: int
+    enabled_rate: float
+    days_to_enable: Optional[Dict[str, float]]
+    histogram: List[HistogramBucket]
+
+class EnablementCohort(BaseModel):
+    week: date
+    accounts: int
+    enabled: int
+    enabled_within_7d: int
+    enabled_within_30d: int
+    enabled_within_90d: int
+    median_days_to_enable: Optional[float]
+
+class DbtEnablement(BaseModel):
+    generated_at: datetime
+    watermark: Optional[int]
+    unknown_created: int
+    total: Optional[EnablementGroup]
+    by_bank: List[EnablementGroup]
+    by_state: List[EnablementGroup]
+    cohorts: List[EnablementCohort]
@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+class AwarenessIn(BaseModel):
+    title: str
+    content: Optional[str]
+
+class AwarenessOut(AwarenessIn):
+    content_id: int
+    created_at: Optional[datetime]
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from datetime import datetime
 from typing import Optional
 
 class BankAccountIn(BaseModel):
@@ -10,3 +11,19 @@ class UpdateAccountStatusIn(BaseModel):
     account_id: int
     aadhaar_linked: Optional[bool] = None
     dbt_enabled: Optional[bool] = None
+
+class BankAccountOut(BaseModel):
+    account_id: int
+    account_number: str
+    bank_name: str
+    student_id: int
+    name: str
+    aadhaar_linked: bool
+    dbt_enabled: bool
+    last_updated: Optional[datetime]
+
+class AccountStatusAsOf(BaseModel):
+    account_id: int
+    aadhaar_linked: Optional[bool]
+    dbt_enabled: Optional[bool]
+    changed_at: datetime
@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+
+class EligibilityRuleIn(BaseModel):
+    states: Optional[List[str]] = None
+    colleges: Optional[List[str]] = None
+    require_aadhaar_linked: bool = False
+    require_dbt_enabled: bool = False
+    active: bool = True
+
+class EligibilityRuleOut(EligibilityRuleIn):
+    scheme_id: int
+    updated_at: datetime
+    evaluated_at: Optional[datetime]
+
+class EligibilityRun(BaseModel):
+    run_id: int
+    mode: str
+    status: str
+    started_at: datetime
+    finished_at: Optional[datetime]
+    students: Optional[int]
+    granted: Optional[int]
+    revoked: Optional[int]
+    error: Optional[str]
@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class SchemeIn(BaseModel):
+    scheme_name: str
+    department: Optional[str]
+
+class SchemeOut(SchemeIn):
+    scheme_id: int
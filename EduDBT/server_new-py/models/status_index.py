@@ -0,0 +1,43 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+
+class IndexEvents(BaseModel):
+    applied: int
+    stale: int
+    unknown: int
+    patched: int
+
+class StatusIndexStats(BaseModel):
+    ready: bool
+    built_at: Optional[datetime]
+    build_seconds: float
+    accounts: int
+    students: int
+    bytes: int
+    rebuilding: bool
+    rebuilds: int
+    events: IndexEvents
+
+class IndexCount(BaseModel):
+    count: int
+
+class IdPage(BaseModel):
+    items: List[int]
+    next_cursor: Optional[str] = None
+
+class StatusIndexCheck(BaseModel):
+    ok: bool
+    checked_at: datetime
+    labels_match: bool
+    accounts: Optional[int] = None
+    students: Optional[int] = None
+    missing_accounts: Optional[int] = None
+    extra_accounts: Optional[int] = None
+    moved_accounts: Optional[int] = None
+    status_mismatches: Optional[int] = None
+    student_mismatches: Optional[int] = None
+    counts_match: Optional[bool] = None
+    pending_match: Optional[bool] = None
+    sample_accounts: List[int] = []
+    rebuild_scheduled: bool = False
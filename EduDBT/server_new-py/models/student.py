@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 
 class StudentIn(BaseModel):
     name: str
@@ -13,3 +13,10 @@ class StudentOut(StudentIn):
 
 class UpdateStudentIn(StudentIn):
     pass
+
+class StudentPage(BaseModel):
+    items: List[StudentOut]
+    next_cursor: Optional[str] = None
+
+class StudentCount(BaseModel):
+    count: int
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends
+import asyncpg
+
+from core.analytics import coverage
+from core.db import get_read_connection
+from core.enablement import enablement
+from models.analytics import DbtCoverage, DbtEnablement
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+@router.get("/dbt-coverage", response_model=DbtCoverage)
+async def dbt_coverage(db_pool: asyncpg.Pool = Depends(get_read_connection)):
+    """Aadhaar-linked and DBT-enabled rates per state, college and bank. Served from a
+    snapshot at most ANALYTICS_TTL_SECONDS old (plus one refresh); see generated_at."""
+    return await coverage.get(db_pool)
+
+@router.get("/dbt-enablement", response_model=DbtEnablement)
+async def dbt_enablement(db_pool: asyncpg.Pool = Depends(get_read_connection)):
+    """Days from account creation to first dbt_enabled=true: percentiles and histograms
+    overall and per bank and state, plus weekly creation cohorts. Built from
+    DbtFirstEnablement, which trails history by up to ENABLEMENT_REFRESH_INTERVAL."""
+    return await enablement.get(db_pool)
@@ -0,0 +1,58 @@
+from fastapi import APIRouter, HTTPException, Depends, status
+import asyncpg
+from typing import List
+
+from core.cache import cached, get_cache, invalidate
+from core.conditional import conditional
+from core.db import get_db_connection
+from models.awareness import AwarenessIn, AwarenessOut
+
+router = APIRouter(prefix="/awareness", tags=["Awareness"])
+
+cache = get_cache("awareness")
+
+@router.post("/", response_model=AwarenessOut, status_code=status.HTTP_201_CREATED)
+async def insert_awareness(payload: AwarenessIn, db_pool: asyncpg.Pool = Depends(get_db_connection)):
+    q = "INSERT INTO AwarenessContent (title,content) VALUES ($1,$2) RETURNING content_id,title,content,created_at"
+    async with db_pool.acquire() as conn:
+        row = await conn.fetchrow(q, payload.title, payload.content)
+        await invalidate(conn, "awareness")
+        return dict(row)
+
+@router.get("/", response_model=List[AwarenessOut], dependencies=[conditional("AwarenessContent", pool=get_db_connection)])
+async def show_awareness_list(db_pool: asyncpg.Pool = Depends(get_db_connection)):
+    async def load():
+        async with db_pool.acquire() as conn:
+            rows = await conn.fetch("SELECT content_id,title,content,created_at FROM AwarenessContent ORDER BY content_id")
+            return [dict(r) for r in rows]
+    return await cached(cache, "all", load)
+
+@router.get("/{content_id}", response_model=AwarenessOut, dependencies=[conditional("AwarenessContent", pool=get_db_connection)])
+async def show_awareness(content_id: int, db_pool: asyncpg.Pool = Depends(get_db_connection)):
+    async def load():
+        async with db_pool.acquire() as conn:
+            row = await conn.fetchrow("SELECT content_id,title,content,created_at FROM AwarenessContent WHERE content_id=$1", content_id)
+            return dict(row) if row else None
+    content = await cached(cache, content_id, load)
+    if content is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Content not found")
+    return content
+
+@router.put("/{content_id}")
+async def update_awareness(content_id: int, payload: AwarenessIn, db_pool: asyncpg.Pool = Depends(get_db_connection)):
+    q = "UPDATE AwarenessContent SET title=$1,content=$2 WHERE content_id=$3"
+    async with db_pool.acquire() as conn:
+        res = await conn.execute(q, payload.title, payload.content, content_id)
+        if res == "UPDATE 0":
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Content not found")
+        await invalidate(conn, "awareness")
+    return {"status": "ok"}
+
+@router.delete("/{content_id}")
+async def delete_awareness(content_id: int, db_pool: asyncpg.Pool = Depends(get_db_connection)):
+    async with db_pool.acquire() as conn:
+        res = await conn.execute("DELETE FROM AwarenessContent WHERE content_id=$1", content_id)
+        if res == "DELETE 0":
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Content not found")
+        await invalidate(conn, "awareness")
+    return {"status": "deleted"}
@@ -1,57 +1,194 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, Body, Header, HTTPException, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 import asyncpg
+from datetime import datetime, timezone
+from typing import List, Literal, Optional
 
-from core.db import get_db_connection
-from models.bank_account import BankAccountIn, UpdateAccountStatusIn
+from core.changes import NOTIFY_STATUS_EVENT, parse_last_event_id, stream_changes
+from core.conditional import conditional
+from core.config import STATUS_BATCH_MAX
+from core.db import get_db_connection, get_read_connection, hot
+from core.export import export_format, stream_export
+from core.responses import RecordJSONResponse
+from core.statusindex import status_index
+from core.writebehind import QueueFull, write_behind
+from models.bank_account import AccountStatusAsOf, BankAccountIn, BankAccountOut, UpdateAccountStatusIn
 
 router = APIRouter(prefix="/bank-accounts", tags=["Bank Accounts"])
 
+INSERT_BANK_ACCOUNT_SQL = hot("""
+WITH acc AS (
+    INSERT INTO BankAccounts (student_id,account_number,bank_name) VALUES ($1,$2,$3) RETURNING account_id
+),
+st AS (
+    INSERT INTO AccountStatus (account_id) SELECT account_id FROM acc
+)
+SELECT account_id FROM acc
+""", write=True)
+
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def insert_bank_account(payload: BankAccountIn, db_pool: asyncpg.Pool = Depends(get_db_connection)):
     async with db_pool.acquire() as conn:
         try:
-            async with conn.transaction():
-                acc = await conn.fetchrow(
-                    "INSERT INTO BankAccounts (student_id,account_number,bank_name) VALUES ($1,$2,$3) RETURNING account_id",
-                    payload.student_id, payload.account_number, payload.bank_name
-                )
-                await conn.execute("INSERT INTO AccountStatus (account_id) VALUES ($1)", acc["account_id"])
-            return {"account_id": acc["account_id"]}
+            account_id = await conn.fetchval(
+                INSERT_BANK_ACCOUNT_SQL, payload.student_id, payload.account_number, payload.bank_name
+            )
+            return {"account_id": account_id}
         except asyncpg.exceptions.ForeignKeyViolationError:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Student ID does not exist")
         except asyncpg.exceptions.UniqueViolationError:
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account number already exists")
 
-@router.get("/")
-async def show_bank_accounts(db_pool: asyncpg.Pool = Depends(get_db_connection)):
-    q = """
-    SELECT ba.account_id, ba.account_number, ba.bank_name, s.student_id, s.name,
-           COALESCE(asu.aadhaar_linked,false) AS aadhaar_linked,
-           COALESCE(asu.dbt_enabled,false) AS dbt_enabled,
-           asu.last_updated
-    FROM BankAccounts ba
-    JOIN Students s ON ba.student_id=s.student_id
-    LEFT JOIN AccountStatus asu ON ba.account_id=asu.account_id
-    """
+BANK_ACCOUNT_COLUMNS = ("account_id", "account_number", "bank_name", "student_id", "name",
+                        "aadhaar_linked", "dbt_enabled", "last_updated")
+
+BANK_ACCOUNTS_SQL = hot("""
+SELECT ba.account_id, ba.account_number, ba.bank_name, s.student_id, s.name,
+       COALESCE(asu.aadhaar_linked,false) AS aadhaar_linked,
+       COALESCE(asu.dbt_enabled,false) AS dbt_enabled,
+       asu.last_updated
+FROM BankAccounts ba
+JOIN Students s ON ba.student_id=s.student_id
+LEFT JOIN AccountStatus asu ON ba.account_id=asu.account_id
+ORDER BY ba.account_id
+""")
+
+@router.get("/", response_model=List[BankAccountOut],
+            dependencies=[conditional("BankAccounts", "Students", "AccountStatus")])
+async def show_bank_accounts(
+    request: Request,
+    fmt: Optional[Literal["json", "ndjson", "csv"]] = Query(None, alias="format"),
+    db_pool: asyncpg.Pool = Depends(get_read_connection),
+):
+    fmt = export_format(request, fmt)
+    if fmt != "json":
+        return stream_export(db_pool, fmt, BANK_ACCOUNTS_SQL, columns=BANK_ACCOUNT_COLUMNS, filename="bank-accounts")
     async with db_pool.acquire() as conn:
-        rows = await conn.fetch(q)
-        return [dict(r) for r in rows]
+        rows = await conn.fetch(BANK_ACCOUNTS_SQL)
+    return RecordJSONResponse(rows)
+
+@router.get("/changes")
+async def account_status_changes(
+    last_event_id: Optional[str] = Header(None),
+    since: Optional[int] = Query(None, ge=0, description="history id to resume after, for clients that cannot set Last-Event-ID"),
+    db_pool: asyncpg.Pool = Depends(get_db_connection),
+):
+    """Server-sent status changes. A resumed stream repeats up to CHANGES_REPLAY_OVERLAP
+    events before the one resumed from, so clients de-duplicate by event id."""
+    # Replays come from the primary: a lagging replica could skip events the client never saw.
+    resume = parse_last_event_id(last_event_id)
+    return StreamingResponse(
+        stream_changes(db_pool, resume if resume is not None else since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# The UPDATE takes the row lock and re-reads the latest committed values before applying
+# COALESCE, so the history row written from RETURNING always matches what was stored.
+UPDATE_STATUS_SQL = hot(f"""
+WITH upd AS (
+    UPDATE AccountStatus
+    SET aadhaar_linked=COALESCE($2, aadhaar_linked),
+        dbt_enabled=COALESCE($3, dbt_enabled),
+        last_updated=CURRENT_TIMESTAMP
+    WHERE account_id=$1
+    RETURNING account_id, aadhaar_linked, dbt_enabled
+)
+INSERT INTO AccountStatusHistory (account_id,aadhaar_linked,dbt_enabled)
+SELECT account_id, aadhaar_linked, dbt_enabled FROM upd
+RETURNING history_id, account_id, aadhaar_linked, dbt_enabled, {NOTIFY_STATUS_EVENT}
+""", write=True)
 
 @router.put("/account-status")
-async def update_account_status(payload: UpdateAccountStatusIn, db_pool: asyncpg.Pool = Depends(get_db_connection)):
+async def update_account_status(
+    payload: UpdateAccountStatusIn, response: Response, db_pool: asyncpg.Pool = Depends(get_db_connection)
+):
+    if write_behind.running:
+        # Unknown account_ids are only discovered at flush time, so there is no 404 in this mode.
+        try:
+            await write_behind.submit(payload.account_id, payload.aadhaar_linked, payload.dbt_enabled)
+        except QueueFull as e:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e),
+                                headers={"Retry-After": "1"})
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"status": "queued"}
     async with db_pool.acquire() as conn:
-        async with conn.transaction():
-            row = await conn.fetchrow("SELECT * FROM AccountStatus WHERE account_id=$1", payload.account_id)
-            if not row:
-                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
-            new_aad = payload.aadhaar_linked if payload.aadhaar_linked is not None else row["aadhaar_linked"]
-            new_dbt = payload.dbt_enabled if payload.dbt_enabled is not None else row["dbt_enabled"]
-            await conn.execute(
-                "INSERT INTO AccountStatusHistory (account_id,aadhaar_linked,dbt_enabled) VALUES ($1,$2,$3)",
-                payload.account_id, new_aad, new_dbt
-            )
-            await conn.execute(
-                "UPDATE AccountStatus SET aadhaar_linked=$1, dbt_enabled=$2,last_updated=CURRENT_TIMESTAMP WHERE account_id=$3",
-                new_aad, new_dbt, payload.account_id
-            )
+        updated = await conn.fetchrow(
+            UPDATE_STATUS_SQL, payload.account_id, payload.aadhaar_linked, payload.dbt_enabled
+        )
+    if updated is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
+    # This worker's index sees the change now rather than when the NOTIFY comes round.
+    status_index.apply(updated["account_id"], updated["aadhaar_linked"], updated["dbt_enabled"], updated["history_id"])
     return {"status": "ok"}
+
+# The history CTE is not read, but data-modifying CTEs always run to completion, RETURNING
+# (and so the per-row NOTIFY, delivered on commit) included.
+BATCH_STATUS_SQL = hot(f"""
+WITH input AS (
+    SELECT * FROM unnest($1::int[], $2::bool[], $3::bool[]) AS i(account_id, aadhaar_linked, dbt_enabled)
+),
+upd AS (
+    UPDATE AccountStatus asu
+    SET aadhaar_linked=COALESCE(i.aadhaar_linked, asu.aadhaar_linked),
+        dbt_enabled=COALESCE(i.dbt_enabled, asu.dbt_enabled),
+        last_updated=CURRENT_TIMESTAMP
+    FROM input i
+    WHERE asu.account_id=i.account_id
+    RETURNING asu.account_id, asu.aadhaar_linked, asu.dbt_enabled
+),
+hist AS (
+    INSERT INTO AccountStatusHistory (account_id,aadhaar_linked,dbt_enabled)
+    SELECT account_id, aadhaar_linked, dbt_enabled FROM upd
+    RETURNING {NOTIFY_STATUS_EVENT}
+)
+SELECT i.account_id FROM input i
+WHERE NOT EXISTS (SELECT 1 FROM upd WHERE upd.account_id=i.account_id)
+ORDER BY i.account_id
+""", write=True)
+
+@router.put("/account-status/batch")
+async def update_account_status_batch(
+    payload: List[UpdateAccountStatusIn] = Body(..., min_length=1, max_length=STATUS_BATCH_MAX),
+    db_pool: asyncpg.Pool = Depends(get_db_connection),
+):
+    # Fold repeated account_ids in request order so each account gets one history row and one UPDATE.
+    merged = {}
+    for u in payload:
+        aad, dbt = merged.get(u.account_id, (None, None))
+        merged[u.account_id] = (
+            u.aadhaar_linked if u.aadhaar_linked is not None else aad,
+            u.dbt_enabled if u.dbt_enabled is not None else dbt,
+        )
+    ids = sorted(merged)
+    async with db_pool.acquire() as conn:
+        missing = await conn.fetch(
+            BATCH_STATUS_SQL, ids, [merged[i][0] for i in ids], [merged[i][1] for i in ids]
+        )
+    return {"updated": len(ids) - len(missing), "missing": [r["account_id"] for r in missing]}
+
+# ts prunes AccountStatusHistory to the monthly partitions at or before it; the
+# newest matching row then comes off idx_accountstatushistory_account_changed.
+STATUS_AS_OF_SQL = hot("""
+SELECT ba.account_id, h.aadhaar_linked, h.dbt_enabled, h.changed_at
+FROM BankAccounts ba
+LEFT JOIN LATERAL (
+    SELECT aadhaar_linked, dbt_enabled, changed_at FROM AccountStatusHistory
+    WHERE account_id=ba.account_id AND changed_at <= $2
+    ORDER BY changed_at DESC LIMIT 1
+) h ON true
+WHERE ba.account_id=$1
+""")
+
+@router.get("/{account_id}/status-as-of", response_model=AccountStatusAsOf)
+async def account_status_as_of(account_id: int, ts: datetime, db_pool: asyncpg.Pool = Depends(get_read_connection)):
+    if ts.tzinfo is not None:
+        # History timestamps are naive, written in the database's time zone (UTC by default).
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    async with db_pool.acquire() as conn:
+        row = await conn.fetchrow(STATUS_AS_OF_SQL, account_id, ts)
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Account not found")
+    if row["changed_at"] is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No status change recorded at or before ts")
+    return RecordJSONResponse(row)
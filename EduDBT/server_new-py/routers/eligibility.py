@@ -0,0 +1,76 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, Response, status
+import asyncpg
+from typing import List, Literal
+
+from core import eligibility
+from core.db import get_db_connection
+from models.eligibility import EligibilityRuleIn, EligibilityRuleOut, EligibilityRun
+
+router = APIRouter(prefix="/eligibility", tags=["Eligibility"])
+
+RULE_COLUMNS = "scheme_id,states,colleges,require_aadhaar_linked,require_dbt_enabled,active,updated_at,evaluated_at"
+RUN_COLUMNS = "run_id,mode,status,started_at,finished_at,students,granted,revoked,error"
+
+UPSERT_RULE_SQL = f"""
+INSERT INTO SchemeEligibilityRules (scheme_id,states,colleges,require_aadhaar_linked,require_dbt_enabled,active)
+VALUES ($1,$2,$3,$4,$5,$6)
+ON CONFLICT (scheme_id) DO UPDATE
+SET states=EXCLUDED.states, colleges=EXCLUDED.colleges, require_aadhaar_linked=EXCLUDED.require_aadhaar_linked,
+    require_dbt_enabled=EXCLUDED.require_dbt_enabled, active=EXCLUDED.active, updated_at=CURRENT_TIMESTAMP
+RETURNING {RULE_COLUMNS}
+"""
+
+@router.get("/rules", response_model=List[EligibilityRuleOut])
+async def show_rules(db_pool: asyncpg.Pool = Depends(get_db_connection)):
+    async with db_pool.acquire() as conn:
+        rows = await conn.fetch(f"SELECT {RULE_COLUMNS} FROM SchemeEligibilityRules ORDER BY scheme_id")
+    return [dict(r) for r in rows]
+
+@router.put("/rules/{scheme_id}", response_model=EligibilityRuleOut)
+async def put_rule(scheme_id: int, payload: EligibilityRuleIn, db_pool: asyncpg.Pool = Depends(get_db_connection)):
+    """Create or replace the scheme's rule. The next run re-evaluates every student for it."""
+    async with db_pool.acquire() as conn:
+        try:
+            row = await conn.fetchrow(
+                UPSERT_RULE_SQL, scheme_id, payload.states, payload.colleges,
+                payload.require_aadhaar_linked, payload.require_dbt_enabled, payload.active,
+            )
+        except asyncpg.exceptions.ForeignKeyViolationError:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Scheme not found")
+    return dict(row)
+
+@router.delete("/rules/{scheme_id}")
+async def delete_rule(scheme_id: int, db_pool: asyncpg.Pool = Depends(get_db_connection)):
+    """Existing Beneficiaries rows for the scheme are kept as they are."""
+    async with db_pool.acquire() as conn:
+        res = await conn.execute("DELETE FROM SchemeEligibilityRules WHERE scheme_id=$1", scheme_id)
+    if res == "DELETE 0":
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rule not found")
+    return {"status": "deleted"}
+
+@router.post("/runs", status_code=status.HTTP_202_ACCEPTED)
+async def start_run(
+    response: Response,
+    mode: Literal["incremental", "full"] = Query("incremental"),
+    db_pool: asyncpg.Pool = Depends(get_db_connection),
+):
+    try:
+        run_id = await eligibility.start(db_pool, mode)
+    except eligibility.RunInProgress as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    response.headers["Location"] = f"{router.prefix}/runs/{run_id}"
+    return {"run_id": run_id, "status": "running"}
+
+@router.get("/runs", response_model=List[EligibilityRun])
+async def show_runs(limit: int = Query(20, ge=1, le=100), db_pool: asyncpg.Pool = Depends(get_db_connection)):
+    async with db_pool.acquire() as conn:
+        rows = await conn.fetch(f"SELECT {RUN_COLUMNS} FROM EligibilityRuns ORDER BY run_id DESC LIMIT $1", limit)
+    return [dict(r) for r in rows]
+
+@router.get("/runs/{run_id}", response_model=EligibilityRun)
+async def show_run(run_id: int, db_pool: asyncpg.Pool = Depends(get_db_connection)):
+    async with db_pool.acquire() as conn:
+        row = await conn.fetchrow(f"SELECT {RUN_COLUMNS} FROM EligibilityRuns WHERE run_id=$1", run_id)
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Run not found")
+    return dict(row)
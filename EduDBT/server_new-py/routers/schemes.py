@@ -0,0 +1,58 @@
+from fastapi import APIRouter, HTTPException, Depends, status
+import asyncpg
+from typing import List
+
+from core.cache import cached, get_cache, invalidate
+from core.conditional import conditional
+from core.db import get_db_connection
+from models.scheme import SchemeIn, SchemeOut
+
+router = APIRouter(prefix="/schemes", tags=["Schemes"])
+
+cache = get_cache("schemes")
+
+@router.post("/", response_model=SchemeOut, status_code=status.HTTP_201_CREATED)
+async def insert_scheme(payload: SchemeIn, db_pool: asyncpg.Pool = Depends(get_db_connection)):
+    q = "INSERT INTO Schemes (scheme_name,department) VALUES ($1,$2) RETURNING scheme_id,scheme_name,department"
+    async with db_pool.acquire() as conn:
+        row = await conn.fetchrow(q, payload.scheme_name, payload.department)
+        await invalidate(conn, "schemes")
+        return dict(row)
+
+@router.get("/", response_model=List[SchemeOut], dependencies=[conditional("Schemes", pool=get_db_connection)])
+async def show_schemes(db_pool: asyncpg.Pool = Depends(get_db_connection)):
+    async def load():
+        async with db_pool.acquire() as conn:
+            rows = await conn.fetch("SELECT scheme_id,scheme_name,department FROM Schemes ORDER BY scheme_id")
+            return [dict(r) for r in rows]
+    return await cached(cache, "all", load)
+
+@router.get("/{scheme_id}", response_model=SchemeOut, dependencies=[conditional("Schemes", pool=get_db_connection)])
+async def show_scheme(scheme_id: int, db_pool: asyncpg.Pool = Depends(get_db_connection)):
+    async def load():
+        async with db_pool.acquire() as conn:
+            row = await conn.fetchrow("SELECT scheme_id,scheme_name,department FROM Schemes WHERE scheme_id=$1", scheme_id)
+            return dict(row) if row else None
+    scheme = await cached(cache, scheme_id, load)
+    if scheme is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Scheme not found")
+    return scheme
+
+@router.put("/{scheme_id}")
+async def update_scheme(scheme_id: int, payload: SchemeIn, db_pool: asyncpg.Pool = Depends(get_db_connection)):
+    q = "UPDATE Schemes SET scheme_name=$1,department=$2 WHERE scheme_id=$3"
+    async with db_pool.acquire() as conn:
+        res = await conn.execute(q, payload.scheme_name, payload.department, scheme_id)
+        if res == "UPDATE 0":
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Scheme not found")
+        await invalidate(conn, "schemes")
+    return {"status": "ok"}
+
+@router.delete("/{scheme_id}")
+async def delete_scheme(scheme_id: int, db_pool: asyncpg.Pool = Depends(get_db_connection)):
+    async with db_pool.acquire() as conn:
+        res = await conn.execute("DELETE FROM Schemes WHERE scheme_id=$1", scheme_id)
+        if res == "DELETE 0":
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Scheme not found")
+        await invalidate(conn, "schemes")
+    return {"status": "deleted"}
@@ -0,0 +1,73 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+import asyncpg
+from typing import Optional
+
+from core.config import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
+from core.db import get_db_connection
+from core.pagination import encode_cursor, resolve_after_id
+from core.statusindex import NotReady, status_index
+from models.status_index import IdPage, IndexCount, StatusIndexCheck, StatusIndexStats
+
+router = APIRouter(prefix="/status-index", tags=["Status Index"])
+
+def _serve(query, *args, **kwargs):
+    try:
+        return query(*args, **kwargs)
+    except NotReady as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e), headers={"Retry-After": "1"})
+
+def _id_page(page) -> dict:
+    items, more = page
+    return {"items": items, "next_cursor": encode_cursor(items[-1]) if more else None}
+
+@router.get("/", response_model=StatusIndexStats)
+async def index_stats():
+    return status_index.stats()
+
+@router.get("/accounts/count", response_model=IndexCount)
+async def count_accounts(
+    aadhaar_linked: Optional[bool] = None,
+    dbt_enabled: Optional[bool] = None,
+    state: Optional[str] = None,
+    bank: Optional[str] = None,
+):
+    """Accounts by status flags, student state and bank, from this worker's in-memory index.
+    A missing status row counts as false, as in GET /bank-accounts."""
+    return {"count": _serve(status_index.count_accounts, aadhaar_linked, dbt_enabled, state, bank)}
+
+@router.get("/accounts", response_model=IdPage)
+async def account_ids(
+    aadhaar_linked: Optional[bool] = None,
+    dbt_enabled: Optional[bool] = None,
+    state: Optional[str] = None,
+    bank: Optional[str] = None,
+    after_id: Optional[int] = Query(None, ge=0),
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+):
+    return _id_page(_serve(status_index.account_ids, resolve_after_id(after_id, cursor), limit,
+                           aadhaar_linked, dbt_enabled, state, bank))
+
+@router.get("/students/pending-dbt/count", response_model=IndexCount)
+async def count_pending_dbt(state: Optional[str] = None):
+    """Same answer as GET /students/pending-dbt?count_only=true, from the in-memory index."""
+    return {"count": _serve(status_index.count_pending, state)}
+
+@router.get("/students/pending-dbt", response_model=IdPage)
+async def pending_dbt_ids(
+    state: Optional[str] = None,
+    after_id: Optional[int] = Query(None, ge=0),
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+):
+    """Student ids of GET /students/pending-dbt, in the same order and cursor format."""
+    return _id_page(_serve(status_index.pending_ids, resolve_after_id(after_id, cursor), limit, state))
+
+@router.post("/verify", response_model=StatusIndexCheck)
+async def verify_index(repair: bool = False, db_pool: asyncpg.Pool = Depends(get_db_connection)):
+    """Compare this worker's index with the database; with ``repair``, rebuild it on a mismatch."""
+    result = await _serve(status_index.verify, db_pool)
+    if repair and not result["ok"]:
+        status_index.schedule_rebuild(0)
+        result["rebuild_scheduled"] = True
+    return result
@@ -1,56 +1,168 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, File, Query, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
 import asyncpg
-from typing import List
+from typing import Literal, Optional, Union
 
-from core.db import get_db_connection
-from models.student import StudentIn, StudentOut, UpdateStudentIn
+from core.bulk import STUDENT_COLUMNS, StudentBatcher, iter_csv, iter_ndjson
+from core.conditional import conditional
+from core.config import BULK_CHUNK_SIZE, PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
+from core.db import get_db_connection, get_read_connection, hot
+from core.pagination import page_of, resolve_after_id
+from core.responses import RecordJSONResponse
+from models.student import StudentCount, StudentIn, StudentOut, StudentPage, UpdateStudentIn
 
 router = APIRouter(prefix="/students", tags=["Students"])
 
+INSERT_STUDENT_SQL = hot("""INSERT INTO Students (name,email,phone,state,college)
+           VALUES ($1,$2,$3,$4,$5)
+           RETURNING student_id,name,email,phone,state,college""", write=True)
+
 @router.post("/", response_model=StudentOut, status_code=status.HTTP_201_CREATED)
 async def insert_student(payload: StudentIn, db_pool: asyncpg.Pool = Depends(get_db_connection)):
-    q = """INSERT INTO Students (name,email,phone,state,college)
-           VALUES ($1,$2,$3,$4,$5)
-           RETURNING student_id,name,email,phone,state,college"""
     try:
         async with db_pool.acquire() as conn:
-            row = await conn.fetchrow(q, payload.name, payload.email, payload.phone, payload.state, payload.college)
+            row = await conn.fetchrow(INSERT_STUDENT_SQL, payload.name, payload.email, payload.phone, payload.state, payload.college)
             return dict(row)
     except asyncpg.exceptions.UniqueViolationError:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email or phone already exists")
 
-@router.get("/", response_model=List[StudentOut])
-async def show_students(db_pool: asyncpg.Pool = Depends(get_db_connection)):
+BULK_MERGE_SQL = """
+WITH ins AS (
+    INSERT INTO Students (name,email,phone,state,college)
+    SELECT name,email,phone,state,college FROM students_stage ORDER BY line
+    ON CONFLICT DO NOTHING
+    RETURNING email, phone
+)
+SELECT st.line
+FROM students_stage st
+LEFT JOIN ins ie ON ie.email=st.email
+LEFT JOIN ins ip ON ip.phone=st.phone
+WHERE (st.email IS NOT NULL OR st.phone IS NOT NULL) AND ie.email IS NULL AND ip.phone IS NULL
+ORDER BY st.line
+"""
+
+@router.post("/bulk")
+async def bulk_insert_students(
+    file: UploadFile = File(...),
+    fmt: Optional[Literal["csv", "ndjson"]] = Query(None, alias="format"),
+    db_pool: asyncpg.Pool = Depends(get_db_connection),
+):
+    if fmt is None:
+        ndjson = (file.filename or "").endswith((".ndjson", ".jsonl")) or "ndjson" in (file.content_type or "")
+        fmt = "ndjson" if ndjson else "csv"
+    batcher = StudentBatcher(iter_ndjson(file.file) if fmt == "ndjson" else iter_csv(file.file))
+    async with db_pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute(
+                "CREATE TEMP TABLE students_stage (line INT, name TEXT, email TEXT, phone TEXT, state TEXT, college TEXT) ON COMMIT DROP"
+            )
+            while batch := await run_in_threadpool(batcher.next_batch, BULK_CHUNK_SIZE):
+                await conn.copy_records_to_table("students_stage", records=batch, columns=("line", *STUDENT_COLUMNS))
+            staged = await conn.fetchval("SELECT count(*) FROM students_stage")
+            conflicts = await conn.fetch(BULK_MERGE_SQL)
+    rejected = batcher.rejected + [{"line": r["line"], "error": "email or phone already exists"} for r in conflicts]
+    rejected.sort(key=lambda r: r["line"])
+    return {"received": batcher.received, "inserted": staged - len(conflicts), "rejected": rejected}
+
+def students_page_sql(state: bool, college: bool) -> str:
+    # Keyset scan: served by idx_students_{state,college,state_college}_id when filtered.
+    q = "SELECT student_id,name,email,phone,state,college FROM Students WHERE student_id > $1"
+    n = 1
+    if state:
+        n += 1
+        q += f" AND state = ${n}"
+    if college:
+        n += 1
+        q += f" AND college = ${n}"
+    return q + f" ORDER BY student_id LIMIT ${n + 1}"
+
+for state in (False, True):
+    for college in (False, True):
+        hot(students_page_sql(state, college))
+
+@router.get("/", response_model=StudentPage, dependencies=[conditional("Students")])
+async def show_students(
+    after_id: Optional[int] = Query(None, ge=0),
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    state: Optional[str] = None,
+    college: Optional[str] = None,
+    db_pool: asyncpg.Pool = Depends(get_read_connection),
+):
+    args = [resolve_after_id(after_id, cursor)]
+    args += [v for v in (state, college) if v is not None]
+    args.append(limit + 1)
     async with db_pool.acquire() as conn:
-        rows = await conn.fetch("SELECT * FROM Students ORDER BY student_id")
-        return [dict(r) for r in rows]
-
-@router.get("/pending-dbt")
-async def show_pending_dbt(db_pool: asyncpg.Pool = Depends(get_db_connection)):
-    q = """
-    SELECT DISTINCT s.*
-    FROM Students s
-    LEFT JOIN BankAccounts ba ON s.student_id=ba.student_id
-    LEFT JOIN AccountStatus asu ON ba.account_id=asu.account_id
-    WHERE COALESCE(asu.dbt_enabled,false)=false
-    """
+        rows = await conn.fetch(students_page_sql(state is not None, college is not None), *args)
+    items, next_cursor = page_of(rows, limit, "student_id")
+    return RecordJSONResponse({"items": items, "next_cursor": next_cursor})
+
+# A student is pending when they have no bank account, or some account with no
+# dbt_enabled status row. Written as a scalar subquery so it is probed per student
+# (idx_bankaccounts_student, then idx_accountstatus_dbt_enabled): the EXISTS form
+# let the planner hash both tables in full even for a 100-row page.
+PENDING_DBT_WHERE = """
+NOT COALESCE((SELECT bool_and(EXISTS (SELECT 1 FROM AccountStatus asu
+                                      WHERE asu.account_id=ba.account_id AND asu.dbt_enabled))
+              FROM BankAccounts ba WHERE ba.student_id=s.student_id), false)
+"""
+# Same predicate for counting every student, where hashing both tables once is the cheaper plan.
+PENDING_DBT_SCAN_WHERE = """
+(NOT EXISTS (SELECT 1 FROM BankAccounts ba WHERE ba.student_id=s.student_id)
+ OR EXISTS (SELECT 1 FROM BankAccounts ba
+            WHERE ba.student_id=s.student_id
+              AND NOT EXISTS (SELECT 1 FROM AccountStatus asu
+                              WHERE asu.account_id=ba.account_id AND asu.dbt_enabled)))
+"""
+
+def pending_dbt_sql(state: bool, count_only: bool) -> str:
+    """$1 is the state when filtered; a page then takes the after id and the limit."""
+    where = PENDING_DBT_WHERE + (" AND s.state = $1" if state else "")
+    if count_only:
+        return f"SELECT count(*) FROM Students s WHERE {where if state else PENDING_DBT_SCAN_WHERE}"
+    n = 2 if state else 1
+    return f"""SELECT s.student_id,s.name,s.email,s.phone,s.state,s.college
+            FROM Students s WHERE {where} AND s.student_id > ${n}
+            ORDER BY s.student_id LIMIT ${n + 1}"""
+
+@router.get("/pending-dbt", response_model=Union[StudentPage, StudentCount],
+            dependencies=[conditional("Students", "BankAccounts", "AccountStatus")])
+async def show_pending_dbt(
+    after_id: Optional[int] = Query(None, ge=0),
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    state: Optional[str] = None,
+    count_only: bool = False,
+    db_pool: asyncpg.Pool = Depends(get_read_connection),
+):
+    args = [state] if state is not None else []
+    q = pending_dbt_sql(state is not None, count_only)
+    if count_only:
+        async with db_pool.acquire() as conn:
+            return {"count": await conn.fetchval(q, *args)}
+    args += [resolve_after_id(after_id, cursor), limit + 1]
     async with db_pool.acquire() as conn:
-        rows = await conn.fetch(q)
-        return [dict(r) for r in rows]
+        rows = await conn.fetch(q, *args)
+    items, next_cursor = page_of(rows, limit, "student_id")
+    return RecordJSONResponse({"items": items, "next_cursor": next_cursor})
+
+UPDATE_STUDENT_SQL = hot("UPDATE Students SET name=$1,email=$2,phone=$3,state=$4,college=$5 WHERE student_id=$6",
+                         write=True)
 
 @router.put("/{student_id}")
 async def update_student(student_id: int, payload: UpdateStudentIn, db_pool: asyncpg.Pool = Depends(get_db_connection)):
-    q = """UPDATE Students SET name=$1,email=$2,phone=$3,state=$4,college=$5 WHERE student_id=$6"""
     async with db_pool.acquire() as conn:
-        result = await conn.execute(q, payload.name, payload.email, payload.phone, payload.state, payload.college, student_id)
+        result = await conn.execute(UPDATE_STUDENT_SQL, payload.name, payload.email, payload.phone, payload.state, payload.college, student_id)
         if result == "UPDATE 0":
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found")
         return {"status": "updated"}
 
+DELETE_STUDENT_SQL = "DELETE FROM Students WHERE student_id=$1"
+
 @router.delete("/{student_id}")
 async def delete_student(student_id: int, db_pool: asyncpg.Pool = Depends(get_db_connection)):
     async with db_pool.acquire() as conn:
-        res = await conn.execute("DELETE FROM Students WHERE student_id=$1", student_id)
+        res = await conn.execute(DELETE_STUDENT_SQL, student_id)
         if res == "DELETE 0":
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found")
         return {"status": "deleted"}